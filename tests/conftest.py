@@ -0,0 +1,47 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# The package is used from the repository without being installed.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from zdimpy import calc, fread  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def cluster():
+    """
+    Coordinates, distances from the origin and interaction tensor of the
+    bundled Ag cluster.
+    """
+    coordinates, x_coordinates, y_coordinates, z_coordinates = fread.xyz(
+        os.path.join(ROOT, "clusters", "Ag_cluster.xyz")
+    )
+    o_dist = calc.origin_dist(coordinates, np.array([0, 0, 0]))
+
+    return {
+        "coordinates": coordinates,
+        "x_coordinates": x_coordinates,
+        "y_coordinates": y_coordinates,
+        "z_coordinates": z_coordinates,
+        "o_dist": o_dist,
+        "T": calc.assemble(coordinates)
+    }
+
+
+@pytest.fixture(scope="module")
+def cloud():
+    """
+    Coordinates of 512 atoms on a randomly perturbed cubic grid, which do
+    not sit on a regular lattice.
+    """
+    rng = np.random.default_rng(3)
+    grid = np.arange(8) * 2.9
+
+    coordinates = np.stack(np.meshgrid(grid, grid, grid), -1).reshape(-1, 3)
+    coordinates += rng.uniform(-0.7, 0.7, coordinates.shape)
+
+    return coordinates - coordinates.mean(axis=0)
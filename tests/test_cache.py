@@ -0,0 +1,173 @@
+import os
+
+import numpy as np
+import pytest
+
+from zdimpy import cache, calc
+
+FREQ = np.linspace(0.5, 10, 40)
+
+
+@pytest.fixture
+def store(tmp_path):
+    """
+    On-disk store in a temporary directory, with an empty in-memory cache.
+    """
+    cache.clear()
+    cache.set_directory(str(tmp_path))
+    yield tmp_path
+    cache.set_directory(None)
+    cache.clear()
+
+
+def _fail(*args, **kwargs):
+    raise AssertionError("computed again")
+
+
+def _spectra(store):
+    return sorted(path.name for path in store.glob("*.npz"))
+
+
+def test_polarizability_hits(store, monkeypatch):
+    alpha = cache.polarizability("Ag", "BB", FREQ)
+
+    np.testing.assert_array_equal(alpha, calc.BB("Ag", FREQ))
+    assert not alpha.flags.writeable
+    assert len(_spectra(store)) == 1
+
+    monkeypatch.setattr(calc, "polarizability", _fail)
+
+    # From memory, and from disk once the memory has been emptied.
+    np.testing.assert_array_equal(cache.polarizability("Ag", "BB", FREQ),
+                                  alpha)
+    cache.clear()
+    np.testing.assert_array_equal(cache.polarizability("Ag", "BB", FREQ),
+                                  alpha)
+
+
+def test_polarizability_misses(store):
+    cache.polarizability("Ag", "BB", FREQ)
+    cache.polarizability("Ag", "BB", FREQ[:-1])
+    cache.polarizability("Ag", "LD", FREQ)
+    cache.polarizability("Au", "BB", FREQ)
+
+    assert len(_spectra(store)) == 4
+
+
+@pytest.mark.parametrize("damage", ["remove", "truncate", "garbage"])
+def test_polarizability_damaged_file(store, damage):
+    alpha = np.array(cache.polarizability("Ag", "BB", FREQ))
+    path = store / _spectra(store)[0]
+    cache.clear()
+
+    if damage == "remove":
+        os.remove(path)
+    elif damage == "truncate":
+        path.write_bytes(path.read_bytes()[:100])
+    else:
+        path.write_bytes(b"not a spectrum")
+
+    np.testing.assert_array_equal(cache.polarizability("Ag", "BB", FREQ),
+                                  alpha)
+
+    # The spectrum has been written again.
+    cache.clear()
+    with np.load(path) as data:
+        np.testing.assert_array_equal(data["alpha"], alpha)
+
+
+def test_polarizability_eviction(store):
+    cache.polarizability("Ag", "BB", FREQ)
+    size = os.path.getsize(store / _spectra(store)[0])
+    first = _spectra(store)
+
+    # Room for two spectra only, so the least recently used is removed.
+    cache.set_directory(str(store), max_bytes=2 * size + size // 2)
+    os.utime(store / first[0], (0, 0))
+    cache.polarizability("Ag", "BB", FREQ[:-1])
+    cache.polarizability("Ag", "BB", FREQ[:-2])
+
+    assert len(_spectra(store)) == 2
+    assert first[0] not in _spectra(store)
+    assert not list(store.glob("*.tmp"))
+
+
+def test_eviction_tolerates_removed_files(store, monkeypatch):
+    cache.polarizability("Ag", "BB", FREQ)
+    cache.set_directory(str(store), max_bytes=0)
+
+    # Another run removes the same file first.
+    def remove(path):
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(os, "remove", remove)
+    alpha = cache.polarizability("Ag", "BB", FREQ[:-1])
+
+    np.testing.assert_array_equal(alpha, calc.BB("Ag", FREQ[:-1]))
+
+
+def test_interaction_hits(store, cluster, monkeypatch):
+    coordinates = cluster["coordinates"]
+
+    T = cache.interaction(coordinates)
+    np.testing.assert_allclose(T, calc.assemble(coordinates), rtol=0,
+                               atol=1e-14 * np.abs(T).max())
+
+    monkeypatch.setattr(cache, "_assemble", _fail)
+
+    stored = cache.interaction(coordinates)
+    assert isinstance(stored, np.memmap)
+    assert not stored.flags.writeable
+    np.testing.assert_array_equal(stored, T)
+
+
+def test_interaction_misses(store, cluster):
+    coordinates = cluster["coordinates"]
+
+    cache.interaction(coordinates)
+    cache.interaction(coordinates + [0, 0, 1e-9])
+
+    assert len(list(store.glob("T_*.npy"))) == 2
+
+
+def test_eigh_hits(store, cluster, monkeypatch):
+    coordinates = cluster["coordinates"]
+
+    eigvals, eigvecs = cache.eigh(coordinates)
+    T = cache.interaction(coordinates)
+    np.testing.assert_allclose((eigvecs * eigvals) @ eigvecs.T, T, rtol=0,
+                               atol=1e-12 * np.abs(T).max())
+
+    monkeypatch.setattr(np.linalg, "eigh", _fail)
+
+    stored = cache.eigh(coordinates)
+    np.testing.assert_array_equal(stored[0], eigvals)
+    np.testing.assert_array_equal(stored[1], eigvecs)
+
+
+def test_geometry_damaged_file(store, cluster):
+    coordinates = cluster["coordinates"]
+
+    T = np.array(cache.interaction(coordinates))
+    path = next(store.glob("T_*.npy"))
+    path.write_bytes(b"not a tensor")
+
+    np.testing.assert_array_equal(cache.interaction(coordinates), T)
+
+
+def test_geometry_eviction(store, cluster):
+    coordinates = cluster["coordinates"]
+
+    moved = coordinates + [0, 0, 1e-9]
+
+    cache.interaction(coordinates)
+    size = os.path.getsize(next(store.glob("T_*.npy")))
+
+    # The file just written is kept even if it alone exceeds the limit.
+    cache.set_directory(str(store), max_bytes=size // 2)
+    T = cache.interaction(moved)
+
+    assert len(list(store.glob("T_*.npy"))) == 1
+    assert isinstance(T, np.memmap)
+    np.testing.assert_allclose(T, calc.assemble(moved), rtol=0,
+                               atol=1e-14 * np.abs(T).max())
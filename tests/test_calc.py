@@ -0,0 +1,261 @@
+import numpy as np
+import pytest
+from scipy.special import wofz as w
+
+from zdimpy import calc, params
+
+FREQ = np.array([0.5, 2.0, 8.0])
+
+# Polarizabilities at FREQ from the original if/elif implementations of the
+# models. The original BB only evaluated the 5-oscillator branch (Ag, Au),
+# so the Cr values are from its 4-oscillator branch with the element
+# conditions fixed.
+REFERENCE = {
+    ("LD", "Ag"): [
+        55824.796450663736 + 66.50143434180963j,
+        69186.8059866123 + 1252.6916873310113j,
+        30662.660340428207 + 5516.395305860418j
+    ],
+    ("LD", "Cr"): [
+        56601.27501401143 + 1944.589934077767j,
+        56238.804925529694 + 5492.07071934109j,
+        36545.562805793095 + 17931.980179209393j
+    ],
+    ("LD", "Ti"): [
+        55696.737018475105 + 3394.5815898112564j,
+        58839.52516536912 + 12041.601444573405j,
+        -37918.62256450094 + 18450.38229044689j
+    ],
+    ("XL", "Au"): [
+        -362.61760482616205 + 10411.034199876372j,
+        4562.957993903746 + 1339.5591134582542j,
+        1711.4539255675575 + 752.9511186591163j
+    ],
+    ("XL", "Ni"): [
+        26856.199868501346 + 88639.36931031717j,
+        -5476.846189234138 + 18947.711646521835j,
+        -3672.80168578386 + 4301.347460422332j
+    ],
+    ("XL", "W"): [
+        68451.66148947 + 13154.099362863142j,
+        23954.024947913535 + 38329.70162113778j,
+        -7558.483792512449 + 19447.962252011876j
+    ],
+    ("BB", "Ag"): [
+        55841.24604781414 + 70.30823204762267j,
+        69176.18367822062 + 1366.3676745842058j,
+        15077.868341145224 + 7987.769693869492j
+    ],
+    ("BB", "Au"): [
+        55866.55446088371 + 97.27345508241407j,
+        76045.87452041007 + 3534.006875239404j,
+        116818.53499186388 + 89161.53970862771j
+    ],
+    ("BB", "Cr"): [
+        56861.88703360273 + 1946.7843452141226j,
+        56370.78044356051 + 5721.506679711971j,
+        -2346.988384846482 + 142406.38476231604j
+    ]
+}
+
+
+@pytest.mark.parametrize("model, element", sorted(REFERENCE))
+def test_model_matches_original(model, element):
+    np.testing.assert_allclose(
+        calc.polarizability(element, model, FREQ),
+        REFERENCE[model, element],
+        rtol=1e-13
+    )
+
+
+@pytest.mark.parametrize("model", ["LD", "XL", "BB"])
+def test_model_several_elements(model):
+    elements = sorted(element for key, element in REFERENCE
+                      if key == model)
+
+    alpha = calc.polarizability(elements, model, FREQ)
+
+    for i, element in enumerate(elements):
+        np.testing.assert_allclose(alpha[:, i], REFERENCE[model, element],
+                                   rtol=1e-13)
+
+
+def _BB(element, freq):
+    """
+    Brendel-Bormann polarizability with one Faddeeva evaluation per
+    oscillator, as in the original BB_comp.
+    """
+    values = params.BB[element]
+    omega_p = values["omega_p"]
+    Omega_p = values["f0"]**.5 * omega_p
+
+    dielec = 1-Omega_p**2/(freq*(freq+1j*values["gamma_0"]))
+
+    for f, gamma, omega, sigma in values["oscillators"]:
+        alpha = (freq**2+1j*freq*gamma)**0.5
+        za = (alpha-omega)/(2**.5*sigma)
+        zb = (alpha+omega)/(2**.5*sigma)
+        dielec += 1j*np.pi**.5*f*omega_p**2 / \
+            (2**1.5*alpha*sigma) * (w(za)+w(zb))
+
+    V = 18403
+    return V * ((dielec-1) / (1+(1/3)*(dielec-1)))
+
+
+@pytest.mark.parametrize("element", sorted(params.BB))
+def test_BB_matches_oscillator_sum(element):
+    freq = np.linspace(0.1, 15, 500)
+
+    np.testing.assert_allclose(
+        calc.BB(element, freq), _BB(element, freq), rtol=1e-13, atol=0
+    )
+
+
+def test_BB_several_elements():
+    freq = np.linspace(0.1, 15, 50)
+    elements = ["Ag", "Cr", "W"]
+
+    alpha = calc.BB(elements, freq)
+
+    for i, element in enumerate(elements):
+        np.testing.assert_allclose(
+            alpha[:, i], _BB(element, freq), rtol=1e-13, atol=0
+        )
+
+
+def _T(coordinates):
+    """
+    Interaction tensor as originally assembled from the distance and
+    difference arrays with T and tensor_stack.
+    """
+    p_dist = np.linalg.norm(coordinates - coordinates[:, None], axis=-1)
+    x_diff, y_diff, z_diff = np.moveaxis(
+        coordinates - coordinates[:, None], -1, 0
+    )
+    T_xx, T_yy, T_zz, T_xy, T_xz, T_yz = calc.T(x_diff, y_diff, z_diff,
+                                                p_dist)
+
+    return calc.tensor_stack(
+        [T_xx, T_xy, T_xz, T_xy, T_yy, T_yz, T_xz, T_yz, T_zz]
+    )
+
+
+@pytest.mark.parametrize("memory", [2**26, 1])
+def test_assemble_matches_tensor_stack(cluster, cloud, memory):
+    for coordinates in (cluster["coordinates"], cloud):
+        expected = _T(coordinates)
+
+        np.testing.assert_allclose(
+            calc.assemble(coordinates, memory=memory), expected, rtol=0,
+            atol=1e-14 * np.abs(expected).max()
+        )
+
+
+def test_assemble_into_out(cluster):
+    coordinates = cluster["coordinates"]
+    expected = _T(coordinates)
+
+    out = np.empty(expected.shape, dtype=complex)
+    assert calc.assemble(coordinates, out=out) is out
+    np.testing.assert_allclose(out, expected, rtol=0,
+                               atol=1e-14 * np.abs(expected).max())
+
+    single = calc.assemble(coordinates, dtype=np.float32)
+    assert single.dtype == np.float32
+    np.testing.assert_allclose(single, expected, rtol=0,
+                               atol=1e-6 * np.abs(expected).max())
+
+
+def _fcc(cells, a=4.09):
+    """
+    Coordinates of a block of cells x cells x cells fcc unit cells.
+    """
+    grid = np.arange(cells) * a
+    corners = np.stack(np.meshgrid(grid, grid, grid), -1).reshape(-1, 1, 3)
+    basis = np.array([[0, 0, 0], [0, 1, 1], [1, 0, 1], [1, 1, 0]]) * a / 2
+
+    return (corners + basis).reshape(-1, 3)
+
+
+def _cubic(shape, spacing):
+    axes = [np.arange(m) * d for m, d in zip(shape, spacing)]
+
+    return np.stack(np.meshgrid(*axes), -1).reshape(-1, 3) + 0.37
+
+
+@pytest.mark.parametrize("memory", [2**26, 1])
+def test_assemble_lattice_matches_tensor_stack(memory):
+    for coordinates in (_fcc(4), _cubic((5, 6, 7), (2.9, 3.1, 2.5))):
+        expected = _T(coordinates)
+
+        np.testing.assert_allclose(
+            calc.assemble_lattice(coordinates, memory=memory), expected,
+            rtol=0, atol=1e-13 * np.abs(expected).max()
+        )
+
+
+def test_assemble_lattice_given_spacing():
+    coordinates = _fcc(3)
+    expected = _T(coordinates)
+
+    out = np.empty(expected.shape, dtype=complex)
+    T = calc.assemble_lattice(coordinates, out=out, spacing=4.09 / 2)
+
+    assert T is out
+    np.testing.assert_allclose(T, expected, rtol=0,
+                               atol=1e-13 * np.abs(expected).max())
+
+
+def test_assemble_lattice_rejects_irregular(cluster, cloud):
+    with pytest.raises(ValueError, match="regular lattice"):
+        calc.assemble_lattice(cloud)
+
+    # A small cluster in a large lattice box does not pay off.
+    with pytest.raises(ValueError, match="lattice table"):
+        calc.assemble_lattice(cluster["coordinates"])
+
+
+@pytest.mark.parametrize("memory", [2**26, 1])
+def test_spatial_dist_matches_broadcast(cloud, memory):
+    origin = np.array([0.5, -1.0, 2.0])
+    p_dist, o_dist = calc.spatial_dist(cloud, origin, memory=memory)
+
+    np.testing.assert_allclose(
+        p_dist, np.linalg.norm(cloud - cloud[:, None], axis=-1), rtol=1e-14
+    )
+    np.testing.assert_allclose(
+        o_dist, np.linalg.norm(origin - cloud[:, None], axis=-1), rtol=1e-14
+    )
+
+
+@pytest.mark.parametrize("memory", [2**26, 1])
+def test_point_diff_matches_broadcast(cloud, memory):
+    diff = cloud - cloud[:, None]
+
+    for k, component in enumerate(calc.point_diff(cloud, memory=memory)):
+        np.testing.assert_array_equal(component, diff[..., k])
+
+
+def test_geometry_kernels_float32(cloud):
+    p_dist = calc.spatial_dist(cloud, np.zeros(3), dtype=np.float32,
+                               memory=2**12)[0]
+    diffs = calc.point_diff(cloud, dtype=np.float32, memory=2**12)
+
+    assert p_dist.dtype == np.float32
+    np.testing.assert_allclose(
+        p_dist, np.linalg.norm(cloud - cloud[:, None], axis=-1), rtol=1e-6
+    )
+    for k, component in enumerate(diffs):
+        assert component.dtype == np.float32
+        np.testing.assert_allclose(component, (cloud - cloud[:, None])[..., k],
+                                   rtol=0, atol=1e-5)
+
+
+def test_geometry_kernels_into_out(cloud):
+    n = len(cloud)
+    out = np.empty((n, n))
+    diffs = tuple(np.empty((n, n)) for _ in range(3))
+
+    assert calc.spatial_dist(cloud, np.zeros(3), out=out)[0] is out
+    assert all(a is b for a, b in zip(calc.point_diff(cloud, out=diffs),
+                                      diffs))
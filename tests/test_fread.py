@@ -0,0 +1,106 @@
+import glob
+import os
+
+import numpy as np
+import pytest
+
+from conftest import ROOT
+from zdimpy import fread
+
+FRAMES = """2
+Lattice="4 0 0 0 4 0 0 0 4" Properties=id:I:1:pos:R:3:species:S:1 pbc="T T F" \
+energy=-1.5 relaxed
+1 0.0 0.0 0.0 Ag
+2 1.0 2.0 3.0 Au
+
+1
+step 2
+Cu 0.5 0.5 0.5
+"""
+
+
+def _write(tmp_path, text):
+    path = tmp_path / "frames.xyz"
+    path.write_text(text)
+    return str(path)
+
+
+def test_frames(tmp_path):
+    first, second = fread.frames(_write(tmp_path, FRAMES))
+
+    symbols, coordinates, info = first
+    np.testing.assert_array_equal(symbols, ["Ag", "Au"])
+    np.testing.assert_array_equal(coordinates, [[0, 0, 0], [1, 2, 3]])
+    assert info["energy"] == -1.5 and info["relaxed"] is True
+
+    symbols, coordinates, info = second
+    np.testing.assert_array_equal(symbols, ["Cu"])
+    np.testing.assert_array_equal(coordinates, [[0.5, 0.5, 0.5]])
+    assert info == {"comment": "step 2"}
+
+
+def test_header():
+    info = fread.header(
+        'Lattice="4 0 0 0 4 0 0 0 4" pbc="T F T" Properties=species:S:1:'
+        'pos:R:3 time=2 dipole="0.1 0.2 0.3" label=run relaxed\n'
+    )
+
+    np.testing.assert_array_equal(info["Lattice"], 4 * np.eye(3))
+    np.testing.assert_array_equal(info["pbc"], [True, False, True])
+    assert info["Properties"] == "species:S:1:pos:R:3"
+    assert info["time"] == 2 and isinstance(info["time"], int)
+    np.testing.assert_array_equal(info["dipole"], [0.1, 0.2, 0.3])
+    assert info["label"] == "run"
+    assert info["relaxed"] is True
+
+
+@pytest.mark.parametrize("line", [
+    "E = -1.5 Hartree",
+    "Ag cluster, a=4.09 A",
+    "relaxed geometry"
+])
+def test_header_keeps_plain_comment(line):
+    assert fread.header(line + "\n") == {"comment": line}
+
+
+def test_xyz_reads_first_frame(tmp_path):
+    path = _write(tmp_path, FRAMES)
+    coordinates, x_coordinates, y_coordinates, z_coordinates = fread.xyz(path)
+
+    np.testing.assert_array_equal(coordinates, [[0, 0, 0], [1, 2, 3]])
+    np.testing.assert_array_equal(
+        np.hstack([x_coordinates, y_coordinates, z_coordinates]), coordinates
+    )
+
+
+def test_count_mismatch(tmp_path):
+    with pytest.raises(ValueError, match="Expected 3 atoms .* found 2"):
+        fread.xyz(_write(tmp_path, "3\n\nAg 0 0 0\nAg 1 1 1\n"))
+
+    # Surplus atom lines after the count of the frame.
+    with pytest.raises(ValueError, match="Expected 1 atoms .* found more"):
+        fread.xyz(_write(tmp_path, FRAMES.replace("2\n", "1\n", 1)))
+
+
+def test_invalid_count(tmp_path):
+    with pytest.raises(ValueError, match="Invalid atom count"):
+        list(fread.frames(_write(tmp_path, "two\n\nAg 0 0 0\n")))
+
+
+def test_no_frames(tmp_path):
+    assert list(fread.frames(_write(tmp_path, "\n"))) == []
+
+    with pytest.raises(ValueError, match="No frames"):
+        fread.xyz(_write(tmp_path, ""))
+
+
+@pytest.mark.parametrize(
+    "path", sorted(glob.glob(os.path.join(ROOT, "clusters", "*.xyz")))
+)
+def test_bundled_clusters(path):
+    coordinates = fread.xyz(path)[0]
+    (symbols, frame, info), = fread.frames(path)
+
+    np.testing.assert_array_equal(frame, coordinates)
+    assert len(set(symbols)) == 1
+    assert info["Lattice"].shape == (3, 3)
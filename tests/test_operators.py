@@ -0,0 +1,199 @@
+import os
+
+import numpy as np
+import pytest
+
+from zdimpy import calc, fread, operators
+
+CLUSTERS = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "clusters")
+
+
+def _cluster(element):
+    return fread.xyz(os.path.join(CLUSTERS, element + "_cluster.xyz"))[0]
+
+
+def _vector(n, columns):
+    rng = np.random.default_rng(0)
+    return rng.standard_normal((n,) + columns)
+
+
+@pytest.mark.parametrize("columns", [(), (2,)])
+def test_dipole_matches_assemble(cluster, cloud, columns):
+    for coordinates in (cluster["coordinates"], cloud):
+        T = calc.assemble(coordinates)
+        p = _vector(len(T), columns)
+
+        Tp = operators.Dipole(coordinates, memory=2**16).matvec(p)
+
+        assert Tp.shape == p.shape
+        np.testing.assert_allclose(Tp, T @ p, rtol=0,
+                                   atol=1e-12 * np.abs(T @ p).max())
+
+
+@pytest.mark.parametrize("element", ["Ag", "Cr"])
+@pytest.mark.parametrize("columns", [(), (2,)])
+def test_fft_matches_assemble(element, columns):
+    coordinates = _cluster(element)
+    T = calc.assemble(coordinates)
+    p = _vector(len(T), columns)
+
+    Tp = operators.FFT(coordinates).matvec(p)
+
+    assert Tp.shape == p.shape
+    np.testing.assert_allclose(Tp, T @ p, rtol=0,
+                               atol=1e-12 * np.abs(T @ p).max())
+
+
+def test_lattice_sites(cluster):
+    coordinates = cluster["coordinates"]
+
+    indices, spacing = calc.lattice(coordinates)
+
+    np.testing.assert_allclose(coordinates.min(axis=0) + indices * spacing,
+                               coordinates, rtol=0, atol=1e-8)
+    assert len(np.unique(indices, axis=0)) == len(coordinates)
+
+
+@pytest.mark.parametrize("element", ["Be", "Ti"])
+def test_lattice_rejects_incommensurate_offsets(element):
+    # The rounded coordinates of the hcp clusters share a common divisor of
+    # only about the tolerance along y.
+    with pytest.raises(ValueError, match="regular lattice"):
+        calc.lattice(_cluster(element))
+    with pytest.raises(ValueError, match="regular lattice"):
+        operators.FFT(_cluster(element))
+
+
+def test_lattice_rejects_cloud(cloud):
+    with pytest.raises(ValueError, match="regular lattice"):
+        operators.FFT(cloud)
+
+
+@pytest.fixture(scope="module")
+def large_cloud():
+    """
+    Coordinates and interaction tensor of 1000 atoms on a randomly perturbed
+    cubic grid, large enough for admissible blocks of small leaves.
+    """
+    rng = np.random.default_rng(3)
+    grid = np.arange(10) * 2.9
+
+    coordinates = np.stack(np.meshgrid(grid, grid, grid), -1).reshape(-1, 3)
+    coordinates += rng.uniform(-0.7, 0.7, coordinates.shape)
+
+    return (
+        coordinates,
+        calc.assemble(coordinates)
+    )
+
+
+@pytest.mark.parametrize("tol", [1e-2, 1e-3])
+def test_hierarchical_error_within_tol(large_cloud, tol):
+    coordinates, T = large_cloud
+    p = _vector(len(T), (2,))
+
+    H = operators.Hierarchical(coordinates, tol, leaf=16)
+    Tp = T @ p
+
+    # The low-rank blocks are compressed, and the error of the products
+    # stays below the requested accuracy.
+    assert H.nbytes < T.nbytes
+    assert np.linalg.norm(H.matvec(p) - Tp) <= tol * np.linalg.norm(Tp)
+    assert np.linalg.norm(H.matvec(p[:, 0]) - Tp[:, 0]) <= (
+        tol * np.linalg.norm(Tp[:, 0])
+    )
+
+    atoms = np.concatenate([atoms for atoms, block in H.leaves()])
+    np.testing.assert_array_equal(np.sort(atoms), np.arange(len(coordinates)))
+
+
+def test_hierarchical_keeps_small_blocks_dense(cloud):
+    T = calc.assemble(cloud)
+    p = _vector(len(T), (2,))
+
+    # At this size and accuracy, no block is worth compressing.
+    H = operators.Hierarchical(cloud, 1e-6)
+
+    np.testing.assert_allclose(H.matvec(p), T @ p, rtol=0,
+                               atol=1e-12 * np.abs(T @ p).max())
+
+
+def _truncated(coordinates, cutoff):
+    """
+    Dense interaction tensor with the pairs beyond the cutoff dropped.
+    """
+    n = len(coordinates)
+    dist = np.linalg.norm(coordinates - coordinates[:, None], axis=-1)
+
+    T = calc.assemble(coordinates).reshape(n, 3, n, 3)
+    T *= (dist <= cutoff)[:, None, :, None]
+
+    return T.reshape(3 * n, 3 * n)
+
+
+@pytest.mark.parametrize("cutoff", [6.0, 1e3])
+@pytest.mark.parametrize("columns", [(), (2,)])
+def test_cutoff_matches_truncated_tensor(cloud, cutoff, columns):
+    T = _truncated(cloud, cutoff)
+    p = _vector(len(T), columns)
+
+    Tp = operators.Cutoff(cloud, cutoff).matvec(p)
+
+    assert Tp.shape == p.shape
+    np.testing.assert_allclose(Tp, T @ p, rtol=0,
+                               atol=1e-12 * np.abs(T @ p).max())
+
+
+def test_cutoff_truncation(cloud):
+    T = calc.assemble(cloud)
+    dropped = T - _truncated(cloud, 6.0)
+
+    np.testing.assert_allclose(
+        operators.Cutoff(cloud, 6.0).truncation(),
+        np.linalg.norm(dropped) / np.linalg.norm(T),
+        rtol=1e-12
+    )
+
+
+@pytest.mark.parametrize("shape", [(57,), (57, 2), (3, 2, 2)])
+def test_field_must_be_uniform(cluster, shape):
+    with pytest.raises(ValueError, match="uniform"):
+        operators.Field(cluster["o_dist"], np.ones(shape),
+                        cluster["x_coordinates"], cluster["y_coordinates"],
+                        cluster["z_coordinates"])
+
+
+@pytest.mark.parametrize("E_external", [
+    np.array([5.0, 5.0, 5.0]),
+    np.array([[5.0, 1.0], [5.0, 0.0], [5.0, -2.0]])
+])
+def test_field_matches_E(cluster, E_external):
+    n = len(cluster["T"])
+    columns = 1 if E_external.ndim == 1 else 2
+    field = operators.Field(cluster["o_dist"], E_external,
+                            cluster["x_coordinates"], cluster["y_coordinates"],
+                            cluster["z_coordinates"])
+
+    # A batch of four frequencies.
+    rng = np.random.default_rng(4)
+    dipole = (rng.standard_normal((4, n, columns))
+              + 1j * rng.standard_normal((4, n, columns)))
+    expected = calc.E(
+        cluster["o_dist"],
+        E_external,
+        dipole[:, 0::3],
+        dipole[:, 1::3],
+        dipole[:, 2::3],
+        cluster["coordinates"],
+        cluster["x_coordinates"],
+        cluster["y_coordinates"],
+        cluster["z_coordinates"]
+    )
+
+    assert field.external.shape == (n, columns)
+    np.testing.assert_allclose(field(dipole), expected, rtol=1e-13,
+                               atol=1e-13 * np.abs(expected).max())
+
+    # The buffer is reused by calls of the same shape.
+    assert field(dipole[0]) is field(dipole[1])
@@ -0,0 +1,208 @@
+import numpy as np
+import pytest
+
+from zdimpy import calc, operators, solve
+
+ALPHA = calc.BB("Ag", np.array([1.0, 3.5, 8.0]))
+
+
+def _field(n, k=2):
+    rng = np.random.default_rng(1)
+    return (rng.standard_normal((n, k))
+            + 1j * rng.standard_normal((n, k)))
+
+
+def _reference(T, alpha, E, coupling=None):
+    A = T.astype(complex)
+    np.fill_diagonal(A, alpha)
+    if coupling is not None:
+        solve.add_blocks(A, coupling)
+
+    return np.linalg.solve(A, E)
+
+
+def _coupling(cluster):
+    return calc.E_tensor(cluster["o_dist"], cluster["x_coordinates"],
+                         cluster["y_coordinates"], cluster["z_coordinates"])
+
+
+def _check(solver, T, E, coupling=None, rtol=1e-10):
+    for alpha in ALPHA:
+        solver.factor(alpha)
+        expected = _reference(T, alpha, E, coupling)
+
+        np.testing.assert_allclose(solver.solve(E), expected, rtol=0,
+                                   atol=rtol * np.abs(expected).max())
+
+
+def test_spectral_matches_dense_solve(cluster):
+    T = cluster["T"]
+
+    _check(solve.solver("spectral", T), T, _field(len(T)))
+    _check(solve.solver("spectral", T, eig=np.linalg.eigh(T)), T,
+           _field(len(T))[:, 0])
+
+
+def test_spectral_rejects_coupling(cluster):
+    with pytest.raises(ValueError):
+        solve.solver("spectral", cluster["T"], _coupling(cluster))
+
+
+@pytest.mark.parametrize("method", ["lu", "inv"])
+@pytest.mark.parametrize("direct", [False, True])
+def test_factor_and_solve(cluster, method, direct):
+    T = cluster["T"]
+    coupling = _coupling(cluster) if direct else None
+
+    _check(solve.solver(method, T, coupling), T, _field(len(T)), coupling)
+
+
+@pytest.mark.parametrize("method", ["lu", "inv"])
+def test_solve_into_out(cluster, method):
+    T = cluster["T"]
+    E = _field(len(T))
+    solver = solve.solver(method, T)
+    solver.factor(ALPHA[0])
+
+    out = np.empty_like(E)
+    assert solver.solve(E, out=out) is out
+    np.testing.assert_allclose(out, _reference(T, ALPHA[0], E), rtol=0,
+                               atol=1e-10 * np.abs(out).max())
+
+
+class _Identity:
+    """
+    Solver returning the field itself, so that scf iterates p = field(p).
+    """
+
+    def solve(self, E, out=None):
+        out[...] = E
+        return out
+
+
+def _contraction(n=40, radius=0.95):
+    """
+    Field b - M p of a slowly converging fixed point, with the eigenvalues of
+    the symmetric M spread over [-radius, radius].
+    """
+    rng = np.random.default_rng(2)
+    Q = np.linalg.qr(rng.standard_normal((n, n)))[0]
+    M = (Q * np.linspace(-radius, radius, n)) @ Q.T
+    b = rng.standard_normal((n, 1)) + 0j
+
+    return (
+        lambda p: b - M @ p,
+        np.linalg.solve(np.eye(n) + M, b)
+    )
+
+
+def test_scf_anderson_matches_plain_iterations():
+    field, expected = _contraction()
+    start = np.zeros_like(expected)
+
+    plain, plain_counter, plain_residual = solve.scf(
+        _Identity(), field, start, 1e-12, 5000, depth=0
+    )
+    plain = plain.copy()
+    mixed, mixed_counter, mixed_residual = solve.scf(
+        _Identity(), field, start, 1e-12, 5000, depth=5
+    )
+
+    assert plain_residual <= 1e-12 and mixed_residual <= 1e-12
+    assert mixed_counter < plain_counter / 2
+    for dipole in (plain, mixed):
+        np.testing.assert_allclose(dipole, expected, rtol=0,
+                                   atol=1e-9 * np.abs(expected).max())
+
+
+def test_scf_stops_at_maxiter():
+    field, expected = _contraction()
+
+    dipole, counter, residual = solve.scf(
+        _Identity(), field, np.zeros_like(expected), 1e-12, 10, depth=0
+    )
+
+    assert counter == 10
+    assert residual > 1e-12
+
+
+def test_ldl_matches_dense_solve(cluster):
+    T = cluster["T"]
+    n = len(T)
+    solver = solve.solver("ldl", T)
+
+    assert solver.nbytes == 8 * n * (n + 1) // 2
+    _check(solver, T, _field(n))
+    assert solver.nbytes == 8 * n * (n + 1) // 2 + 16 * n**2
+
+    # Symmetric coupling blocks keep A symmetric.
+    coupling = _coupling(cluster)
+    coupling = (coupling + np.swapaxes(coupling, 1, 2)) / 2
+    _check(solve.solver("ldl", T, coupling), T, _field(n), coupling)
+
+
+def test_ldl_rejects_non_symmetric_coupling(cluster):
+    with pytest.raises(ValueError):
+        solve.solver("ldl", cluster["T"], _coupling(cluster))
+
+
+def test_pack():
+    T = np.arange(16.).reshape(4, 4)
+    T = T + T.T
+
+    np.testing.assert_array_equal(solve.pack(T), T[np.triu_indices(4)])
+
+
+@pytest.mark.parametrize("direct", [False, True])
+def test_krylov_matches_dense_solve(cluster, direct):
+    T = cluster["T"]
+    coupling = _coupling(cluster) if direct else None
+    solver = solve.solver("krylov", operators.Dipole(cluster["coordinates"]),
+                          coupling)
+
+    # COCG for the symmetric A matrix, GMRES with the coupling blocks.
+    assert solver.symmetric != direct
+    _check(solver, T, _field(len(T)), coupling, rtol=1e-9)
+    assert 0 < solver.residual <= 1e-12
+    assert solver.iterations > 0
+
+
+@pytest.mark.parametrize("direct", [False, True])
+def test_krylov_warns_without_convergence(cluster, direct):
+    coupling = _coupling(cluster) if direct else None
+    solver = solve.solver("krylov", operators.Dipole(cluster["coordinates"]),
+                          coupling, maxiter=1)
+    solver.factor(ALPHA[1])
+
+    with pytest.warns(RuntimeWarning):
+        solver.solve(_field(len(cluster["T"])))
+    assert solver.residual > 1e-12
+
+
+def test_krylov_guess(cluster):
+    T = cluster["T"]
+    E = _field(len(T))
+    solver = solve.solver("krylov", operators.Dipole(cluster["coordinates"]))
+    solver.factor(ALPHA[0])
+
+    dipole = solver.solve(E)
+    iterations = solver.iterations
+    solver.solve(E, out=dipole, guess=dipole)
+
+    assert solver.iterations < iterations
+
+
+@pytest.mark.parametrize("direct", [False, True])
+def test_sparse_matches_dense_solve(cluster, direct):
+    cutoff = operators.Cutoff(cluster["coordinates"], 4.0)
+    T = cutoff.matrix.toarray()
+    coupling = _coupling(cluster) if direct else None
+
+    assert np.count_nonzero(T) < T.size - len(T)
+    _check(solve.solver("sparse", cutoff, coupling), T, _field(len(T)),
+           coupling)
+
+
+def test_sparse_needs_sparse_operator(cluster):
+    with pytest.raises(ValueError):
+        solve.solver("sparse", operators.Dipole(cluster["coordinates"]))
@@ -0,0 +1,274 @@
+import numpy as np
+import pytest
+
+from zdimpy import calc, operators, solve, sweep
+
+FREQ = np.linspace(1, 10, 7)
+E_EXTERNAL = np.array([5, 5, 5])
+
+
+def _serial(cluster, method, direct, E_external=E_EXTERNAL, freq=FREQ,
+            **kwargs):
+    coupling = None
+    if direct:
+        coupling = calc.E_tensor(cluster["o_dist"], cluster["x_coordinates"],
+                                 cluster["y_coordinates"],
+                                 cluster["z_coordinates"])
+    T = cluster["T"]
+    if method == "krylov":
+        T = operators.Dipole(cluster["coordinates"])
+    solver = solve.solver(method, T, coupling)
+
+    return sweep.serial(
+        "Ag",
+        "BB",
+        freq,
+        solver,
+        cluster["o_dist"],
+        E_external,
+        cluster["coordinates"],
+        cluster["x_coordinates"],
+        cluster["y_coordinates"],
+        cluster["z_coordinates"],
+        direct,
+        1e-12,
+        1000,
+        **kwargs
+    )
+
+
+def _batched(cluster, direct, E_external=E_EXTERNAL, **kwargs):
+    return sweep.batched(
+        "Ag",
+        "BB",
+        FREQ,
+        cluster["T"],
+        cluster["o_dist"],
+        E_external,
+        cluster["coordinates"],
+        cluster["x_coordinates"],
+        cluster["y_coordinates"],
+        cluster["z_coordinates"],
+        1e-12,
+        1000,
+        direct,
+        **kwargs
+    )
+
+
+@pytest.mark.parametrize("method", ["lu", "inv"])
+def test_direct_matches_iterations(cluster, method):
+    dipole, iterations, residual = _serial(cluster, method, False)
+    direct, direct_iterations, _ = _serial(cluster, method, True)
+
+    assert np.all(residual <= 1e-12)
+    assert np.all(direct_iterations == 1)
+    np.testing.assert_allclose(direct, dipole, rtol=1e-10,
+                               atol=1e-10 * np.abs(dipole).max())
+
+
+@pytest.mark.parametrize("direct", [False, True])
+def test_batched_matches_serial(cluster, direct):
+    dipole, iterations, _ = _serial(cluster, "lu", direct)
+    batched, batched_iterations, residual = _batched(cluster, direct)
+
+    assert batched.shape == dipole.shape
+    assert np.all(residual <= 1e-12)
+    np.testing.assert_array_equal(batched_iterations, iterations)
+    np.testing.assert_allclose(batched, dipole, rtol=0,
+                               atol=1e-10 * np.abs(dipole).max())
+
+
+@pytest.mark.parametrize("method, direct", [
+    ("lu", False),
+    ("lu", True),
+    ("krylov", True)
+])
+def test_field_columns_match_single_fields(cluster, method, direct):
+    E_external = np.array([[5, 1], [5, 0], [5, 0]])
+    dipole, iterations, residual = _serial(cluster, method, direct,
+                                           E_external)
+
+    assert dipole.shape == (len(FREQ), len(cluster["T"]), 2)
+    assert np.all(residual <= 1e-12)
+    for j in range(2):
+        expected = _serial(cluster, method, direct, E_external[:, j])[0]
+        np.testing.assert_allclose(dipole[..., j], expected, rtol=0,
+                                   atol=1e-9 * np.abs(expected).max())
+
+
+@pytest.mark.parametrize("direct", [False, True])
+def test_batched_field_columns_match_serial(cluster, direct):
+    E_external = np.array([[5, 1], [5, 0], [5, 0]])
+    dipole, iterations, _ = _serial(cluster, "lu", direct, E_external)
+    batched, batched_iterations, _ = _batched(cluster, direct, E_external)
+
+    assert batched.shape == dipole.shape
+    np.testing.assert_array_equal(batched_iterations, iterations)
+    np.testing.assert_allclose(batched, dipole, rtol=0,
+                               atol=1e-10 * np.abs(dipole).max())
+
+
+def test_total():
+    dipole = np.arange(2 * 6 * 2).reshape(2, 6, 2)
+
+    np.testing.assert_array_equal(
+        sweep._total(dipole),
+        dipole.reshape(2, 2, 3, 2).sum(axis=1).reshape(2, 6)
+    )
+    np.testing.assert_array_equal(sweep._total(np.arange(12).reshape(2, 6)),
+                                  [[3, 5, 7], [15, 17, 19]])
+
+
+def test_batched_chunks(cluster):
+    dipole = _batched(cluster, False)[0]
+
+    # A budget below a single frequency iterates one frequency at a time.
+    np.testing.assert_allclose(_batched(cluster, False, memory=1)[0], dipole,
+                               rtol=0, atol=1e-13 * np.abs(dipole).max())
+    np.testing.assert_allclose(_batched(cluster, True, memory=1)[0],
+                               _batched(cluster, True)[0], rtol=1e-13)
+
+
+@pytest.mark.parametrize("method, direct", [
+    ("lu", False),
+    ("spectral", False),
+    ("lu", True)
+])
+def test_parallel_matches_serial(cluster, method, direct):
+    dipole, iterations, _ = _serial(cluster, method, direct)
+
+    parallel, parallel_iterations, _ = sweep.parallel(
+        "Ag",
+        "BB",
+        FREQ,
+        cluster["T"],
+        cluster["o_dist"],
+        E_EXTERNAL,
+        cluster["coordinates"],
+        method,
+        direct,
+        1e-12,
+        1000,
+        5,
+        workers=2,
+        chunk=2
+    )
+
+    np.testing.assert_array_equal(parallel_iterations, iterations)
+    np.testing.assert_allclose(parallel, dipole, rtol=0,
+                               atol=1e-12 * np.abs(dipole).max())
+
+
+def test_direct_krylov_records_residuals(cluster):
+    dipole = _serial(cluster, "lu", True)[0]
+    krylov, iterations, residual = _serial(cluster, "krylov", True)
+
+    assert np.all(iterations > 1)
+    assert np.all((residual > 0) & (residual <= 1e-12))
+    np.testing.assert_allclose(krylov, dipole, rtol=0,
+                               atol=1e-9 * np.abs(dipole).max())
+
+
+def _geometry(coordinates):
+    return {
+        "coordinates": coordinates,
+        "x_coordinates": coordinates[:, 0:1],
+        "y_coordinates": coordinates[:, 1:2],
+        "z_coordinates": coordinates[:, 2:3],
+        "o_dist": calc.origin_dist(coordinates, np.zeros(3)),
+        "T": calc.assemble(coordinates)
+    }
+
+
+@pytest.mark.parametrize("method, direct", [("lu", False), ("krylov", True)])
+def test_trajectory_matches_serial(cluster, tmp_path, method, direct):
+    coordinates = cluster["coordinates"]
+    geometries = [coordinates, 1.02 * coordinates, coordinates[:-3]]
+
+    path = tmp_path / "trajectory.xyz"
+    with open(path, "w") as fp:
+        for step, frame in enumerate(geometries):
+            fp.write("{}\nstep={}\n".format(len(frame), step))
+            np.savetxt(fp, frame, fmt="Ag %.17g %.17g %.17g")
+
+    results = list(sweep.trajectory("Ag", "BB", FREQ, str(path), np.zeros(3),
+                                    E_EXTERNAL, method, direct))
+
+    assert len(results) == len(geometries)
+    for step, (frame, (mu, info)) in enumerate(zip(geometries, results)):
+        dipole = _serial(_geometry(frame), method, direct)[0]
+        expected = dipole.reshape(len(FREQ), -1, 3).sum(axis=1)
+
+        assert info == {"step": step}
+        assert mu.shape == (len(FREQ), 3)
+        np.testing.assert_allclose(mu, expected, rtol=0,
+                                   atol=1e-10 * np.abs(expected).max())
+
+
+def test_workspace_reused_across_sweeps(cluster):
+    dipole = _serial(cluster, "lu", False)[0]
+    workspace = solve.Workspace(len(cluster["T"]))
+
+    for _ in range(2):
+        np.testing.assert_array_equal(
+            _serial(cluster, "lu", False, workspace=workspace)[0], dipole
+        )
+    assert workspace.nbytes > 0
+
+
+@pytest.mark.parametrize("method, direct", [("lu", False), ("krylov", True)])
+@pytest.mark.parametrize("guess", ["previous", "extrapolate"])
+def test_warm_start_saves_iterations(cluster, method, direct, guess):
+    freq = np.linspace(1, 10, 60)
+    dipole, iterations, _ = _serial(cluster, method, direct, freq=freq)
+    warm, warm_iterations, residual = _serial(cluster, method, direct,
+                                              freq=freq, guess=guess)
+
+    assert np.all(residual <= 1e-12)
+    assert warm_iterations.sum() < 0.9 * iterations.sum()
+    np.testing.assert_allclose(warm, dipole, rtol=0,
+                               atol=1e-9 * np.abs(dipole).max())
+
+
+def _adaptive(cluster, **kwargs):
+    return sweep.adaptive(
+        "Ag",
+        "BB",
+        1,
+        10,
+        solve.solver("lu", cluster["T"]),
+        cluster["o_dist"],
+        E_EXTERNAL,
+        cluster["coordinates"],
+        cluster["x_coordinates"],
+        cluster["y_coordinates"],
+        cluster["z_coordinates"],
+        start=10,
+        **kwargs
+    )
+
+
+def test_adaptive_matches_serial(cluster):
+    freq, dipole, iterations, residual = _adaptive(cluster, points=60)
+
+    assert len(freq) == 60
+    assert freq[0] == 1 and freq[-1] == 10
+    assert np.all(np.diff(freq) > 0)
+    assert np.all(residual <= 1e-12)
+
+    expected = _serial(cluster, "lu", False, freq=freq)[0]
+    np.testing.assert_allclose(dipole, expected, rtol=0,
+                               atol=1e-10 * np.abs(expected).max())
+
+    # The points gather around the resonance.
+    peak = np.argmax(np.abs(sweep._total(dipole)).max(axis=1))
+    ratio = np.diff(np.log(freq))
+    assert ratio[peak - 1:peak + 1].max() < ratio.max() / 2
+
+
+def test_adaptive_keeps_flat_spectrum_coarse(cluster):
+    freq = _adaptive(cluster, points=60, accuracy=10)[0]
+
+    # Only the midpoints of the initial intervals are checked.
+    np.testing.assert_allclose(freq, np.geomspace(1, 10, 19))
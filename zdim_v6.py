@@ -38,8 +38,12 @@ import matplotlib.pyplot as plt
 import matplotlib.ticker as mticker
 from zdimpy import (
     fread as f,
+    cache,
     calc,
-    plot
+    operators,
+    plot,
+    solve,
+    sweep
 )
 
 # ==============================================================================
@@ -49,10 +53,68 @@ from zdimpy import (
 element = "Ag"
 model = "BB"
 
+# Solver for the dipole interaction equations, either by an LU factorization
+# for every frequency (lu), by a symmetric LDL^T factorization of the packed
+# tensor for every frequency (ldl), by explicit inversion for every frequency
+# (inv), by a single eigendecomposition (spectral), by a sparse LU
+# factorization of the tensor truncated at the cutoff distance (sparse, with
+# the cutoff operator) or by matrix-free COCG/GMRES iterations that never store
+# the interaction tensor (krylov)
+method = "lu"
+
+# Products of the krylov solver with the interaction tensor, computed directly
+# from the coordinates (dipole), by FFTs on the lattice of a cluster whose
+# atoms sit on a regular lattice (fft) or by a hierarchical-matrix
+# approximation for large irregular clusters (hierarchical). The sparse solver
+# and quick screening runs of large clusters drop the interactions between
+# atoms further apart than the cutoff distance (in Å) instead (cutoff).
+operator = "dipole"
+cutoff = 10.0
+
+# Relative accuracy of the low-rank blocks, maximum number of atoms in a leaf
+# and admissibility parameter of the hierarchical operator
+accuracy = 1e-6
+leaf = 64
+eta = 2.0
+
+# Solve the self-consistent field equations directly as a single linear system
+# (only with the lu, inv, sparse and krylov solvers) instead of by iterations
+direct = True
+
+# Convergence of the self-consistent field iterations: tolerance on the
+# relative residual, maximum number of iterations and depth of the Anderson
+# mixing (0 disables the mixing). The tolerance and the maximum number of
+# iterations per solve also apply to the krylov solver
+tol = 1e-12
+maxiter = 1000
+depth = 5
+
+# Initial guess of the iterations (self-consistent field, or the krylov solver
+# for direct) at each frequency: all ones (ones), the dipole moments of the
+# previous frequency (previous) or their linear extrapolation from the two
+# previous frequencies (extrapolate)
+guess = "extrapolate"
+
+# Solve all frequencies at once, iterating through a single eigendecomposition
+# of the interaction tensor (or solving stacked matrices with direct), in
+# place of the method above
+batched = False
+
+# Number of worker processes the frequencies are spread over (1 runs serially)
+workers = 1
+
+# Directory in which polarizability spectra, interaction tensors and their
+# eigendecompositions are stored between runs (None disables the store)
+cache_dir = None
+
 # Fields
 E_external = np.array([5, 5, 5])
 origin = np.array([0, 0, 0])
 
+# Column of E_external that is plotted when several fields are given as the
+# columns of a (3 x k) array
+plot_field = 0
+
 # Frequencies
 
 freq_min = 0.1
@@ -64,6 +126,14 @@ freq = np.logspace(
     npoints
 )
 
+# Sample the frequencies adaptively instead (serial runs only): start from a
+# logarithmic grid of freq_start points and bisect the intervals where the
+# spectrum deviates from a linear interpolation by more than freq_accuracy
+# (relative to its maximum), up to npoints frequencies in total
+adaptive = False
+freq_start = 25
+freq_accuracy = 1e-3
+
 # xyz file with coordinates
 if element == "Ag":
     xyz_path = "/home/liasi/py/clusters/Ag_cluster.xyz"
@@ -88,125 +158,188 @@ if element == "Ti":
 if element == "W":
     xyz_path = "/home/liasi/py/clusters/W_cluster.xyz"
 
-# ==============================================================================
-#   COORDINATES
-# ==============================================================================
-
-coordinates, x_coordinates, y_coordinates, z_coordinates = f.xyz(
-    xyz_path
-)
-
-p_dist, o_dist = calc.spatial_dist(
-    coordinates,
-    origin
-)
-
-x_diff, y_diff, z_diff = calc.point_diff(
-    coordinates
-)
-
-T_xx, T_yy, T_zz, T_xy, T_xz, T_yz = calc.T(
-    x_diff,
-    y_diff,
-    z_diff,
-    p_dist
-)
-
-temp_A = calc.tensor_stack(
-    [
-        T_xx,
-        T_xy,
-        T_xz,
-        T_xy,
-        T_yy,
-        T_yz,
-        T_xz,
-        T_yz,
-        T_zz
-    ]
-)
-
-# ==============================================================================
-#   COMPUTE POLARIZABILITES
-# ==============================================================================
-
-dip_x = []
-dip_y = []
-dip_z = []
-abs_x = []
-abs_y = []
-abs_z = []
-
-for i in freq:
-
-    if model == "LD":
-        alpha = calc.LD(element, i)
-    elif model == "XL":
-        alpha = calc.XL(element, i)
-    elif model == "BB":
-        alpha = calc.BB(element, i)
-
-    # The array has to be complex, otherwise the imag part of alpha will be
-    # discarded.
-    temp_A = temp_A.astype(complex)
-    np.fill_diagonal(temp_A, alpha)
-    B = np.linalg.inv(temp_A)
-
-    dipole_x = np.full((len(coordinates), 1), 1 + 0.j)
-    dipole_y = np.full((len(coordinates), 1), 1 + 0.j)
-    dipole_z = np.full((len(coordinates), 1), 1 + 0.j)
-
-    counter = 0
-
-    while True:
-
-        counter += 1
-
-        E = calc.E(o_dist, E_external, dipole_x, dipole_y, dipole_z,
-                   coordinates, x_coordinates, y_coordinates, z_coordinates)
-
-        dipole = np.dot(B, E)
-
-        check_x = dipole[0:len(dipole):3]
-        check_y = dipole[1:len(dipole):3]
-        check_z = dipole[2:len(dipole):3]
-
-        if (np.array_equal(dipole_x, check_x) == True
-            and np.array_equal(dipole_y, check_y) == True
-            and np.array_equal(dipole_z, check_z) == True
-                or counter > 999):
-
-            plot.dipole_append(
-                dip_x,
-                dip_y,
-                dip_z,
-                abs_x,
-                abs_y,
-                abs_z,
-                dipole
+# The work is guarded, since the worker processes of sweep.parallel import
+# this script.
+if __name__ == "__main__":
+
+    # ==========================================================================
+    #   COORDINATES
+    # ==========================================================================
+
+    if cache_dir is not None:
+        cache.set_directory(cache_dir)
+
+    coordinates, x_coordinates, y_coordinates, z_coordinates = f.xyz(
+        xyz_path
+    )
+
+    o_dist = calc.origin_dist(
+        coordinates,
+        origin
+    )
+
+    # The interaction tensor only depends on the coordinates, and is reused
+    # from the cache directory if the same coordinates have been run before.
+    # The krylov and sparse solvers only need its products with vectors.
+    if method in ("krylov", "sparse"):
+        temp_A = operators.operator(
+            operator,
+            coordinates,
+            cutoff,
+            accuracy,
+            leaf,
+            eta
+        )
+
+        if operator == "cutoff":
+            print("Relative truncation error of the interaction tensor: {:.2e}"
+                  .format(temp_A.truncation()))
+    else:
+        temp_A = cache.interaction(
+            coordinates
+        )
+
+    # ==========================================================================
+    #   COMPUTE POLARIZABILITES
+    # ==========================================================================
+
+    if batched:
+        dipole, iterations, residuals = sweep.batched(
+            element,
+            model,
+            freq,
+            temp_A,
+            o_dist,
+            E_external,
+            coordinates,
+            x_coordinates,
+            y_coordinates,
+            z_coordinates,
+            tol,
+            maxiter,
+            direct,
+            depth
+        )
+
+    elif workers > 1:
+        dipole, iterations, residuals = sweep.parallel(
+            element,
+            model,
+            freq,
+            temp_A,
+            o_dist,
+            E_external,
+            coordinates,
+            method,
+            direct,
+            tol,
+            maxiter,
+            depth,
+            workers,
+            operator=operator,
+            cutoff=cutoff,
+            guess=guess,
+            accuracy=accuracy,
+            leaf=leaf,
+            eta=eta
+        )
+
+    else:
+        coupling = None
+        if direct:
+            coupling = calc.E_tensor(o_dist, x_coordinates, y_coordinates,
+                                     z_coordinates)
+
+        eig = None
+        if method == "spectral":
+            eig = cache.eigh(coordinates, temp_A)
+
+        solver = solve.solver(method, temp_A, coupling, eig, tol, maxiter)
+
+        # The LDL solver keeps its own packed copy of the tensor, and only
+        # allocates its work matrix once the dense tensor is released.
+        if method == "ldl":
+            del temp_A
+
+        # The buffers of the iterations are allocated once for all frequencies.
+        workspace = None
+        if not direct:
+            workspace = solve.Workspace(
+                3 * len(coordinates),
+                np.size(E_external) // 3,
+                depth
             )
 
-            break
-
-        dipole_x = dipole[0:len(dipole):3]
-        dipole_y = dipole[1:len(dipole):3]
-        dipole_z = dipole[2:len(dipole):3]
-
-dip_x = np.asarray(dip_x)
-dip_y = np.asarray(dip_y)
-dip_z = np.asarray(dip_z)
-abs_x = np.asarray(abs_x)
-abs_y = np.asarray(abs_y)
-abs_z = np.asarray(abs_z)
-
-# ==============================================================================
-#   PLOTS
-# ==============================================================================
+        if adaptive:
+            freq, dipole, iterations, residuals = sweep.adaptive(
+                element,
+                model,
+                freq_min,
+                freq_max,
+                solver,
+                o_dist,
+                E_external,
+                coordinates,
+                x_coordinates,
+                y_coordinates,
+                z_coordinates,
+                direct,
+                tol,
+                maxiter,
+                depth,
+                guess,
+                freq_start,
+                npoints,
+                freq_accuracy,
+                workspace
+            )
+            print("Adaptive sweep with {} frequencies".format(len(freq)))
+
+        else:
+            dipole, iterations, residuals = sweep.serial(
+                element,
+                model,
+                freq,
+                solver,
+                o_dist,
+                E_external,
+                coordinates,
+                x_coordinates,
+                y_coordinates,
+                z_coordinates,
+                direct,
+                tol,
+                maxiter,
+                depth,
+                guess,
+                workspace
+            )
 
-plot.logplot(
-    freq,
-    dip_x,
-    abs_x,
-    model,
-    element
-)
+        nbytes = solver.nbytes
+        if workspace is not None:
+            nbytes += workspace.nbytes
+        print("Working memory of the sweep: {:.1f} MB".format(nbytes / 2**20))
+
+    # The atoms are summed per Cartesian component, keeping the fields apart.
+    mu = dipole.reshape((len(freq), -1, 3) + dipole.shape[2:]).sum(axis=1)
+    if mu.ndim > 2:
+        mu = mu[..., plot_field]
+
+    dip_x = np.real(mu[:, 0])
+    dip_y = np.real(mu[:, 1])
+    dip_z = np.real(mu[:, 2])
+    abs_x = np.imag(mu[:, 0])
+    abs_y = np.imag(mu[:, 1])
+    abs_z = np.imag(mu[:, 2])
+
+    # ==========================================================================
+    #   PLOTS
+    # ==========================================================================
+
+    plot.logplot(
+        freq,
+        dip_x,
+        abs_x,
+        model,
+        element
+    )
@@ -0,0 +1,339 @@
+import os
+import hashlib
+import zipfile
+from collections import OrderedDict
+
+import numpy as np
+from zdimpy import calc, params
+
+# Number of polarizability spectra kept in memory.
+MEMORY_ENTRIES = 64
+
+# Version of the geometry data, to be increased whenever the assembly of the
+# interaction tensor changes.
+GEOMETRY_VERSION = 2
+
+# Directory and size limit (in bytes) of the on-disk store, see set_directory.
+_directory = None
+_max_bytes = 2**30
+
+_memory = OrderedDict()
+
+
+def set_directory(path, max_bytes=2**30):
+    """
+    Enables the on-disk store of polarizability spectra and geometry data.
+
+    Parameters
+    ----------
+    path : Directory of the stored files, or None to disable the on-disk
+           store.
+
+    max_bytes : Size limit of the directory. The least recently used files
+                are removed once the limit is exceeded.
+    """
+    global _directory, _max_bytes
+
+    if path is not None:
+        os.makedirs(path, exist_ok=True)
+
+    _directory = path
+    _max_bytes = max_bytes
+
+
+def directory():
+    """
+    Returns the directory of the on-disk store, or None if it is disabled.
+    """
+    return _directory
+
+
+def max_bytes():
+    """
+    Returns the size limit of the on-disk store.
+    """
+    return _max_bytes
+
+
+def clear():
+    """
+    Empties the in-memory cache.
+    """
+    _memory.clear()
+
+
+def polarizability(element, model, freq):
+    """
+    Computes the polarizability of the metal using the given model, reusing
+    earlier results for the same metal, model and frequency grid.
+
+    Results are kept in an in-memory LRU cache and, if a directory has been
+    set with set_directory, in .npz files that persist between runs. The key
+    includes the model parameters, so files are not reused after the
+    parameters have been changed.
+
+    Parameters
+    ----------
+    element : String containing the name of the metal, or a sequence of names.
+
+    model : String containing the name of the model (LD, XL or BB).
+
+    freq : Array of frequency points (in eV) to be used for the calculations.
+
+    Returns
+    -------
+    alpha : Read-only array of complex frequency dependent polarizabilites for
+            the metal (see calc.polarizability).
+    """
+    freq = np.asarray(freq, dtype=float)
+    key = spectrum_key(element, model, freq)
+
+    if key in _memory:
+        _memory.move_to_end(key)
+        return _memory[key][()]
+
+    alpha = None
+
+    if _directory is not None:
+        path = os.path.join(_directory, key + ".npz")
+        # A file removed or damaged by another run counts as a miss.
+        try:
+            with np.load(path) as data:
+                alpha = data["alpha"]
+            # The modification time orders the files for the eviction.
+            os.utime(path)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            alpha = None
+
+    if alpha is None:
+        alpha = np.asarray(calc.polarizability(element, model, freq))
+
+        if _directory is not None:
+            _write(path, np.savez, alpha=alpha, freq=freq)
+            _evict(keep=path)
+
+    alpha.flags.writeable = False
+    _memory[key] = alpha
+    if len(_memory) > MEMORY_ENTRIES:
+        _memory.popitem(last=False)
+
+    return alpha[()]
+
+
+def spectrum_key(element, model, freq):
+    """
+    Computes the cache key of a polarizability spectrum.
+
+    Parameters
+    ----------
+    element : String containing the name of the metal, or a sequence of names.
+
+    model : String containing the name of the model (LD, XL or BB).
+
+    freq : Array of frequency points (in eV).
+
+    Returns
+    -------
+    key : String containing the model, the metals and a hash of the frequency
+          grid and the model parameters.
+    """
+    elements = (element,) if isinstance(element, str) else tuple(element)
+
+    digest = hashlib.sha1()
+    digest.update(repr(np.shape(freq)).encode())
+    digest.update(np.ascontiguousarray(freq, dtype=float).tobytes())
+    for array in params.table(model, elements):
+        digest.update(array.tobytes())
+    if model == "XL":
+        digest.update(params.static(elements).tobytes())
+
+    return "{}_{}_{}".format(model, "-".join(elements), digest.hexdigest())
+
+
+def interaction(coordinates):
+    """
+    Assembles the stacked real dipole interaction tensor of the atoms (see
+    calc.assemble and calc.assemble_lattice), reusing the tensor stored for
+    the same coordinates.
+
+    Without a directory set with set_directory, the tensor is assembled every
+    time. Otherwise it is stored under a hash of the coordinates and loaded
+    as a read-only memory-mapped array.
+
+    Parameters
+    ----------
+    coordinates : Array containing the coordinates of the atoms.
+
+    Returns
+    -------
+    temp_A : Array (3N x 3N) containing the interaction tensor.
+    """
+    if _directory is None:
+        return _assemble(coordinates)
+
+    key = geometry_key(coordinates)
+
+    temp_A = _load("T_" + key)
+    if temp_A is None:
+        temp_A = _store("T_" + key, _assemble(coordinates))
+
+    return temp_A
+
+
+def eigh(coordinates, temp_A=None):
+    """
+    Computes the eigendecomposition of the interaction tensor of the atoms,
+    reusing the decomposition stored for the same coordinates.
+
+    Without a directory set with set_directory, the decomposition is computed
+    every time. Otherwise the eigenvalues and eigenvectors are stored under a
+    hash of the coordinates and loaded as read-only memory-mapped arrays.
+
+    Parameters
+    ----------
+    coordinates : Array containing the coordinates of the atoms.
+
+    temp_A : Optional array containing the interaction tensor of the atoms,
+             to avoid loading or assembling it again.
+
+    Returns
+    -------
+    eigvals : Array (3N) containing the eigenvalues.
+
+    eigvecs : Array (3N x 3N) containing the eigenvectors as columns.
+    """
+    if _directory is None:
+        if temp_A is None:
+            temp_A = _assemble(coordinates)
+        return np.linalg.eigh(temp_A)
+
+    key = geometry_key(coordinates)
+
+    eigvals = _load("eigvals_" + key)
+    eigvecs = _load("eigvecs_" + key)
+
+    if eigvals is None or eigvecs is None:
+        if temp_A is None:
+            temp_A = interaction(coordinates)
+        eigvals, eigvecs = np.linalg.eigh(temp_A)
+        eigvals = _store("eigvals_" + key, eigvals)
+        eigvecs = _store("eigvecs_" + key, eigvecs)
+
+    return (
+        eigvals,
+        eigvecs
+    )
+
+
+def geometry_key(coordinates):
+    """
+    Computes the cache key of the geometry data of the atoms.
+
+    Parameters
+    ----------
+    coordinates : Array containing the coordinates of the atoms.
+
+    Returns
+    -------
+    key : String containing a hash of the coordinates.
+    """
+    coordinates = np.ascontiguousarray(coordinates, dtype=float)
+
+    digest = hashlib.sha1()
+    digest.update(repr((GEOMETRY_VERSION, coordinates.shape)).encode())
+    digest.update(coordinates.tobytes())
+
+    return digest.hexdigest()
+
+
+def _assemble(coordinates):
+    """
+    Assembles the interaction tensor from a lookup table of the lattice
+    offsets if the atoms sit on a regular lattice (see
+    calc.assemble_lattice), and pair by pair otherwise.
+    """
+    try:
+        return calc.assemble_lattice(coordinates)
+    except ValueError:
+        return calc.assemble(coordinates)
+
+
+def _load(name):
+    """
+    Loads a stored array as a read-only memory map, or returns None if it has
+    not been stored or cannot be read (e.g. removed by another run).
+    """
+    path = os.path.join(_directory, name + ".npy")
+
+    try:
+        array = np.load(path, mmap_mode="r")
+        os.utime(path)
+    except (OSError, ValueError):
+        return None
+
+    return array
+
+
+def _store(name, array):
+    """
+    Stores an array and returns it as a read-only memory map, or as is if
+    another run has already removed the file again.
+    """
+    path = os.path.join(_directory, name + ".npy")
+    _write(path, np.save, array)
+    _evict(keep=path)
+
+    stored = _load(name)
+    if stored is None:
+        return array
+
+    return stored
+
+
+def _write(path, save, *args, **kwargs):
+    """
+    Writes a file with the given NumPy save function (np.save or np.savez).
+    The file is written under a temporary name first, so concurrent runs
+    never see a partially written file.
+    """
+    temp = "{}.{}.tmp".format(path, os.getpid())
+
+    with open(temp, "wb") as fp:
+        save(fp, *args, **kwargs)
+    os.replace(temp, path)
+
+
+def _evict(keep=None):
+    """
+    Removes the least recently used files until the on-disk store is within
+    its size limit. The file given by keep, which has just been written, is
+    never removed.
+    """
+    # Other runs sharing the directory may remove the same files at the same
+    # time, so files that have disappeared are skipped.
+    files = []
+    for name in os.listdir(_directory):
+        path = os.path.join(_directory, name)
+        if path == keep or not name.endswith((".npz", ".npy")):
+            continue
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in files)
+    if keep is not None:
+        try:
+            total += os.stat(keep).st_size
+        except FileNotFoundError:
+            pass
+
+    for _, size, path in sorted(files):
+        if total <= _max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
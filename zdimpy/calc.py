@@ -1,5 +1,11 @@
 import numpy as np
+from scipy import sparse
+from scipy.spatial import cKDTree
 from scipy.special import wofz as w
+from zdimpy import params
+
+# Volume used for the polarizability in the LD and BB models.
+V = 18403
 
 
 def LD(element, freq):
@@ -10,11 +16,12 @@ def LD(element, freq):
     ----------
     freq : Array of frequency points (in eV) to be used for the calculations.
 
-    element : String containing the name of the metal.
+    element : String containing the name of the metal, or a sequence of names.
 
     Returns
     -------
-    alpha : List of complex frequency dependent polarizabilites for the metal.
+    alpha : Array of complex frequency dependent polarizabilites for the metal,
+            with a trailing axis over the metals if a sequence was given.
 
     Note
     ----
@@ -23,316 +30,99 @@ def LD(element, freq):
     Rakić et al. (1998):
     https://doi.org/10.1364/AO.37.005271
     """
-    if element == "Ag":
-        omega_p = 9.01  # eV
-        f0 = 0.845
-        gamma_0 = 0.048  # eV
-
-        f1 = 0.065
-        gamma_1 = 3.886  # eV
-        omega_1 = 0.816  # eV
-
-        f2 = 0.124
-        gamma_2 = 0.452  # eV
-        omega_2 = 4.481  # eV
-
-        f3 = 0.011
-        gamma_3 = 0.065  # eV
-        omega_3 = 8.185  # eV
-
-        f4 = 0.840
-        gamma_4 = 0.916  # eV
-        omega_4 = 9.083  # eV
-
-        f5 = 5.646
-        gamma_5 = 2.419  # eV
-        omega_5 = 20.29  # eV
-
-    elif element == "Au":
-        omega_p = 9.03  # eV
-        f0 = 0.760
-        gamma_0 = 0.053  # eV
-
-        f1 = 0.024
-        gamma_1 = 0.241  # eV
-        omega_1 = 0.415  # eV
-
-        f2 = 0.010
-        gamma_2 = 0.345  # eV
-        omega_2 = 0.830  # eV
-
-        f3 = 0.071
-        gamma_3 = 0.870  # eV
-        omega_3 = 2.969  # eV
-
-        f4 = 0.601
-        gamma_4 = 2.494  # eV
-        omega_4 = 4.304  # eV
-
-        f5 = 4.384
-        gamma_5 = 2.214  # eV
-        omega_5 = 13.32  # eV
-
-    elif element == "Cu":
-        omega_p = 10.83  # eV
-        f0 = 0.575
-        gamma_0 = 0.030  # eV
-
-        f1 = 0.061
-        gamma_1 = 0.378  # eV
-        omega_1 = 0.291  # eV
-
-        f2 = 0.104
-        gamma_2 = 1.056  # eV
-        omega_2 = 2.957  # eV
-
-        f3 = 0.723
-        gamma_3 = 3.213  # eV
-        omega_3 = 5.300  # eV
-
-        f4 = 0.638
-        gamma_4 = 4.305  # eV
-        omega_4 = 11.18  # eV
-
-        f5 = 0
-        gamma_5 = 0  # eV
-        omega_5 = 0  # eV
-
-    elif element == "Al":
-        omega_p = 14.98  # eV
-        f0 = 0.523
-        gamma_0 = 0.047  # eV
-
-        f1 = 0.227
-        gamma_1 = 0.333  # eV
-        omega_1 = 0.162  # eV
-
-        f2 = 0.050
-        gamma_2 = 0.312  # eV
-        omega_2 = 1.544  # eV
-
-        f3 = 0.166
-        gamma_3 = 1.351  # eV
-        omega_3 = 1.808  # eV
-
-        f4 = 0.030
-        gamma_4 = 3.382  # eV
-        omega_4 = 3.473  # eV
-
-        f5 = 0
-        gamma_5 = 0  # eV
-        omega_5 = 0  # eV
-
-    elif element == "Be":
-        omega_p = 18.51  # eV
-        f0 = 0.084
-        gamma_0 = 0.035  # eV
-
-        f1 = 0.031
-        gamma_1 = 1.664  # eV
-        omega_1 = 0.100  # eV
-
-        f2 = 0.140
-        gamma_2 = 3.395  # eV
-        omega_2 = 1.032  # eV
-
-        f3 = 0.530
-        gamma_3 = 4.454  # eV
-        omega_3 = 3.183  # eV
-
-        f4 = 0.130
-        gamma_4 = 1.802  # eV
-        omega_4 = 4.604  # eV
-
-        f5 = 0
-        gamma_5 = 0  # eV
-        omega_5 = 0  # eV
-
-    elif element == "Cr":
-        omega_p = 10.75  # eV
-        f0 = 0.168
-        gamma_0 = 0.047  # eV
-
-        f1 = 0.151
-        gamma_1 = 3.175  # eV
-        omega_1 = 0.121  # eV
-
-        f2 = 0.150
-        gamma_2 = 1.305  # eV
-        omega_2 = 0.543  # eV
-
-        f3 = 1.149
-        gamma_3 = 2.676  # eV
-        omega_3 = 1.970  # eV
-
-        f4 = 0.825
-        gamma_4 = 1.335  # eV
-        omega_4 = 8.775  # eV
-
-        f5 = 0
-        gamma_5 = 0  # eV
-        omega_5 = 0  # eV
-
-    elif element == "Ni":
-        omega_p = 15.92  # eV
-        f0 = 0.096
-        gamma_0 = 0.048  # eV
-
-        f1 = 0.100
-        gamma_1 = 4.511  # eV
-        omega_1 = 0.174  # eV
-
-        f2 = 0.135
-        gamma_2 = 1.334  # eV
-        omega_2 = 0.582  # eV
-
-        f3 = 0.106
-        gamma_3 = 2.178  # eV
-        omega_3 = 1.597  # eV
-
-        f4 = 0.729
-        gamma_4 = 6.292  # eV
-        omega_4 = 6.089  # eV
-
-        f5 = 0
-        gamma_5 = 0  # eV
-        omega_5 = 0  # eV
-
-    elif element == "Pd":
-        omega_p = 9.72  # eV
-        f0 = 0.330
-        gamma_0 = 0.008  # eV
-
-        f1 = 0.649
-        gamma_1 = 2.950  # eV
-        omega_1 = 0.336  # eV
-
-        f2 = 0.121
-        gamma_2 = 0.555  # eV
-        omega_2 = 0.501  # eV
-
-        f3 = 0.638
-        gamma_3 = 4.621  # eV
-        omega_3 = 1.659  # eV
-
-        f4 = 0.453
-        gamma_4 = 3.236  # eV
-        omega_4 = 5.715  # eV
-
-        f5 = 0
-        gamma_5 = 0  # eV
-        omega_5 = 0  # eV
-
-    elif element == "Pt":
-        omega_p = 9.59  # eV
-        f0 = 0.333
-        gamma_0 = 0.080  # eV
-
-        f1 = 0.191
-        gamma_1 = 0.517  # eV
-        omega_1 = 0.780  # eV
-
-        f2 = 0.659
-        gamma_2 = 1.838  # eV
-        omega_2 = 1.314  # eV
-
-        f3 = 0.547
-        gamma_3 = 3.668  # eV
-        omega_3 = 3.141  # eV
-
-        f4 = 3.576
-        gamma_4 = 8.517  # eV
-        omega_4 = 9.249  # eV
-
-        f5 = 0
-        gamma_5 = 0  # eV
-        omega_5 = 0  # eV
-
-    elif element == "Ti":
-        omega_p = 7.29  # eV
-        f0 = 0.148
-        gamma_0 = 0.082  # eV
-
-        f1 = 0.899
-        gamma_1 = 2.276  # eV
-        omega_1 = 0.777  # eV
-
-        f2 = 0.393
-        gamma_2 = 2.518  # eV
-        omega_2 = 1.545  # eV
+    omega_p, f0, gamma_0, oscillators = params.table("LD", element)
+    omega_p = omega_p[:, None]
+    f, gamma, omega = np.moveaxis(oscillators, -1, 0)[..., None]
+
+    # Elements (x oscillators) x frequencies, with the frequencies along the
+    # contiguous axis.
+    shape = np.shape(freq)
+    freq = np.ravel(freq)
+
+    Omega_p = f0[:, None]**0.5 * omega_p  # eV
+
+    dielec = 1 - Omega_p**2 / (freq * (freq + 1j * gamma_0[:, None]))
+    dielec += np.sum(
+        f * omega_p[..., None]**2
+        / ((omega**2 - freq**2) - 1j * freq * gamma),
+        axis=1
+    )
 
-        f3 = 0.187
-        gamma_3 = 1.663  # eV
-        omega_3 = 2.509  # eV
+    alpha = V * ((dielec - 1) / (1 + (1 / 3) * (dielec - 1)))
 
-        f4 = 0.001
-        gamma_4 = 1.762  # eV
-        omega_4 = 19.43  # eV
+    return (
+        _select(alpha, element, shape)
+    )
 
-        f5 = 0
-        gamma_5 = 0  # eV
-        omega_5 = 0  # eV
 
-    elif element == "W":
-        omega_p = 13.22  # eV
-        f0 = 0.206
-        gamma_0 = 0.064  # eV
+def XL(element, freq):
+    """
+    Computes the polarizability of 1 of 11 metals using the extended Lorentz
+    model.
 
-        f1 = 0.054
-        gamma_1 = 0.530  # eV
-        omega_1 = 1.004  # eV
+    Parameters
+    ----------
+    freq : Array of frequency points (in eV) to be used for the calculations.
 
-        f2 = 0.166
-        gamma_2 = 1.281  # eV
-        omega_2 = 1.917  # eV
+    element : String containing the name of the metal, or a sequence of names.
 
-        f3 = 0.706
-        gamma_3 = 3.332  # eV
-        omega_3 = 3.580  # eV
+    Returns
+    -------
+    alpha : Array of complex frequency dependent polarizabilites for the metal,
+            with a trailing axis over the metals if a sequence was given.
 
-        f4 = 2.590
-        gamma_4 = 5.836  # eV
-        omega_4 = 7.498  # eV
+    Note
+    ----
+    All values are from
 
-        f5 = 0
-        gamma_5 = 0  # eV
-        omega_5 = 0  # eV
+    Rakić et al. (1998):
+    https://doi.org/10.1364/AO.37.005271
 
-    Omega_p = f0**0.5 * omega_p  # eV
+    Except for the static polarizabilites, which are from
 
-    def LD_comp(freq):
-        dielec = 1-Omega_p**2/(freq*(freq+1j*gamma_0))
-        dielec += f1*omega_p**2 / ((omega_1**2-freq**2)-1j*freq*gamma_1)
-        dielec += f2*omega_p**2 / ((omega_2**2-freq**2)-1j*freq*gamma_2)
-        dielec += f3*omega_p**2 / ((omega_3**2-freq**2)-1j*freq*gamma_3)
-        dielec += f4*omega_p**2 / ((omega_4**2-freq**2)-1j*freq*gamma_4)
-        dielec += f5*omega_p**2 / ((omega_5**2-freq**2)-1j*freq*gamma_5)
-        return dielec
+    Hillers-Bendtsen et al. (2019):
+    https://doi.org/10.1016/j.cplett.2019.136661
 
-    dielec = LD_comp(freq)
+    Schwerdtfeger et al. (2018):
+    https://doi.org/10.1080/00268976.2018.1535143
+    """
+    omega_p, f0, gamma_0, oscillators = params.table("XL", element)
+    f, gamma, omega = np.moveaxis(oscillators, -1, 0)[..., None]
+    stat_pol = params.static(element)[:, None]  # eV
+
+    # Elements x oscillators x frequencies, with the frequencies along the
+    # contiguous axis.
+    shape = np.shape(freq)
+    freq = np.ravel(freq)
+
+    dielec = np.sum(
+        f * omega_p[:, None, None]**2
+        / ((omega**2 - freq**2) - 1j * freq * gamma),
+        axis=1
+    )
 
-    V = 18403
-    alpha = V * ((dielec-1) / (1+(1/3)*(dielec-1)))
+    alpha = stat_pol * dielec
 
     return (
-        alpha
+        _select(alpha, element, shape)
     )
 
 
-def XL(element, freq):
+def BB(element, freq):
     """
-    Computes the polarizability of 1 of 11 metals using the extended Lorentz
+    Computes the polarizability of 1 of 11 metals using the Brendel-Bormann
     model.
 
     Parameters
     ----------
     freq : Array of frequency points (in eV) to be used for the calculations.
 
-    element : String containing the name of the metal.
+    element : String containing the name of the metal, or a sequence of names.
 
     Returns
     -------
-    alpha : List of complex frequency dependent polarizabilites for the metal.
+    alpha : Array of complex frequency dependent polarizabilites for the metal,
+            with a trailing axis over the metals if a sequence was given.
 
     Note
     ----
@@ -340,829 +130,643 @@ def XL(element, freq):
 
     Rakić et al. (1998):
     https://doi.org/10.1364/AO.37.005271
+    """
+    omega_p, f0, gamma_0, oscillators = params.table("BB", element)
+    omega_p = omega_p[:, None]
+    f, gamma, omega, sigma = np.moveaxis(oscillators, -1, 0)
+
+    # Elements (x oscillators) x frequencies, with the frequencies along the
+    # contiguous axis.
+    shape = np.shape(freq)
+    freq = np.ravel(freq)
+
+    Omega_p = f0[:, None]**.5 * omega_p  # eV
+
+    dielec = 1 - Omega_p**2 / (freq * (freq + 1j * gamma_0[:, None]))
+
+    # The arguments z_a and z_b of all oscillators and frequencies share the
+    # square root and are evaluated in a single call of the Faddeeva function.
+    a = np.sqrt(freq * (freq + 1j * gamma[..., None]))
+    z = np.stack((a - omega[..., None], a + omega[..., None]))
+    z *= 1 / (2**.5 * sigma[..., None])
+    wz = w(z)
+    wz[0] += wz[1]
+    wz[0] /= a
+    dielec += np.einsum(
+        "ej,ejf->ef",
+        1j * np.pi**.5 * f * omega_p**2 / (2**1.5 * sigma),
+        wz[0]
+    )  # χj
+
+    alpha = V * ((dielec - 1) / (1 + (1 / 3) * (dielec - 1)))
 
-    Except for the static polarizabilites, which are from
+    return (
+        _select(alpha, element, shape)
+    )
 
-    Hillers-Bendtsen et al. (2019):
-    https://doi.org/10.1016/j.cplett.2019.136661
 
-    Schwerdtfeger et al. (2018):
-    https://doi.org/10.1080/00268976.2018.1535143
+def _select(alpha, element, shape):
     """
-    if element == "Ag":
-        omega_p = 9.01  # eV
-
-        f1 = 0.065
-        gamma_1 = 3.886  # eV
-        omega_1 = 0.816  # eV
+    Reshapes the polarizabilities (elements x frequencies) to the shape of the
+    frequencies, with a trailing axis over the metals unless a single metal
+    was given.
+    """
+    alpha = alpha.T.reshape(shape + (-1,))
 
-        f2 = 0.124
-        gamma_2 = 0.452  # eV
-        omega_2 = 4.481  # eV
+    if isinstance(element, str):
+        return alpha[..., 0][()]
 
-        f3 = 0.011
-        gamma_3 = 0.065  # eV
-        omega_3 = 8.185  # eV
+    return alpha
 
-        f4 = 0.840
-        gamma_4 = 0.916  # eV
-        omega_4 = 9.083  # eV
 
-        f5 = 5.646
-        gamma_5 = 2.419  # eV
-        omega_5 = 20.29  # eV
+def polarizability(element, model, freq):
+    """
+    Computes the polarizability of the metal using the given model.
 
-        stat_pol = 49.9843*27.211324570273  # eV
+    Parameters
+    ----------
+    element : String containing the name of the metal.
 
-    elif element == "Au":
-        omega_p = 9.03  # eV
-        f0 = 0.760
-        gamma_0 = 0.053  # eV
+    model : String containing the name of the model (LD, XL or BB).
 
-        f1 = 0.024
-        gamma_1 = 0.241  # eV
-        omega_1 = 0.415  # eV
+    freq : Array of frequency points (in eV) to be used for the calculations.
 
-        f2 = 0.010
-        gamma_2 = 0.345  # eV
-        omega_2 = 0.830  # eV
+    Returns
+    -------
+    alpha : Array of complex frequency dependent polarizabilites for the metal.
+    """
+    if model == "LD":
+        alpha = LD(element, freq)
+    elif model == "XL":
+        alpha = XL(element, freq)
+    elif model == "BB":
+        alpha = BB(element, freq)
+    else:
+        raise ValueError("Unknown model: {}".format(model))
 
-        f3 = 0.071
-        gamma_3 = 0.870  # eV
-        omega_3 = 2.969  # eV
+    return (
+        alpha
+    )
 
-        f4 = 0.601
-        gamma_4 = 2.494  # eV
-        omega_4 = 4.304  # eV
 
-        f5 = 4.384
-        gamma_5 = 2.214  # eV
-        omega_5 = 13.32  # eV
+def spatial_dist(coordinates, origin, out=None, dtype=float, memory=2**26):
+    """
+    Computes the spatial distance between each atom as well as the spatial
+    distance from the origin (centre of cluster) to each atom.
 
-        stat_pol = 31.0400*27.211324570273  # eV
+    The distances between the atoms are computed a block of rows at a time,
+    so only temporaries of the size of a row block are allocated besides the
+    result.
 
-    elif element == "Cu":
-        omega_p = 10.83  # eV
-        f0 = 0.575
-        gamma_0 = 0.030  # eV
+    Parameters
+    ----------
+    coordinates : Array containing the coordinates of the atoms.
 
-        f1 = 0.061
-        gamma_1 = 0.378  # eV
-        omega_1 = 0.291  # eV
+    origin : Array containing the coordinates of the origin.
 
-        f2 = 0.104
-        gamma_2 = 1.056  # eV
-        omega_2 = 2.957  # eV
+    out : Optional array (N x N) the distances between the atoms are written
+          into.
 
-        f3 = 0.723
-        gamma_3 = 3.213  # eV
-        omega_3 = 5.300  # eV
+    dtype : Data type of the distances between the atoms if no out array is
+            given, e.g. np.float32 to halve the memory.
 
-        f4 = 0.638
-        gamma_4 = 4.305  # eV
-        omega_4 = 11.18  # eV
+    memory : Memory budget (in bytes) for the temporaries of a row block.
 
-        f5 = 0
-        gamma_5 = 0  # eV
-        omega_5 = 0  # eV
+    Returns
+    -------
+    p_dist : Spatial distance between each atom.
 
-        stat_pol = 33.7420*27.211324570273  # eV
+    o_dist : Spatial distance from the origin to each atom.
+    """
+    coordinates = np.asarray(coordinates, dtype=float)
+    n = len(coordinates)
 
-    elif element == "Al":
-        omega_p = 14.98  # eV
-        f0 = 0.523
-        gamma_0 = 0.047  # eV
+    if out is None:
+        out = np.empty((n, n), dtype=dtype)
 
-        f1 = 0.227
-        gamma_1 = 0.333  # eV
-        omega_1 = 0.162  # eV
+    # The differences and squared distances of a block.
+    rows = max(1, int(memory // (4 * 8 * n)))
 
-        f2 = 0.050
-        gamma_2 = 0.312  # eV
-        omega_2 = 1.544  # eV
+    for start in range(0, n, rows):
+        stop = min(start + rows, n)
 
-        f3 = 0.166
-        gamma_3 = 1.351  # eV
-        omega_3 = 1.808  # eV
+        diff = coordinates - coordinates[start:stop, None]
+        np.sqrt(np.einsum("ijk,ijk->ij", diff, diff), out=out[start:stop])
 
-        f4 = 0.030
-        gamma_4 = 3.382  # eV
-        omega_4 = 3.473  # eV
+    return (
+        out,
+        origin_dist(coordinates, origin)
+    )
 
-        f5 = 0
-        gamma_5 = 0  # eV
-        omega_5 = 0  # eV
 
-        stat_pol = 57.8*27.211324570273  # eV
+def origin_dist(coordinates, origin):
+    """
+    Computes the spatial distance from the origin (centre of cluster) to each
+    atom.
 
-    elif element == "Be":
-        omega_p = 18.51  # eV
-        f0 = 0.084
-        gamma_0 = 0.035  # eV
+    Parameters
+    ----------
+    coordinates : Array containing the coordinates of the atoms.
 
-        f1 = 0.031
-        gamma_1 = 1.664  # eV
-        omega_1 = 0.100  # eV
+    origin : Array containing the coordinates of the origin.
 
-        f2 = 0.140
-        gamma_2 = 3.395  # eV
-        omega_2 = 1.032  # eV
+    Returns
+    -------
+    o_dist : Spatial distance from the origin to each atom.
+    """
+    return np.linalg.norm(origin - coordinates[:, None], axis=-1)
 
-        f3 = 0.530
-        gamma_3 = 4.454  # eV
-        omega_3 = 3.183  # eV
 
-        f4 = 0.130
-        gamma_4 = 1.802  # eV
-        omega_4 = 4.604  # eV
+def point_diff(coordinates, out=None, dtype=float, memory=2**26):
+    """
+    Computes the difference between each x-coordinate, each y-coordinate, and
+    each z-coordinate, respectively, i.e. (x_n - x_m), (y_n - y_m), and
+    (z_n - z_m).
 
-        f5 = 0
-        gamma_5 = 0  # eV
-        omega_5 = 0  # eV
+    The differences are computed once for a block of rows at a time and
+    written into the three outputs, so only temporaries of the size of a row
+    block are allocated besides the result.
 
-        stat_pol = 37.74*27.211324570273  # eV
+    Parameters
+    ----------
+    coordinates : Array containing the coordinates for the atoms.
 
-    elif element == "Cr":
-        omega_p = 10.75  # eV
-        f0 = 0.168
-        gamma_0 = 0.047  # eV
+    out : Optional tuple of three arrays (N x N) the differences are written
+          into.
 
-        f1 = 0.151
-        gamma_1 = 3.175  # eV
-        omega_1 = 0.121  # eV
+    dtype : Data type of the differences if no out arrays are given, e.g.
+            np.float32 to halve the memory.
 
-        f2 = 0.150
-        gamma_2 = 1.305  # eV
-        omega_2 = 0.543  # eV
+    memory : Memory budget (in bytes) for the temporaries of a row block.
 
-        f3 = 1.149
-        gamma_3 = 2.676  # eV
-        omega_3 = 1.970  # eV
+    Returns
+    -------
+    x_diff : Difference between each of the x-coordinates.
 
-        f4 = 0.825
-        gamma_4 = 1.335  # eV
-        omega_4 = 8.775  # eV
+    y_diff : Difference between each of the y-coordinates.
 
-        f5 = 0
-        gamma_5 = 0  # eV
-        omega_5 = 0  # eV
+    z_diff : Difference between each of the z-coordinates.
+    """
+    coordinates = np.asarray(coordinates, dtype=float)
+    n = len(coordinates)
 
-        stat_pol = 83*27.211324570273  # eV
+    if out is None:
+        out = tuple(np.empty((n, n), dtype=dtype) for _ in range(3))
 
-    elif element == "Ni":
-        omega_p = 15.92  # eV
-        f0 = 0.096
-        gamma_0 = 0.048  # eV
+    # The differences of a block.
+    rows = max(1, int(memory // (3 * 8 * n)))
 
-        f1 = 0.100
-        gamma_1 = 4.511  # eV
-        omega_1 = 0.174  # eV
+    for start in range(0, n, rows):
+        stop = min(start + rows, n)
 
-        f2 = 0.135
-        gamma_2 = 1.334  # eV
-        omega_2 = 0.582  # eV
+        diff = coordinates - coordinates[start:stop, None]
+        for k in range(3):
+            out[k][start:stop] = diff[..., k]
 
-        f3 = 0.106
-        gamma_3 = 2.178  # eV
-        omega_3 = 1.597  # eV
+    return (
+        out[0],
+        out[1],
+        out[2]
+    )
 
-        f4 = 0.729
-        gamma_4 = 6.292  # eV
-        omega_4 = 6.089  # eV
 
-        f5 = 0
-        gamma_5 = 0  # eV
-        omega_5 = 0  # eV
+def T(x_diff, y_diff, z_diff, p_dist):
+    """
+    Computes the real second-order dipole interaction tensors.
 
-        stat_pol = 49*27.211324570273  # eV
+    Parameters
+    ----------
+    x_diff : Difference between all the x-coordinates.
 
-    elif element == "Pd":
-        omega_p = 9.72  # eV
-        f0 = 0.330
-        gamma_0 = 0.008  # eV
+    y_diff : Difference between all the y-coordinates.
 
-        f1 = 0.649
-        gamma_1 = 2.950  # eV
-        omega_1 = 0.336  # eV
+    z_diff : Difference between all the z-coordinates.
 
-        f2 = 0.121
-        gamma_2 = 0.555  # eV
-        omega_2 = 0.501  # eV
+    p_dist : Spatial distance between each atom.
 
-        f3 = 0.638
-        gamma_3 = 4.621  # eV
-        omega_3 = 1.659  # eV
+    Returns
+    -------
+    T_xx : Array containing all the xx components.
 
-        f4 = 0.453
-        gamma_4 = 3.236  # eV
-        omega_4 = 5.715  # eV
+    T_yy : Array containing all the yy components.
 
-        f5 = 0
-        gamma_5 = 0  # eV
-        omega_5 = 0  # eV
+    T_zz : Array containing all the zz components.
 
-        stat_pol = 26.14*27.211324570273  # eV
+    T_xy : Array containing all the xy components.
 
-    elif element == "Pt":
-        omega_p = 9.59  # eV
-        f0 = 0.333
-        gamma_0 = 0.080  # eV
+    T_xz : Array containing all the xz components.
 
-        f1 = 0.191
-        gamma_1 = 0.517  # eV
-        omega_1 = 0.780  # eV
+    T_yz : Array containing all the yz components.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        T_xx = ((3 * x_diff**2) / p_dist**5) - (1 / p_dist**3)
+        T_yy = ((3 * y_diff**2) / p_dist**5) - (1 / p_dist**3)
+        T_zz = ((3 * z_diff**2) / p_dist**5) - (1 / p_dist**3)
+        T_xy = ((3 * x_diff * y_diff) / p_dist**5)
+        T_xz = ((3 * x_diff * z_diff) / p_dist**5)
+        T_yz = ((3 * z_diff * y_diff) / p_dist**5)
 
-        f2 = 0.659
-        gamma_2 = 1.838  # eV
-        omega_2 = 1.314  # eV
+    T_xx[np.isnan(T_xx)] = 0
+    T_yy[np.isnan(T_yy)] = 0
+    T_zz[np.isnan(T_zz)] = 0
+    T_xy[np.isnan(T_xy)] = 0
+    T_xz[np.isnan(T_xz)] = 0
+    T_yz[np.isnan(T_yz)] = 0
 
-        f3 = 0.547
-        gamma_3 = 3.668  # eV
-        omega_3 = 3.141  # eV
+    return (
+        T_xx,
+        T_yy,
+        T_zz,
+        T_xy,
+        T_xz,
+        T_yz
+    )
 
-        f4 = 3.576
-        gamma_4 = 8.517  # eV
-        omega_4 = 9.249  # eV
 
-        f5 = 0
-        gamma_5 = 0  # eV
-        omega_5 = 0  # eV
+def tensor_stack(arrays):
+    """
+    Reshapes a touple of arrays in accordance with the shape of the A matrix.
 
-        stat_pol = 48*27.211324570273  # eV
+    Parameters
+    ----------
+    arrays : Touple of arrays.
 
-    elif element == "Ti":
-        omega_p = 7.29  # eV
-        f0 = 0.148
-        gamma_0 = 0.082  # eV
+    Returns
+    -------
+    array : Total array with the proper shape.
+    """
+    arrays = np.asarray(arrays)
+    n, p, q = arrays.shape
+    s = int(round(np.sqrt(n)))
+    arrays = arrays.reshape(s, -1, p, q)
 
-        f1 = 0.899
-        gamma_1 = 2.276  # eV
-        omega_1 = 0.777  # eV
+    return arrays.transpose(2, 0, 3, 1).reshape(s * p, -1)
 
-        f2 = 0.393
-        gamma_2 = 2.518  # eV
-        omega_2 = 1.545  # eV
 
-        f3 = 0.187
-        gamma_3 = 1.663  # eV
-        omega_3 = 2.509  # eV
+def assemble(coordinates, out=None, dtype=float, memory=2**26):
+    """
+    Assembles the stacked real dipole interaction tensor of the atoms.
 
-        f4 = 0.001
-        gamma_4 = 1.762  # eV
-        omega_4 = 19.43  # eV
+    The tensor is written directly into a single (3N x 3N) array, a block of
+    rows at a time, so only temporaries of the size of a row block are
+    allocated besides the result. Gives the same tensor as stacking the
+    components from T with tensor_stack.
 
-        f5 = 0
-        gamma_5 = 0  # eV
-        omega_5 = 0  # eV
+    Parameters
+    ----------
+    coordinates : Array containing the coordinates of the atoms.
 
-        stat_pol = 100*27.211324570273  # eV
+    out : Optional C-contiguous array (3N x 3N) the tensor is written into,
+          e.g. a complex array later used for the A matrix.
 
-    elif element == "W":
-        omega_p = 13.22  # eV
-        f0 = 0.206
-        gamma_0 = 0.064  # eV
+    dtype : Data type of the tensor if no out array is given.
 
-        f1 = 0.054
-        gamma_1 = 0.530  # eV
-        omega_1 = 1.004  # eV
+    memory : Memory budget (in bytes) for the temporaries of a row block.
 
-        f2 = 0.166
-        gamma_2 = 1.281  # eV
-        omega_2 = 1.917  # eV
+    Returns
+    -------
+    temp_A : Array (3N x 3N) containing the interaction tensor, with the
+             Cartesian components of each atom interleaved.
+    """
+    coordinates = np.asarray(coordinates, dtype=float)
+    n = len(coordinates)
 
-        f3 = 0.706
-        gamma_3 = 3.332  # eV
-        omega_3 = 3.580  # eV
+    if out is None:
+        out = np.empty((3 * n, 3 * n), dtype=dtype)
 
-        f4 = 2.590
-        gamma_4 = 5.836  # eV
-        omega_4 = 7.498  # eV
+    # Atom x component x atom x component
+    view = out.reshape(n, 3, n, 3)
 
-        f5 = 0
-        gamma_5 = 0  # eV
-        omega_5 = 0  # eV
+    # The differences and three distance arrays of a block.
+    rows = max(1, int(memory // (6 * 8 * n)))
 
-        stat_pol = 68*27.211324570273  # eV
+    for start in range(0, n, rows):
+        stop = min(start + rows, n)
 
-    def XL_comp(freq):
-        dielec = f1*omega_p**2 / ((omega_1**2-freq**2)-1j*freq*gamma_1)
-        dielec += f2*omega_p**2 / ((omega_2**2-freq**2)-1j*freq*gamma_2)
-        dielec += f3*omega_p**2 / ((omega_3**2-freq**2)-1j*freq*gamma_3)
-        dielec += f4*omega_p**2 / ((omega_4**2-freq**2)-1j*freq*gamma_4)
-        dielec += f5*omega_p**2 / ((omega_5**2-freq**2)-1j*freq*gamma_5)
-        alpha = stat_pol * dielec
-        return alpha
+        diff, r3, r5 = kernel(coordinates, start, stop)
 
-    alpha = XL_comp(freq)
+        for a in range(3):
+            for b in range(a, 3):
+                block = view[start:stop, a, :, b]
+                np.multiply(diff[..., a], diff[..., b], out=block)
+                block *= r5
+                if a == b:
+                    block -= r3
+                else:
+                    view[start:stop, b, :, a] = block
 
-    return (
-        alpha
-    )
+    return out
 
 
-def BB(element, freq):
+def assemble_sparse(coordinates, cutoff):
     """
-    Computes the polarizability of 1 of 11 metals using the Brendel-Bormann
-    model.
+    Assembles the dipole interaction tensor of the atoms, keeping only the
+    interactions between atoms closer than the cutoff distance.
+
+    The neighbour pairs are found with a KD-tree, so memory and time are
+    linear in the number of atoms for a fixed cutoff.
 
     Parameters
     ----------
-    freq : Array of frequency points (in eV) to be used for the calculations.
+    coordinates : Array containing the coordinates of the atoms.
 
-    element : String containing the name of the metal.
+    cutoff : Distance (in the units of the coordinates) beyond which the
+             interactions are dropped.
 
     Returns
     -------
-    alpha : List of complex frequency dependent polarizabilites for the metal.
+    temp_A : Sparse BSR matrix (3N x 3N) with 3x3 blocks containing the
+             truncated interaction tensor.
+    """
+    coordinates = np.asarray(coordinates, dtype=float)
+    n = len(coordinates)
 
-    Note
-    ----
-    All values are from
+    pairs = cKDTree(coordinates).query_pairs(cutoff, output_type="ndarray")
+    rows = np.concatenate((pairs[:, 0], pairs[:, 1]))
+    cols = np.concatenate((pairs[:, 1], pairs[:, 0]))
 
-    Rakić et al. (1998):
-    https://doi.org/10.1364/AO.37.005271
-    """
-    if element == "Ag":
-        omega_p = 9.01  # eV
-        f0 = 0.821
-        gamma_0 = 0.049  # eV
-
-        f1 = 0.050
-        gamma_1 = 0.189  # eV
-        omega_1 = 2.025  # eV
-        sigma_1 = 1.894  # eV
-
-        f2 = 0.133
-        gamma_2 = 0.067  # eV
-        omega_2 = 5.185  # eV
-        sigma_2 = 0.665  # eV
-
-        f3 = 0.051
-        gamma_3 = 0.019  # eV
-        omega_3 = 4.343  # eV
-        sigma_3 = 0.189  # eV
-
-        f4 = 0.467
-        gamma_4 = 0.117  # eV
-        omega_4 = 9.809  # eV
-        sigma_4 = 1.170  # eV
-
-        f5 = 4.000
-        gamma_5 = 0.052  # eV
-        omega_5 = 18.56  # eV
-        sigma_5 = 0.516  # eV
-
-    elif element == "Au":
-        omega_p = 9.03  # eV
-        f0 = 0.770
-        gamma_0 = 0.050  # eV
-
-        f1 = 0.054
-        gamma_1 = 0.074  # eV
-        omega_1 = 0.218  # eV
-        sigma_1 = 0.742  # eV
-
-        f2 = 0.050
-        gamma_2 = 0.035  # eV
-        omega_2 = 2.885  # eV
-        sigma_2 = 0.349  # eV
-
-        f3 = 0.312
-        gamma_3 = 0.083  # eV
-        omega_3 = 4.069  # eV
-        sigma_3 = 0.830  # eV
-
-        f4 = 0.719
-        gamma_4 = 0.125  # eV
-        omega_4 = 6.137  # eV
-        sigma_4 = 1.246  # eV
-
-        f5 = 1.648
-        gamma_5 = 0.179  # eV
-        omega_5 = 27.97  # eV
-        sigma_5 = 1.795  # eV
-
-    elif element == "Cu":
-        omega_p = 10.83  # eV
-        f0 = 0.562
-        gamma_0 = 0.030  # eV
-
-        f1 = 0.076
-        gamma_1 = 0.056  # eV
-        omega_1 = 0.416  # eV
-        sigma_1 = 0.562  # eV
-
-        f2 = 0.081
-        gamma_2 = 0.047  # eV
-        omega_2 = 2.849  # eV
-        sigma_2 = 0.469  # eV
-
-        f3 = 0.324
-        gamma_3 = 0.113  # eV
-        omega_3 = 4.819  # eV
-        sigma_3 = 1.131  # eV
-
-        f4 = 0.726
-        gamma_4 = 0.172  # eV
-        omega_4 = 8.136  # eV
-        sigma_4 = 1.719  # eV
-
-    elif element == "Al":
-        omega_p = 14.98  # eV
-        f0 = 0.526
-        gamma_0 = 0.047  # eV
-
-        f1 = 0.213
-        gamma_1 = 0.312  # eV
-        omega_1 = 0.163  # eV
-        sigma_1 = 0.013  # eV
-
-        f2 = 0.060
-        gamma_2 = 0.315  # eV
-        omega_2 = 1.561  # eV
-        sigma_2 = 0.042  # eV
-
-        f3 = 0.182
-        gamma_3 = 1.587  # eV
-        omega_3 = 1.827  # eV
-        sigma_3 = 0.256  # eV
-
-        f4 = 0.014
-        gamma_4 = 2.145  # eV
-        omega_4 = 4.495  # eV
-        sigma_4 = 1.735  # eV
-
-    elif element == "Be":
-        omega_p = 18.51  # eV
-        f0 = 0.081
-        gamma_0 = 0.035  # eV
-
-        f1 = 0.066
-        gamma_1 = 2.956  # eV
-        omega_1 = 0.131  # eV
-        sigma_1 = 0.277  # eV
-
-        f2 = 0.067
-        gamma_2 = 3.962  # eV
-        omega_2 = 0.469  # eV
-        sigma_2 = 3.167  # eV
-
-        f3 = 0.346
-        gamma_3 = 2.398  # eV
-        omega_3 = 2.827  # eV
-        sigma_3 = 1.446  # eV
-
-        f4 = 0.311
-        gamma_4 = 3.904  # eV
-        omega_4 = 4.318  # eV
-        sigma_4 = 0.893  # eV
-
-    elif element == "Cr":
-        omega_p = 10.75  # eV
-        f0 = 0.154
-        gamma_0 = 0.048  # eV
-
-        f1 = 0.338
-        gamma_1 = 4.256  # eV
-        omega_1 = 0.281  # eV
-        sigma_1 = 0.115  # eV
-
-        f2 = 0.261
-        gamma_2 = 3.957  # eV
-        omega_2 = 0.584  # eV
-        sigma_2 = 0.252  # eV
-
-        f3 = 0.817
-        gamma_3 = 2.218  # eV
-        omega_3 = 1.919  # eV
-        sigma_3 = 0.225  # eV
-
-        f4 = 0.105
-        gamma_4 = 6.983  # eV
-        omega_4 = 6.997  # eV
-        sigma_4 = 4.903  # eV
-
-    elif element == "Ni":
-        omega_p = 15.92  # eV
-        f0 = 0.083
-        gamma_0 = 0.022  # eV
-
-        f1 = 0.357
-        gamma_1 = 2.820  # eV
-        omega_1 = 0.317  # eV
-        sigma_1 = 0.606  # eV
-
-        f2 = 0.039
-        gamma_2 = 0.120  # eV
-        omega_2 = 1.059  # eV
-        sigma_2 = 1.454  # eV
-
-        f3 = 0.127
-        gamma_3 = 1.822  # eV
-        omega_3 = 4.583  # eV
-        sigma_3 = 0.379  # eV
-
-        f4 = 0.654
-        gamma_4 = 6.637  # eV
-        omega_4 = 8.825  # eV
-        sigma_4 = 0.510  # eV
-
-    elif element == "Pd":
-        omega_p = 9.72  # eV
-        f0 = 0.330
-        gamma_0 = 0.009  # eV
-
-        f1 = 0.769
-        gamma_1 = 2.343  # eV
-        omega_1 = 0.066  # eV
-        sigma_1 = 0.694  # eV
-
-        f2 = 0.093
-        gamma_2 = 0.497  # eV
-        omega_2 = 0.502  # eV
-        sigma_2 = 0.027  # eV
-
-        f3 = 0.309
-        gamma_3 = 2.022  # eV
-        omega_3 = 2.432  # eV
-        sigma_3 = 1.167  # eV
-
-        f4 = 0.409
-        gamma_4 = 0.119  # eV
-        omega_4 = 5.987  # eV
-        sigma_4 = 1.331  # eV
-
-    elif element == "Pt":
-        omega_p = 9.59  # eV
-        f0 = 0.333
-        gamma_0 = 0.080  # eV
-
-        f1 = 0.186
-        gamma_1 = 0.498  # eV
-        omega_1 = 0.782  # eV
-        sigma_1 = 0.031  # eV
-
-        f2 = 0.665
-        gamma_2 = 1.851  # eV
-        omega_2 = 1.317  # eV
-        sigma_2 = 0.096  # eV
-
-        f3 = 0.551
-        gamma_3 = 2.604  # eV
-        omega_3 = 3.189  # eV
-        sigma_3 = 0.766  # eV
-
-        f4 = 2.214
-        gamma_4 = 2.891  # eV
-        omega_4 = 8.236  # eV
-        sigma_4 = 1.146  # eV
-
-    elif element == "Ti":
-        omega_p = 7.29  # eV
-        f0 = 0.126
-        gamma_0 = 0.067  # eV
-
-        f1 = 0.427
-        gamma_1 = 1.877  # eV
-        omega_1 = 1.459  # eV
-        sigma_1 = 0.463  # eV
-
-        f2 = 0.218
-        gamma_2 = 0.100  # eV
-        omega_2 = 2.661  # eV
-        sigma_2 = 0.506  # eV
-
-        f3 = 0.513
-        gamma_3 = 0.615  # eV
-        omega_3 = 0.805  # eV
-        sigma_3 = 0.799  # eV
-
-        f4 = 0.0002
-        gamma_4 = 4.109  # eV
-        omega_4 = 19.86  # eV
-        sigma_4 = 2.854  # eV
-
-    elif element == "W":
-        omega_p = 13.22  # eV
-        f0 = 0.197
-        gamma_0 = 0.057  # eV
-
-        f1 = 0.006
-        gamma_1 = 3.689  # eV
-        omega_1 = 0.481  # eV
-        sigma_1 = 3.754  # eV
-
-        f2 = 0.022
-        gamma_2 = 0.277  # eV
-        omega_2 = 0.985  # eV
-        sigma_2 = 0.059  # eV
-
-        f3 = 0.136
-        gamma_3 = 1.433  # eV
-        omega_3 = 1.962  # eV
-        sigma_3 = 0.273  # eV
-
-        f4 = 2.648
-        gamma_4 = 4.555  # eV
-        omega_4 = 5.442  # eV
-        sigma_4 = 1.912  # eV
-
-    Omega_p = f0**.5 * omega_p  # eV
-
-    if element == "Ag" or "Au":
-        def BB_comp(freq):
-            dielec = 1-Omega_p**2/(freq*(freq+1j*gamma_0))
-
-            alpha = (freq**2+1j*freq*gamma_1)**0.5
-            za = (alpha-omega_1)/(2**.5*sigma_1)
-            zb = (alpha+omega_1)/(2**.5*sigma_1)
-            dielec += 1j*np.pi**.5*f1*omega_p**2 / \
-                (2**1.5*alpha*sigma_1) * (w(za)+w(zb))  # χ1
-
-            alpha = (freq**2+1j*freq*gamma_2)**0.5
-            za = (alpha-omega_2)/(2**.5*sigma_2)
-            zb = (alpha+omega_2)/(2**.5*sigma_2)
-            dielec += 1j*np.pi**.5*f2*omega_p**2 / \
-                (2**1.5*alpha*sigma_2) * (w(za)+w(zb))  # χ2
-
-            alpha = (freq**2+1j*freq*gamma_3)**0.5
-            za = (alpha-omega_3)/(2**.5*sigma_3)
-            zb = (alpha+omega_3)/(2**.5*sigma_3)
-            dielec += 1j*np.pi**.5*f3*omega_p**2 / \
-                (2**1.5*alpha*sigma_3) * (w(za)+w(zb))  # χ3
-
-            alpha = (freq**2+1j*freq*gamma_4)**0.5
-            za = (alpha-omega_4)/(2**.5*sigma_4)
-            zb = (alpha+omega_4)/(2**.5*sigma_4)
-            dielec += 1j*np.pi**.5*f4*omega_p**2 / \
-                (2**1.5*alpha*sigma_4) * (w(za)+w(zb))  # χ4
-
-            alpha = (freq**2+1j*freq*gamma_5)**0.5
-            za = (alpha-omega_5)/(2**.5*sigma_5)
-            zb = (alpha+omega_5)/(2**.5*sigma_5)
-            dielec += 1j*np.pi**.5*f5*omega_p**2 / \
-                (2**1.5*alpha*sigma_5) * (w(za)+w(zb))  # χ5
-
-            return dielec
-
-    # if element == "Cu" or "Ti" or "Al" or "Be" or "Cr" or "Ni" or "Pd" or "Pt" or "Ti" or "W":
-    if element == set(["Cu", "Al", "Be", "Cr", "Ni", "Pd", "Pt", "Ti", "W"]):
-        def BB_comp(freq):
-            dielec = 1-Omega_p**2/(freq*(freq+1j*gamma_0))
-
-            alpha = (freq**2+1j*freq*gamma_1)**0.5
-            za = (alpha-omega_1)/(2**.5*sigma_1)
-            zb = (alpha+omega_1)/(2**.5*sigma_1)
-            dielec += 1j*np.pi**.5*f1*omega_p**2 / \
-                (2**1.5*alpha*sigma_1) * (w(za)+w(zb))  # χ1
-
-            alpha = (freq**2+1j*freq*gamma_2)**0.5
-            za = (alpha-omega_2)/(2**.5*sigma_2)
-            zb = (alpha+omega_2)/(2**.5*sigma_2)
-            dielec += 1j*np.pi**.5*f2*omega_p**2 / \
-                (2**1.5*alpha*sigma_2) * (w(za)+w(zb))  # χ2
-
-            alpha = (freq**2+1j*freq*gamma_3)**0.5
-            za = (alpha-omega_3)/(2**.5*sigma_3)
-            zb = (alpha+omega_3)/(2**.5*sigma_3)
-            dielec += 1j*np.pi**.5*f3*omega_p**2 / \
-                (2**1.5*alpha*sigma_3) * (w(za)+w(zb))  # χ3
-
-            alpha = (freq**2+1j*freq*gamma_4)**0.5
-            za = (alpha-omega_4)/(2**.5*sigma_4)
-            zb = (alpha+omega_4)/(2**.5*sigma_4)
-            dielec += 1j*np.pi**.5*f4*omega_p**2 / \
-                (2**1.5*alpha*sigma_4) * (w(za)+w(zb))  # χ4
-
-            return dielec
-
-    dielec = BB_comp(freq)
-
-    V = 18403
-    alpha = V * ((dielec-1) / (1+(1/3)*(dielec-1)))
+    diff = coordinates[cols] - coordinates[rows]
+    r2 = np.einsum("ij,ij->i", diff, diff)
 
-    return (
-        alpha
+    # Coinciding atoms do not interact.
+    with np.errstate(divide="ignore"):
+        r3 = r2**-1.5
+    r3[r2 == 0] = 0
+    r5 = np.divide(3 * r3, r2, out=np.zeros_like(r3), where=r2 > 0)
+
+    blocks = np.einsum("i,ij,ik->ijk", r5, diff, diff)
+    blocks[:, [0, 1, 2], [0, 1, 2]] -= r3[:, None]
+
+    order = np.lexsort((cols, rows))
+    indptr = np.zeros(n + 1, dtype=int)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+
+    return sparse.bsr_matrix(
+        (blocks[order], cols[order], indptr),
+        shape=(3 * n, 3 * n)
     )
 
 
-def spatial_dist(coordinates, origin):
+def truncation(coordinates, cutoff, memory=2**26):
     """
-    Computes the spatial distance between each atom as well as the spatial
-    distance from the origin (centre of cluster) to each atom.
+    Computes the relative error of the interaction tensor truncated at the
+    cutoff distance (see assemble_sparse) against the dense tensor.
+
+    Every 3x3 block has the Frobenius norm sqrt(6) / r^3, so the error only
+    needs the distances, which are computed a block of rows at a time.
 
     Parameters
     ----------
     coordinates : Array containing the coordinates of the atoms.
 
+    cutoff : Distance (in the units of the coordinates) beyond which the
+             interactions are dropped.
+
+    memory : Memory budget (in bytes) for the temporaries of a row block.
+
     Returns
     -------
-    p_dist : Spatial distance between each atom.
-
-    o_dist : Spatial distance from the origin to each atom.
+    error : Relative Frobenius norm |T - T_cutoff| / |T| of the dropped
+            interactions.
     """
-    return (
-        np.linalg.norm(coordinates - coordinates[:, None], axis=-1),
-        np.linalg.norm(origin - coordinates[:, None], axis=-1)
-    )
+    coordinates = np.asarray(coordinates, dtype=float)
+    n = len(coordinates)
+
+    dropped = 0.0
+    total = 0.0
+
+    rows = max(1, int(memory // (6 * 8 * n)))
+
+    for start in range(0, n, rows):
+        stop = min(start + rows, n)
+
+        r6 = kernel(coordinates, start, stop)[1]**2
 
+        total += r6.sum()
+        dropped += r6[r6 < cutoff**-6].sum()
 
-def point_diff(coordinates):
+    if total == 0:
+        return 0.0
+
+    return np.sqrt(dropped / total)
+
+
+def assemble_lattice(coordinates, out=None, dtype=float, spacing=None,
+                     memory=2**26):
     """
-    Computes the difference between each x-coordinate, each y-coordinate, and
-    each z-coordinate, respectively, i.e. (x_n - x_m), (y_n - y_m), and
-    (z_n - z_m).
+    Assembles the stacked real dipole interaction tensor of atoms sitting on
+    a regular lattice.
+
+    On a lattice every 3x3 block only depends on the integer offset between
+    two sites, so each distinct block is computed once (see lattice_table)
+    and the tensor is filled by looking up the block of every pair, a block
+    of rows at a time. The assembly then mostly moves memory instead of
+    evaluating the kernel for every pair.
 
     Parameters
     ----------
-    coordinates : Array containing the coordinates for the atoms.
+    coordinates : Array containing the coordinates of the atoms.
+
+    out : Optional C-contiguous array (3N x 3N) the tensor is written into.
+
+    dtype : Data type of the tensor if no out array is given.
+
+    spacing : Optional lattice spacing along each axis, detected from the
+              coordinates if not given (see lattice).
+
+    memory : Memory budget (in bytes) for the temporaries of a row block.
 
     Returns
     -------
-    x_diff : Difference between each of the x-coordinates.
+    temp_A : Array (3N x 3N) containing the interaction tensor, with the
+             Cartesian components of each atom interleaved.
+    """
+    coordinates = np.asarray(coordinates, dtype=float)
+    n = len(coordinates)
 
-    y_diff : Difference between each of the y-coordinates.
+    indices, spacing = lattice(coordinates, spacing)
+    size = indices.max(axis=0) + 1
 
-    z_diff : Difference between each of the z-coordinates.
-    """
-    return (
-        (coordinates - coordinates[:, None])[..., 0],
-        (coordinates - coordinates[:, None])[..., 1],
-        (coordinates - coordinates[:, None])[..., 2]
-    )
+    # The lookup does not pay off for sparsely occupied lattices.
+    if np.prod(2 * size - 1, dtype=float) > n**2:
+        raise ValueError("The lattice table would exceed the tensor")
 
+    # Component x offset x component, such that the blocks of a component
+    # row are looked up straight into the tensor.
+    table = lattice_table(size, spacing).reshape(-1, 3, 3)
+    table = np.ascontiguousarray(table.transpose(1, 0, 2))
 
-def T(x_diff, y_diff, z_diff, p_dist):
+    # The offsets between the sites in the flattened table.
+    strides = np.array([(2 * size[1] - 1) * (2 * size[2] - 1),
+                        2 * size[2] - 1, 1])
+    code = np.dot(indices, strides)
+    center = np.dot(size - 1, strides)
+
+    if out is None:
+        out = np.empty((3 * n, 3 * n), dtype=dtype)
+    table = table.astype(out.dtype, copy=False)
+
+    # Atom x component x atom x component
+    view = out.reshape(n, 3, n, 3)
+
+    # The offsets of a block, kept small enough to stay in the cache.
+    rows = max(1, int(memory // (64 * n)))
+
+    for start in range(0, n, rows):
+        stop = min(start + rows, n)
+
+        offset = code - code[start:stop, None]
+        offset += center
+        for a in range(3):
+            np.take(table[a], offset, axis=0, out=view[start:stop, a],
+                    mode="clip")
+
+    return out
+
+
+def lattice_table(size, spacing):
     """
-    Computes the real second-order dipole interaction tensors.
+    Computes the 3x3 blocks of the dipole interaction tensor for all offsets
+    between the sites of a lattice grid.
 
     Parameters
     ----------
-    x_diff : Difference between all the x-coordinates.
+    size : Number of sites of the grid along each axis.
 
-    y_diff : Difference between all the y-coordinates.
-
-    z_diff : Difference between all the z-coordinates.
-
-    p_dist : Spatial distance between each atom.
+    spacing : Lattice spacing along each axis.
 
     Returns
     -------
-    T_xx : Array containing all the xx components.
+    table : Array (2n_x - 1 x 2n_y - 1 x 2n_z - 1 x 3 x 3) containing the
+            blocks, with the offset zero at index n - 1 along each axis. The
+            block of the zero offset is 0.
+    """
+    offsets = [np.arange(1 - n, n) * h for n, h in zip(size, spacing)]
+    diff = np.stack(np.meshgrid(*offsets, indexing="ij"), axis=-1)
+    r2 = np.einsum("...k,...k->...", diff, diff)
 
-    T_yy : Array containing all the yy components.
+    with np.errstate(divide="ignore"):
+        r3 = r2**-1.5
+    r3[r2 == 0] = 0
+    r5 = np.divide(3 * r3, r2, out=np.zeros_like(r3), where=r2 > 0)
 
-    T_zz : Array containing all the zz components.
+    table = np.einsum("...,...i,...j->...ij", r5, diff, diff)
+    table[..., [0, 1, 2], [0, 1, 2]] -= r3[..., None]
 
-    T_xy : Array containing all the xy components.
+    return table
 
-    T_xz : Array containing all the xz components.
 
-    T_yz : Array containing all the yz components.
+def lattice(coordinates, spacing=None, tol=1e-8):
     """
-    with np.errstate(divide="ignore", invalid="ignore"):
-        T_xx = ((3 * x_diff**2) / p_dist**5) - (1 / p_dist**3)
-        T_yy = ((3 * y_diff**2) / p_dist**5) - (1 / p_dist**3)
-        T_zz = ((3 * z_diff**2) / p_dist**5) - (1 / p_dist**3)
-        T_xy = ((3 * x_diff * y_diff) / p_dist**5)
-        T_xz = ((3 * x_diff * z_diff) / p_dist**5)
-        T_yz = ((3 * z_diff * y_diff) / p_dist**5)
+    Maps the atoms onto the integer sites of a regular lattice.
 
-    T_xx[np.isnan(T_xx)] = 0
-    T_yy[np.isnan(T_yy)] = 0
-    T_zz[np.isnan(T_zz)] = 0
-    T_xy[np.isnan(T_xy)] = 0
-    T_xz[np.isnan(T_xz)] = 0
-    T_yz[np.isnan(T_yz)] = 0
+    Parameters
+    ----------
+    coordinates : Array containing the coordinates of the atoms.
+
+    spacing : Optional lattice spacing along each axis (scalar or array of 3).
+              Detected as the largest common divisor of the distinct
+              coordinate offsets along each axis if not given. A detected
+              spacing much smaller than the smallest offset means that the
+              offsets are not commensurate, and is rejected.
+
+    tol : Tolerance (in the units of the coordinates) on the atoms sitting on
+          the lattice sites.
+
+    Returns
+    -------
+    indices : Integer array (N x 3) containing the lattice site of each atom.
+
+    spacing : Array (3) containing the lattice spacing along each axis.
+    """
+    coordinates = np.asarray(coordinates, dtype=float)
+    shifted = coordinates - coordinates.min(axis=0)
+
+    if spacing is None:
+        spacing = np.ones(3)
+        for axis in range(3):
+            values = np.unique(shifted[:, axis])
+            gaps = np.diff(values)
+            gaps = gaps[gaps > tol]
+            if len(gaps):
+                spacing[axis] = _common_divisor(gaps, tol)
+
+                # Incommensurate offsets (e.g. the rounded coordinates of an
+                # hcp cluster) only share a divisor of the order of tol, which
+                # would give a huge and almost empty lattice.
+                if spacing[axis] < gaps.min() / 16:
+                    raise ValueError(
+                        "The atoms do not sit on a regular lattice"
+                    )
+
+    spacing = np.broadcast_to(np.asarray(spacing, dtype=float), (3,))
+
+    indices = np.rint(shifted / spacing).astype(int)
+    if np.abs(indices * spacing - shifted).max() > tol:
+        raise ValueError("The atoms do not sit on a regular lattice")
 
     return (
-        T_xx,
-        T_yy,
-        T_zz,
-        T_xy,
-        T_xz,
-        T_yz
+        indices,
+        spacing.copy()
     )
 
 
-def tensor_stack(arrays):
+def _common_divisor(values, tol):
     """
-    Reshapes a touple of arrays in accordance with the shape of the A matrix.
+    Computes the largest common divisor of positive floats, within the
+    tolerance.
+    """
+    divisor = values[0]
+    for value in values[1:]:
+        a, b = max(divisor, value), min(divisor, value)
+        while b > tol:
+            r = a % b
+            if r < tol or b - r < tol:
+                r = 0
+            a, b = b, r
+        divisor = a
+
+    return divisor
+
+
+def kernel(coordinates, start, stop):
+    """
+    Computes the difference vectors and inverse distance powers between a
+    block of atoms and all atoms, from which the dipole interaction tensor
+    blocks are T_nm = r5 d d^T - r3 I.
 
     Parameters
     ----------
-    arrays : Touple of arrays.
+    coordinates : Array containing the coordinates of the atoms.
+
+    start : Index of the first atom of the block.
+
+    stop : Index after the last atom of the block.
 
     Returns
     -------
-    array : Total array with the proper shape.
+    diff : Array (b x N x 3) containing the difference vectors.
+
+    r3 : Array (b x N) containing 1 / r^3, which is 0 for coinciding atoms.
+
+    r5 : Array (b x N) containing 3 / r^5, which is 0 for coinciding atoms.
     """
-    arrays = np.asarray(arrays)
-    n, p, q = arrays.shape
-    s = int(round(np.sqrt(n)))
-    arrays = arrays.reshape(s, -1, p, q)
+    diff = coordinates - coordinates[start:stop, None]
+    r2 = np.einsum("ijk,ijk->ij", diff, diff)
 
-    return arrays.transpose(2, 0, 3, 1).reshape(s * p, -1)
+    # Coinciding atoms (including each atom with itself) do not interact.
+    with np.errstate(divide="ignore"):
+        r3 = np.sqrt(r2)
+        r3 *= r2
+        np.divide(1, r3, out=r3)
+    r3[np.isinf(r3)] = 0
+    r5 = np.divide(3 * r3, r2, out=np.zeros_like(r3), where=r2 > 0)
+
+    return (
+        diff,
+        r3,
+        r5
+    )
 
 
 def E(
@@ -1183,7 +787,8 @@ def E(
     Parameters
     ----------
     E_external : Array containing the Cartesian components of the external
-                 electrical field.
+                 electrical field, or an array (3 x k) with k fields as
+                 columns.
 
     dipole_x : Array containing the x components of the induced dipole
                moments for both the molecule and nanoparticle.
@@ -1225,11 +830,55 @@ def E(
         + dipole_x * (-(3 * y_coordinates * z_coordinates) / o_dist**5)
     ))
 
-    E = []
-    for element in zip(E_x, E_y, E_z):
-        E.extend(element)
-
-    E = np.asarray(E)
+    # Interleave the components as (x_1, y_1, z_1, x_2, ...). Any leading
+    # axes of the dipole arrays, e.g. a batch of frequencies, and the columns
+    # of several external fields are kept.
+    E = np.stack((E_x, E_y, E_z), axis=-2)
+    E = E.reshape(E.shape[:-3] + (-1, E.shape[-1]))
     E = E.astype(complex)
 
     return E
+
+
+def E_tensor(o_dist, x_coordinates, y_coordinates, z_coordinates):
+    """
+    Computes the 3x3 blocks coupling the induced dipole moment of each atom to
+    the electrical field at the atom, such that E = E_external - E_tensor p
+    for every atom, as in E.
+
+    Parameters
+    ----------
+    o_dist : Spatial distance from the origin (centre of the cluster) to each
+             atom.
+
+    x_coordinates : Array containing the x-coordinates from the given .xyz file.
+
+    y_coordinates : Array containing the y-coordinates from the given .xyz file.
+
+    z_coordinates : Array containing the z-coordinates from the given .xyz file.
+
+    Returns
+    -------
+    blocks : Array (N x 3 x 3) containing the coupling block of each atom.
+    """
+    r3 = 1 / o_dist[:, 0]**3
+    r5 = 1 / o_dist[:, 0]**5
+    x = x_coordinates[:, 0]
+    y = y_coordinates[:, 0]
+    z = z_coordinates[:, 0]
+
+    blocks = np.empty((len(o_dist), 3, 3))
+    blocks[:, 0, 0] = r3 - 3 * x**2 * r5
+    blocks[:, 0, 1] = -3 * x * y * r5
+    blocks[:, 0, 2] = -3 * x * z * r5
+    blocks[:, 1, 0] = -3 * y * x * r5
+    blocks[:, 1, 1] = r3 - 3 * y**2 * r5
+    blocks[:, 1, 2] = -3 * y * z * r5
+    # The zx component uses y * z, exactly as in E.
+    blocks[:, 2, 0] = -3 * y * z * r5
+    blocks[:, 2, 1] = -3 * z * y * r5
+    blocks[:, 2, 2] = r3 - 3 * z**2 * r5
+
+    return (
+        blocks
+    )
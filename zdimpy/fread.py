@@ -1,9 +1,19 @@
+import re
+from itertools import islice
+
 import numpy as np
 
+# key=value, key="quoted value" or a bare key in an extended-XYZ comment line.
+HEADER = re.compile(r'(\w+)(?:=(?:"([^"]*)"|(\S*)))?')
+
+# A comment line made up of these pairs only, separated by whitespace.
+LINE = re.compile(r"{0}(?:\s+{0})*".format(HEADER.pattern))
+
 
 def xyz(path):
     """
-    Reads the given .xyz file and stores the values in an array.
+    Reads the first frame of the given .xyz file and stores the values in an
+    array. Any lines after the frame must start another frame.
 
     Parameters
     ----------
@@ -12,25 +22,191 @@ def xyz(path):
     Returns
     -------
     coordinates : Array containing the coordinates from the .xyz file.
+
+    x_coordinates : Array (N x 1) containing the x-coordinates.
+
+    y_coordinates : Array (N x 1) containing the y-coordinates.
+
+    z_coordinates : Array (N x 1) containing the z-coordinates.
+    """
+    with open(path) as fp:
+        frame = _frame(fp, path)
+        if frame is None:
+            raise ValueError("No frames in {}".format(path))
+        symbols, coordinates, info = frame
+
+        # Atom lines beyond the count of the frame would otherwise be
+        # dropped without notice.
+        try:
+            _count(fp, path)
+        except ValueError:
+            raise ValueError(
+                "Expected {} atoms in {}, found more".format(
+                    len(coordinates), path
+                )
+            ) from None
+
+    return (
+        coordinates,
+        coordinates[:, 0:1],
+        coordinates[:, 1:2],
+        coordinates[:, 2:3]
+    )
+
+
+def frames(path):
     """
-    coordinates = []
-    x_coordinates = []
-    y_coordinates = []
-    z_coordinates = []
+    Reads the frames of a (multi-frame, extended) .xyz file one at a time.
 
+    Only the lines of the current frame are held in memory, and the
+    coordinates of a frame are parsed in bulk by NumPy. The atom count of
+    every frame is checked against its lines.
+
+    Parameters
+    ----------
+    path : The absolute file path of the .xyz file.
+
+    Yields
+    ------
+    symbols : Array containing the chemical symbols of the atoms.
+
+    coordinates : Array (N x 3) containing the coordinates of the atoms.
+
+    info : Dictionary containing the metadata of the comment line (see
+           header).
+    """
     with open(path) as fp:
-        n_atoms = fp.readline()
-        title = fp.readline()
-        for line in fp:
-            atom, x, y, z = line.split()
-            coordinates.append([float(x), float(y), float(z)])
-            x_coordinates.append([float(x)])
-            y_coordinates.append([float(y)])
-            z_coordinates.append([float(z)])
+        while True:
+            frame = _frame(fp, path)
+            if frame is None:
+                return
+
+            yield frame
+
+
+def _count(fp, path):
+    """
+    Reads the atom count starting the next frame of an open .xyz file,
+    skipping blank lines. Returns None at the end of the file.
+    """
+    for count in fp:
+        if not count.strip():
+            continue
+
+        try:
+            return int(count)
+        except ValueError:
+            raise ValueError(
+                "Invalid atom count in {}: {!r}".format(path, count)
+            ) from None
+
+    return None
+
+
+def _frame(fp, path):
+    """
+    Reads the next frame of an open .xyz file (see frames). Returns None at
+    the end of the file.
+    """
+    n_atoms = _count(fp, path)
+    if n_atoms is None:
+        return None
+
+    info = header(fp.readline())
+    lines = list(islice(fp, n_atoms))
+    if len(lines) < n_atoms:
+        raise ValueError(
+            "Expected {} atoms in {}, found {}".format(
+                n_atoms, path, len(lines)
+            )
+        )
+
+    species, pos = _columns(info)
+    coordinates = np.loadtxt(lines, usecols=pos, ndmin=2)
+    symbols = np.array([line.split()[species] for line in lines])
+
+    return (
+        symbols,
+        coordinates.reshape(n_atoms, 3),
+        info
+    )
+
+
+def header(line):
+    """
+    Parses the comment line of an extended .xyz frame.
+
+    Parameters
+    ----------
+    line : String containing the comment line.
+
+    Returns
+    -------
+    info : Dictionary containing the values of the comment line. Lattice is
+           an array (3 x 3) with the lattice vectors as rows, pbc an array of
+           3 booleans, numbers are converted and bare keys are True. A line
+           that does not consist of key=value pairs and bare keys only is
+           kept as the comment.
+    """
+    line = line.strip()
+    if "=" not in line or not LINE.fullmatch(line):
+        return {"comment": line}
+
+    info = {}
+    for match in HEADER.finditer(line):
+        key, quoted, value = match.groups()
+        value = quoted if quoted is not None else value
+
+        if value is None:
+            info[key] = True
+        elif key == "Lattice":
+            info[key] = np.array(value.split(), dtype=float).reshape(3, 3)
+        elif key == "pbc":
+            info[key] = np.array([v in ("T", "True") for v in value.split()])
+        elif key == "Properties":
+            info[key] = value
+        else:
+            info[key] = _number(value)
+
+    return info
+
+
+def _number(value):
+    """
+    Converts a value of the comment line to an int, a float or an array of
+    floats, if possible.
+    """
+    for kind in (int, float):
+        try:
+            return kind(value)
+        except ValueError:
+            pass
+
+    try:
+        return np.array(value.split(), dtype=float)
+    except ValueError:
+        return value
+
+
+def _columns(info):
+    """
+    Finds the columns of the chemical symbols and the coordinates from the
+    Properties of an extended .xyz frame.
+    """
+    if "Properties" not in info:
+        return (
+            0,
+            (1, 2, 3)
+        )
+
+    fields = info["Properties"].split(":")
+    columns = {}
+    start = 0
+    for name, kind, count in zip(fields[::3], fields[1::3], fields[2::3]):
+        columns[name] = start
+        start += int(count)
 
     return (
-        np.asarray(coordinates),
-        np.asarray(x_coordinates),
-        np.asarray(y_coordinates),
-        np.asarray(z_coordinates)
+        columns.get("species", 0),
+        tuple(range(columns.get("pos", 1), columns.get("pos", 1) + 3))
     )
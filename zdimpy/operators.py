@@ -0,0 +1,602 @@
+import numpy as np
+from scipy import fft
+from zdimpy import calc
+
+
+class Dipole:
+    """
+    Matrix-free dipole interaction operator.
+
+    The products T p are computed in blocks of rows directly from the
+    coordinates, without storing T, so the memory is O(N) besides the
+    temporaries of a block.
+
+    Parameters
+    ----------
+    coordinates : Array containing the coordinates of the atoms.
+
+    memory : Memory budget (in bytes) for the temporaries of a row block.
+    """
+
+    def __init__(self, coordinates, memory=2**26):
+        self.coordinates = np.asarray(coordinates, dtype=float)
+        self.memory = memory
+        self.shape = (3 * len(coordinates), 3 * len(coordinates))
+
+    def matvec(self, p):
+        """
+        Computes the product of the interaction tensor with the given vector.
+
+        Parameters
+        ----------
+        p : Array (3N) or (3N x k) containing interleaved dipole moments.
+
+        Returns
+        -------
+        Tp : Array of the same shape as p.
+        """
+        p = np.asarray(p)
+        n = len(self.coordinates)
+        P = p.reshape(n, 3, -1)
+        k = P.shape[-1]
+
+        Tp = np.empty(P.shape, dtype=np.result_type(p, float))
+
+        # The kernel arrays and the projections d . p_m of a block.
+        rows = max(1, int(self.memory // ((6 + 2 * k) * 8 * n)))
+
+        for start in range(0, n, rows):
+            stop = min(start + rows, n)
+
+            diff, r3, r5 = calc.kernel(self.coordinates, start, stop)
+
+            proj = np.einsum("ijc,jck->ijk", diff, P)
+            proj *= r5[..., None]
+            Tp[start:stop] = np.einsum("ijc,ijk->ick", diff, proj)
+            Tp[start:stop] -= np.einsum("ij,jck->ick", r3, P)
+
+        return Tp.reshape(p.shape)
+
+
+class FFT:
+    """
+    Dipole interaction operator for clusters whose atoms sit on a regular
+    lattice.
+
+    On a lattice the interaction tensor only depends on the integer offset
+    between two sites, so T p is a discrete convolution. The atoms are
+    embedded in a grid, zero-padded to twice its size, and the products are
+    computed with 3-D FFTs in O(M log M) for a grid of M sites, as in
+    discrete-dipole-approximation codes.
+
+    Parameters
+    ----------
+    coordinates : Array containing the coordinates of the atoms.
+
+    spacing : Optional lattice spacing along each axis (scalar or array of 3).
+              Detected from the coordinates if not given.
+
+    tol : Tolerance (in the units of the coordinates) on the atoms sitting on
+          the lattice sites.
+
+    memory : Memory budget (in bytes) for the transformed kernel and the
+             grids of a product.
+    """
+
+    def __init__(self, coordinates, spacing=None, tol=1e-8, memory=2**30):
+        coordinates = np.asarray(coordinates, dtype=float)
+        self.indices, self.spacing = calc.lattice(coordinates, spacing, tol)
+        self.shape = (3 * len(coordinates), 3 * len(coordinates))
+
+        size = self.indices.max(axis=0) + 1
+        self.grid = tuple(int(n) for n in 2 * size)
+
+        # Nine complex kernel components and three grids of a product.
+        if 12 * 16 * np.prod(self.grid, dtype=float) > memory:
+            raise ValueError(
+                "The lattice grid {} exceeds the memory budget".format(
+                    self.grid
+                )
+            )
+
+        # The blocks for the offsets -(n - 1) ... n - 1 along each axis are
+        # padded with a zero offset n and wrapped around, such that negative
+        # offsets sit at the end of each axis of the padded grid.
+        table = calc.lattice_table(size, self.spacing)
+        table = np.pad(table, [(0, 1)] * 3 + [(0, 0)] * 2)
+        table = np.roll(table, tuple(1 - size), axis=(0, 1, 2))
+
+        self.kernel = fft.fftn(
+            np.moveaxis(table, (3, 4), (0, 1)),
+            axes=(2, 3, 4)
+        )
+
+    @property
+    def nbytes(self):
+        """
+        Memory (in bytes) of the transformed interaction kernel.
+        """
+        return self.kernel.nbytes
+
+    def matvec(self, p):
+        """
+        Computes the product of the interaction tensor with the given vector.
+
+        Parameters
+        ----------
+        p : Array (3N) or (3N x k) containing interleaved dipole moments.
+
+        Returns
+        -------
+        Tp : Array of the same shape as p.
+        """
+        p = np.asarray(p)
+        P = p.reshape(len(self.indices), 3, -1)
+        i, j, k = self.indices.T
+
+        Tp = np.empty(P.shape, dtype=np.result_type(p, float))
+
+        for col in range(P.shape[-1]):
+            grid = np.zeros((3,) + self.grid, dtype=complex)
+            grid[:, i, j, k] = P[..., col].T
+            grid = fft.fftn(grid, axes=(1, 2, 3))
+
+            field = np.einsum("ab...,b...->a...", self.kernel, grid)
+            field = fft.ifftn(field, axes=(1, 2, 3))
+
+            values = field[:, i, j, k].T
+            if np.isrealobj(Tp):
+                values = values.real
+            Tp[..., col] = values
+
+        return Tp.reshape(p.shape)
+
+
+class Hierarchical:
+    """
+    Hierarchical-matrix approximation of the dipole interaction operator for
+    irregular geometries.
+
+    The atoms are clustered with an octree. Blocks of T between well
+    separated clusters are numerically low-rank and are compressed with
+    adaptive cross approximation (ACA), while the near-field blocks between
+    neighbouring leaves and the blocks too small to compress are stored
+    dense. For large clusters, memory and the cost of a product are then
+    O(N log N) for a fixed tolerance.
+
+    The diagonal blocks of the leaves are also available (see leaves), from
+    which the krylov solver builds an approximate block-diagonal
+    factorization of A that is used as its preconditioner.
+
+    Parameters
+    ----------
+    coordinates : Array containing the coordinates of the atoms.
+
+    tol : Relative accuracy of the low-rank approximations of the far-field
+          blocks.
+
+    leaf : Maximum number of atoms in a leaf of the octree.
+
+    eta : Admissibility parameter. Two clusters are well separated if the
+          smaller of their diameters is at most eta times the distance between
+          their bounding boxes.
+    """
+
+    def __init__(self, coordinates, tol=1e-6, leaf=64, eta=2.0):
+        coordinates = np.asarray(coordinates, dtype=float)
+        self.tol = tol
+        self.leaf = leaf
+        self.eta = eta
+        self.shape = (3 * len(coordinates), 3 * len(coordinates))
+
+        # Atoms are reordered such that every cluster is a contiguous range.
+        self.order = []
+        self.nodes = []
+        self._cluster(coordinates, np.arange(len(coordinates)))
+        self.order = np.array(self.order, dtype=int)
+        self.coordinates = coordinates[self.order]
+
+        self.dense = []
+        self.lowrank = []
+        self._partition(0, 0)
+
+    def _cluster(self, coordinates, index):
+        """
+        Adds the octree node of the given atoms and its children, and returns
+        the number of the node.
+        """
+        points = coordinates[index]
+        lower = points.min(axis=0)
+        upper = points.max(axis=0)
+        center = (lower + upper) / 2
+
+        node = len(self.nodes)
+        self.nodes.append({
+            "start": len(self.order),
+            "lower": lower,
+            "upper": upper,
+            "diam": np.linalg.norm(upper - lower),
+            "children": []
+        })
+
+        if len(index) <= self.leaf or np.all(upper == lower):
+            self.order.extend(index)
+        else:
+            octant = np.dot(points > center, [4, 2, 1])
+            for i in range(8):
+                if np.any(octant == i):
+                    self.nodes[node]["children"].append(
+                        self._cluster(coordinates, index[octant == i])
+                    )
+
+        self.nodes[node]["stop"] = len(self.order)
+
+        return node
+
+    def _partition(self, row, col):
+        """
+        Splits the block of T between two octree nodes into low-rank and dense
+        blocks.
+        """
+        tau = self.nodes[row]
+        sigma = self.nodes[col]
+
+        # Distance between the bounding boxes of the clusters.
+        gap = np.maximum(sigma["lower"] - tau["upper"], 0)
+        gap += np.maximum(tau["lower"] - sigma["upper"], 0)
+        dist = np.linalg.norm(gap)
+
+        # Well separated blocks smaller than half a leaf do not compress, and
+        # are stored dense without being split further.
+        admissible = dist > 0 and (
+            min(tau["diam"], sigma["diam"]) <= self.eta * dist
+        )
+        small = min(
+            tau["stop"] - tau["start"],
+            sigma["stop"] - sigma["start"]
+        ) < self.leaf // 2
+
+        if admissible and not small:
+            factors = self._aca(tau, sigma)
+            if factors is not None:
+                self.lowrank.append((tau, sigma) + factors)
+                return
+
+        if admissible and small or (
+            not tau["children"] and not sigma["children"]
+        ):
+            self.dense.append((tau, sigma, self._block(
+                slice(tau["start"], tau["stop"]),
+                slice(sigma["start"], sigma["stop"])
+            )))
+        elif not sigma["children"] or (
+            tau["children"] and tau["diam"] >= sigma["diam"]
+        ):
+            for child in tau["children"]:
+                self._partition(child, col)
+        else:
+            for child in sigma["children"]:
+                self._partition(row, child)
+
+    def _block(self, rows, cols):
+        """
+        Computes the dense block of T between two sets of atoms in the tree
+        order.
+        """
+        diff = self.coordinates[cols] - self.coordinates[rows, None]
+        r2 = np.einsum("ijk,ijk->ij", diff, diff)
+
+        with np.errstate(divide="ignore"):
+            r3 = r2**-1.5
+        r3[r2 == 0] = 0
+        r5 = np.divide(3 * r3, r2, out=np.zeros_like(r3), where=r2 > 0)
+
+        block = np.einsum("ij,ijc,ijd->icjd", r5, diff, diff)
+        block[:, [0, 1, 2], :, [0, 1, 2]] -= r3
+
+        return block.reshape(3 * r2.shape[0], 3 * r2.shape[1])
+
+    def _row(self, row, cols):
+        """
+        Computes a single row of T, given as the index of a scalar row in the
+        tree order, against a set of atoms in the tree order.
+        """
+        atom, component = divmod(row, 3)
+
+        diff = self.coordinates[cols] - self.coordinates[atom]
+        r2 = np.einsum("ij,ij->i", diff, diff)
+
+        with np.errstate(divide="ignore"):
+            r3 = r2**-1.5
+        r3[r2 == 0] = 0
+        r5 = np.divide(3 * r3, r2, out=np.zeros_like(r3), where=r2 > 0)
+
+        values = (r5 * diff[:, component])[:, None] * diff
+        values[:, component] -= r3
+
+        return values.ravel()
+
+    def _aca(self, tau, sigma):
+        """
+        Approximates the block of T between two well separated nodes by
+        adaptive cross approximation with partial pivoting.
+
+        Returns the factors (U, V) of the approximation U V, or None if the
+        block is not compressed to less than half of its size.
+        """
+        rows = slice(tau["start"], tau["stop"])
+        cols = slice(sigma["start"], sigma["stop"])
+        m = 3 * (tau["stop"] - tau["start"])
+        n = 3 * (sigma["stop"] - sigma["start"])
+        max_rank = min(m, n) // 2
+
+        U = np.zeros((m, max_rank))
+        V = np.zeros((max_rank, n))
+        used = np.zeros(m, dtype=bool)
+        norm2 = 0.0
+        i = 0
+
+        for k in range(max_rank):
+            # Residual row i; T is symmetric, so its columns are rows of the
+            # transposed block.
+            row = self._row(3 * tau["start"] + i, cols)
+            row -= np.dot(U[i, :k], V[:k])
+            used[i] = True
+
+            j = np.argmax(np.abs(row))
+            if row[j] == 0:
+                if used.all():
+                    return (U[:, :k].copy(), V[:k].copy())
+                i = np.argmin(used)
+                continue
+
+            V[k] = row / row[j]
+            U[:, k] = self._row(3 * sigma["start"] + j, rows)
+            U[:, k] -= np.dot(U[:, :k], V[:k, j])
+
+            # Frobenius norm of the approximation, updated with the new cross.
+            unorm = np.linalg.norm(U[:, k])
+            vnorm = np.linalg.norm(V[k])
+            norm2 += (unorm * vnorm)**2 + 2 * np.dot(
+                np.dot(U[:, :k].T, U[:, k]),
+                np.dot(V[:k], V[k])
+            )
+
+            # The factors are copied, such that the scratch arrays of the
+            # maximum rank are released.
+            if unorm * vnorm <= self.tol * np.sqrt(abs(norm2)):
+                return (
+                    U[:, :k + 1].copy(),
+                    V[:k + 1].copy()
+                )
+
+            i = np.argmax(np.where(used, -1, np.abs(U[:, k])))
+
+        return None
+
+    def leaves(self):
+        """
+        Returns the diagonal blocks of T of the leaves of the octree, from
+        which the krylov solver builds its preconditioner.
+
+        Returns
+        -------
+        leaves : List of tuples (atoms, block) containing the indices of the
+                 atoms of a leaf and the dense block (3n x 3n) of T between
+                 them.
+        """
+        return [
+            (self.order[tau["start"]:tau["stop"]], block)
+            for tau, sigma, block in self.dense
+            if tau is sigma
+        ]
+
+    @property
+    def nbytes(self):
+        """
+        Memory (in bytes) of the dense blocks and the low-rank factors.
+        """
+        return sum(block.nbytes for _, _, block in self.dense) + sum(
+            U.nbytes + V.nbytes for *_, U, V in self.lowrank
+        )
+
+    def matvec(self, p):
+        """
+        Computes the product of the interaction tensor with the given vector.
+
+        Parameters
+        ----------
+        p : Array (3N) or (3N x k) containing interleaved dipole moments.
+
+        Returns
+        -------
+        Tp : Array of the same shape as p.
+        """
+        p = np.asarray(p)
+        n = len(self.order)
+        P = p.reshape(n, 3, -1)[self.order].reshape(3 * n, -1)
+
+        Tp = np.zeros(P.shape, dtype=np.result_type(p, float))
+
+        for tau, sigma, block in self.dense:
+            Tp[3 * tau["start"]:3 * tau["stop"]] += np.dot(
+                block,
+                P[3 * sigma["start"]:3 * sigma["stop"]]
+            )
+
+        for tau, sigma, U, V in self.lowrank:
+            Tp[3 * tau["start"]:3 * tau["stop"]] += np.dot(
+                U,
+                np.dot(V, P[3 * sigma["start"]:3 * sigma["stop"]])
+            )
+
+        out = np.empty_like(Tp)
+        out.reshape(n, 3, -1)[self.order] = Tp.reshape(n, 3, -1)
+
+        return out.reshape(p.shape)
+
+
+class Cutoff:
+    """
+    Dipole interaction operator truncated at a cutoff distance.
+
+    Interactions decay as 1 / r^3, so for quick screening runs only the
+    interactions between atoms closer than the cutoff are kept, in a sparse
+    matrix with 3x3 blocks (see calc.assemble_sparse). Memory and the cost of
+    a product are linear in the number of atoms.
+
+    Parameters
+    ----------
+    coordinates : Array containing the coordinates of the atoms.
+
+    cutoff : Distance (in the units of the coordinates) beyond which the
+             interactions are dropped.
+    """
+
+    def __init__(self, coordinates, cutoff):
+        self.coordinates = np.asarray(coordinates, dtype=float)
+        self.cutoff = cutoff
+        self.matrix = calc.assemble_sparse(self.coordinates, cutoff)
+        self.shape = self.matrix.shape
+
+    @property
+    def nbytes(self):
+        """
+        Memory (in bytes) of the blocks and indices of the sparse matrix.
+        """
+        return (self.matrix.data.nbytes + self.matrix.indices.nbytes
+                + self.matrix.indptr.nbytes)
+
+    def matvec(self, p):
+        """
+        Computes the product of the truncated interaction tensor with the
+        given vector.
+
+        Parameters
+        ----------
+        p : Array (3N) or (3N x k) containing interleaved dipole moments.
+
+        Returns
+        -------
+        Tp : Array of the same shape as p.
+        """
+        return self.matrix @ p
+
+    def truncation(self):
+        """
+        Computes the relative error of the truncated interaction tensor
+        against the dense tensor (see calc.truncation).
+        """
+        return calc.truncation(self.coordinates, self.cutoff)
+
+
+class Field:
+    """
+    Electrical field at the atoms from the external field and the induced
+    dipole moments, as in calc.E.
+
+    The distance powers and coordinate products are computed once, as the
+    per-atom 3x3 blocks of calc.E_tensor, and every evaluation is a single
+    batched product written into a preallocated interleaved buffer.
+
+    Parameters
+    ----------
+    o_dist : Spatial distance from the origin (centre of the cluster) to each
+             atom.
+
+    E_external : Array containing the Cartesian components of the external
+                 electrical field, or an array (3 x k) with k fields as
+                 columns. The fields are uniform over the cluster, i.e. the
+                 same at every atom.
+
+    x_coordinates : Array containing the x-coordinates of the atoms.
+
+    y_coordinates : Array containing the y-coordinates of the atoms.
+
+    z_coordinates : Array containing the z-coordinates of the atoms.
+    """
+
+    def __init__(self, o_dist, E_external, x_coordinates, y_coordinates,
+                 z_coordinates):
+        self.blocks = calc.E_tensor(o_dist, x_coordinates, y_coordinates,
+                                    z_coordinates)
+        self.n = len(self.blocks)
+
+        E_external = np.asarray(E_external, dtype=complex)
+        if E_external.ndim not in (1, 2) or len(E_external) != 3:
+            raise ValueError(
+                "The external field must be uniform, given as 3 Cartesian "
+                "components or an array (3 x k) with k fields as columns, "
+                "not an array of shape {}".format(E_external.shape)
+            )
+        if E_external.ndim == 1:
+            E_external = E_external[:, None]
+        self.external = np.tile(E_external, (self.n, 1))
+
+        self.out = None
+
+    def __call__(self, dipole):
+        """
+        Computes the electrical field at the atoms.
+
+        Parameters
+        ----------
+        dipole : Array (3N x k) containing the interleaved induced dipole
+                 moments, with any leading axes, e.g. a batch of frequencies.
+
+        Returns
+        -------
+        E : Complex array of the same shape as dipole containing the
+            interleaved electrical field. The array is reused by the next
+            call.
+        """
+        dipole = np.ascontiguousarray(dipole, dtype=complex)
+        if self.out is None or self.out.shape != dipole.shape:
+            self.out = np.empty(dipole.shape, dtype=complex)
+
+        # The real blocks act on the real and imaginary parts alike, so the
+        # complex arrays are viewed as real ones with twice the columns.
+        shape = dipole.shape[:-2] + (self.n, 3, 2 * dipole.shape[-1])
+        np.matmul(self.blocks, dipole.view(float).reshape(shape),
+                  out=self.out.view(float).reshape(shape))
+        np.subtract(self.external, self.out, out=self.out)
+
+        return self.out
+
+
+def operator(name, coordinates, cutoff=None, accuracy=1e-6, leaf=64,
+             eta=2.0):
+    """
+    Sets up the operator computing the products with the interaction tensor.
+
+    Parameters
+    ----------
+    name : String containing the name of the operator (dipole, fft,
+           hierarchical or cutoff).
+
+    coordinates : Array containing the coordinates of the atoms.
+
+    cutoff : Distance beyond which the interactions are dropped, used by the
+             cutoff operator.
+
+    accuracy : Relative accuracy of the low-rank blocks of the hierarchical
+               operator.
+
+    leaf : Maximum number of atoms in a leaf of the hierarchical operator.
+
+    eta : Admissibility parameter of the hierarchical operator.
+
+    Returns
+    -------
+    operator : Operator object with a matvec method.
+    """
+    if name == "dipole":
+        return Dipole(coordinates)
+    elif name == "fft":
+        return FFT(coordinates)
+    elif name == "hierarchical":
+        return Hierarchical(coordinates, accuracy, leaf, eta)
+    elif name == "cutoff":
+        return Cutoff(coordinates, cutoff)
+    else:
+        raise ValueError("Unknown operator: {}".format(name))
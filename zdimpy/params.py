@@ -0,0 +1,380 @@
+from functools import lru_cache
+
+import numpy as np
+
+# ==============================================================================
+#   Parameters of the dielectric models for Ag, Cu, Au, Al, Be, Cr, Ni, Pd, Pt,
+#   Ti, and W.
+#
+#   All values are from
+#
+#   Rakić et al. (1998):
+#   https://doi.org/10.1364/AO.37.005271
+#
+#   Except for the static polarizabilites, which are from
+#
+#   Hillers-Bendtsen et al. (2019):
+#   https://doi.org/10.1016/j.cplett.2019.136661
+#
+#   Schwerdtfeger et al. (2018):
+#   https://doi.org/10.1080/00268976.2018.1535143
+# ==============================================================================
+
+# Hartree to eV
+HARTREE = 27.211324570273
+
+# Lorentz-Drude model. The oscillators are (f_j, gamma_j, omega_j) with the
+# frequencies in eV. The extended Lorentz model uses the same oscillators.
+LD = {
+    "Ag": {
+        "omega_p": 9.01,
+        "f0": 0.845,
+        "gamma_0": 0.048,
+        "oscillators": [
+            (0.065, 3.886, 0.816),
+            (0.124, 0.452, 4.481),
+            (0.011, 0.065, 8.185),
+            (0.840, 0.916, 9.083),
+            (5.646, 2.419, 20.29)
+        ]
+    },
+    "Au": {
+        "omega_p": 9.03,
+        "f0": 0.760,
+        "gamma_0": 0.053,
+        "oscillators": [
+            (0.024, 0.241, 0.415),
+            (0.010, 0.345, 0.830),
+            (0.071, 0.870, 2.969),
+            (0.601, 2.494, 4.304),
+            (4.384, 2.214, 13.32)
+        ]
+    },
+    "Cu": {
+        "omega_p": 10.83,
+        "f0": 0.575,
+        "gamma_0": 0.030,
+        "oscillators": [
+            (0.061, 0.378, 0.291),
+            (0.104, 1.056, 2.957),
+            (0.723, 3.213, 5.300),
+            (0.638, 4.305, 11.18)
+        ]
+    },
+    "Al": {
+        "omega_p": 14.98,
+        "f0": 0.523,
+        "gamma_0": 0.047,
+        "oscillators": [
+            (0.227, 0.333, 0.162),
+            (0.050, 0.312, 1.544),
+            (0.166, 1.351, 1.808),
+            (0.030, 3.382, 3.473)
+        ]
+    },
+    "Be": {
+        "omega_p": 18.51,
+        "f0": 0.084,
+        "gamma_0": 0.035,
+        "oscillators": [
+            (0.031, 1.664, 0.100),
+            (0.140, 3.395, 1.032),
+            (0.530, 4.454, 3.183),
+            (0.130, 1.802, 4.604)
+        ]
+    },
+    "Cr": {
+        "omega_p": 10.75,
+        "f0": 0.168,
+        "gamma_0": 0.047,
+        "oscillators": [
+            (0.151, 3.175, 0.121),
+            (0.150, 1.305, 0.543),
+            (1.149, 2.676, 1.970),
+            (0.825, 1.335, 8.775)
+        ]
+    },
+    "Ni": {
+        "omega_p": 15.92,
+        "f0": 0.096,
+        "gamma_0": 0.048,
+        "oscillators": [
+            (0.100, 4.511, 0.174),
+            (0.135, 1.334, 0.582),
+            (0.106, 2.178, 1.597),
+            (0.729, 6.292, 6.089)
+        ]
+    },
+    "Pd": {
+        "omega_p": 9.72,
+        "f0": 0.330,
+        "gamma_0": 0.008,
+        "oscillators": [
+            (0.649, 2.950, 0.336),
+            (0.121, 0.555, 0.501),
+            (0.638, 4.621, 1.659),
+            (0.453, 3.236, 5.715)
+        ]
+    },
+    "Pt": {
+        "omega_p": 9.59,
+        "f0": 0.333,
+        "gamma_0": 0.080,
+        "oscillators": [
+            (0.191, 0.517, 0.780),
+            (0.659, 1.838, 1.314),
+            (0.547, 3.668, 3.141),
+            (3.576, 8.517, 9.249)
+        ]
+    },
+    "Ti": {
+        "omega_p": 7.29,
+        "f0": 0.148,
+        "gamma_0": 0.082,
+        "oscillators": [
+            (0.899, 2.276, 0.777),
+            (0.393, 2.518, 1.545),
+            (0.187, 1.663, 2.509),
+            (0.001, 1.762, 19.43)
+        ]
+    },
+    "W": {
+        "omega_p": 13.22,
+        "f0": 0.206,
+        "gamma_0": 0.064,
+        "oscillators": [
+            (0.054, 0.530, 1.004),
+            (0.166, 1.281, 1.917),
+            (0.706, 3.332, 3.580),
+            (2.590, 5.836, 7.498)
+        ]
+    }
+}
+
+# Brendel-Bormann model. The oscillators are (f_j, gamma_j, omega_j, sigma_j)
+# with the frequencies in eV.
+BB = {
+    "Ag": {
+        "omega_p": 9.01,
+        "f0": 0.821,
+        "gamma_0": 0.049,
+        "oscillators": [
+            (0.050, 0.189, 2.025, 1.894),
+            (0.133, 0.067, 5.185, 0.665),
+            (0.051, 0.019, 4.343, 0.189),
+            (0.467, 0.117, 9.809, 1.170),
+            (4.000, 0.052, 18.56, 0.516)
+        ]
+    },
+    "Au": {
+        "omega_p": 9.03,
+        "f0": 0.770,
+        "gamma_0": 0.050,
+        "oscillators": [
+            (0.054, 0.074, 0.218, 0.742),
+            (0.050, 0.035, 2.885, 0.349),
+            (0.312, 0.083, 4.069, 0.830),
+            (0.719, 0.125, 6.137, 1.246),
+            (1.648, 0.179, 27.97, 1.795)
+        ]
+    },
+    "Cu": {
+        "omega_p": 10.83,
+        "f0": 0.562,
+        "gamma_0": 0.030,
+        "oscillators": [
+            (0.076, 0.056, 0.416, 0.562),
+            (0.081, 0.047, 2.849, 0.469),
+            (0.324, 0.113, 4.819, 1.131),
+            (0.726, 0.172, 8.136, 1.719)
+        ]
+    },
+    "Al": {
+        "omega_p": 14.98,
+        "f0": 0.526,
+        "gamma_0": 0.047,
+        "oscillators": [
+            (0.213, 0.312, 0.163, 0.013),
+            (0.060, 0.315, 1.561, 0.042),
+            (0.182, 1.587, 1.827, 0.256),
+            (0.014, 2.145, 4.495, 1.735)
+        ]
+    },
+    "Be": {
+        "omega_p": 18.51,
+        "f0": 0.081,
+        "gamma_0": 0.035,
+        "oscillators": [
+            (0.066, 2.956, 0.131, 0.277),
+            (0.067, 3.962, 0.469, 3.167),
+            (0.346, 2.398, 2.827, 1.446),
+            (0.311, 3.904, 4.318, 0.893)
+        ]
+    },
+    "Cr": {
+        "omega_p": 10.75,
+        "f0": 0.154,
+        "gamma_0": 0.048,
+        "oscillators": [
+            (0.338, 4.256, 0.281, 0.115),
+            (0.261, 3.957, 0.584, 0.252),
+            (0.817, 2.218, 1.919, 0.225),
+            (0.105, 6.983, 6.997, 4.903)
+        ]
+    },
+    "Ni": {
+        "omega_p": 15.92,
+        "f0": 0.083,
+        "gamma_0": 0.022,
+        "oscillators": [
+            (0.357, 2.820, 0.317, 0.606),
+            (0.039, 0.120, 1.059, 1.454),
+            (0.127, 1.822, 4.583, 0.379),
+            (0.654, 6.637, 8.825, 0.510)
+        ]
+    },
+    "Pd": {
+        "omega_p": 9.72,
+        "f0": 0.330,
+        "gamma_0": 0.009,
+        "oscillators": [
+            (0.769, 2.343, 0.066, 0.694),
+            (0.093, 0.497, 0.502, 0.027),
+            (0.309, 2.022, 2.432, 1.167),
+            (0.409, 0.119, 5.987, 1.331)
+        ]
+    },
+    "Pt": {
+        "omega_p": 9.59,
+        "f0": 0.333,
+        "gamma_0": 0.080,
+        "oscillators": [
+            (0.186, 0.498, 0.782, 0.031),
+            (0.665, 1.851, 1.317, 0.096),
+            (0.551, 2.604, 3.189, 0.766),
+            (2.214, 2.891, 8.236, 1.146)
+        ]
+    },
+    "Ti": {
+        "omega_p": 7.29,
+        "f0": 0.126,
+        "gamma_0": 0.067,
+        "oscillators": [
+            (0.427, 1.877, 1.459, 0.463),
+            (0.218, 0.100, 2.661, 0.506),
+            (0.513, 0.615, 0.805, 0.799),
+            (0.0002, 4.109, 19.86, 2.854)
+        ]
+    },
+    "W": {
+        "omega_p": 13.22,
+        "f0": 0.197,
+        "gamma_0": 0.057,
+        "oscillators": [
+            (0.006, 3.689, 0.481, 3.754),
+            (0.022, 0.277, 0.985, 0.059),
+            (0.136, 1.433, 1.962, 0.273),
+            (2.648, 4.555, 5.442, 1.912)
+        ]
+    }
+}
+
+# Static polarizabilities (a.u.) used by the extended Lorentz model.
+STATIC = {
+    "Ag": 49.9843,
+    "Au": 31.0400,
+    "Cu": 33.7420,
+    "Al": 57.8,
+    "Be": 37.74,
+    "Cr": 83,
+    "Ni": 49,
+    "Pd": 26.14,
+    "Pt": 48,
+    "Ti": 100,
+    "W": 68
+}
+
+
+def table(model, element):
+    """
+    Collects the parameters of the given model for one or more metals into
+    arrays. Metals with fewer oscillators are padded with oscillators of zero
+    strength.
+
+    Parameters
+    ----------
+    model : String containing the name of the model (LD, XL or BB).
+
+    element : String containing the name of the metal, or a sequence of
+              names.
+
+    Returns
+    -------
+    omega_p : Array (n_elements) containing the plasma frequencies.
+
+    f0 : Array (n_elements) containing the strengths of the free electrons.
+
+    gamma_0 : Array (n_elements) containing the damping of the free electrons.
+
+    oscillators : Array (n_elements x n_oscillators x 3) containing f_j,
+                  gamma_j and omega_j, or (n_elements x n_oscillators x 4)
+                  containing f_j, gamma_j, omega_j and sigma_j for BB.
+    """
+    elements = (element,) if isinstance(element, str) else tuple(element)
+
+    return _table(model, elements)
+
+
+def static(element):
+    """
+    Collects the static polarizabilities (in eV) of one or more metals.
+
+    Parameters
+    ----------
+    element : String containing the name of the metal, or a sequence of
+              names.
+
+    Returns
+    -------
+    stat_pol : Array (n_elements) containing the static polarizabilities.
+    """
+    elements = (element,) if isinstance(element, str) else tuple(element)
+    for name in elements:
+        if name not in STATIC:
+            raise ValueError("Unknown element: {}".format(name))
+
+    return np.array([STATIC[name] * HARTREE for name in elements])
+
+
+@lru_cache(maxsize=None)
+def _table(model, elements):
+    registry = BB if model == "BB" else LD
+    for name in elements:
+        if name not in registry:
+            raise ValueError("Unknown element: {}".format(name))
+
+    width = 4 if model == "BB" else 3
+    n = max(len(registry[name]["oscillators"]) for name in elements)
+
+    oscillators = np.zeros((len(elements), n, width))
+    if model == "BB":
+        # Unit width keeps the padded oscillators finite.
+        oscillators[..., 3] = 1
+    for i, name in enumerate(elements):
+        values = registry[name]["oscillators"]
+        oscillators[i, :len(values)] = values
+
+    omega_p = np.array([registry[name]["omega_p"] for name in elements])
+    f0 = np.array([registry[name]["f0"] for name in elements])
+    gamma_0 = np.array([registry[name]["gamma_0"] for name in elements])
+
+    # The cached arrays are shared between calls.
+    for array in (omega_p, f0, gamma_0, oscillators):
+        array.flags.writeable = False
+
+    return (
+        omega_p,
+        f0,
+        gamma_0,
+        oscillators
+    )
@@ -0,0 +1,935 @@
+import warnings
+
+import numpy as np
+from scipy.linalg import lu_factor, lu_solve
+from scipy.linalg.lapack import zgesv, zsytrf, zsytrf_lwork, zsytrs
+from scipy import sparse
+from scipy.sparse.linalg import LinearOperator, gmres, splu
+
+
+class Inverse:
+    """
+    Solves the dipole interaction equations by explicitly inverting the A
+    matrix for every frequency.
+
+    Parameters
+    ----------
+    T : Array containing the stacked real dipole interaction tensor (3N x 3N).
+
+    coupling : Optional array (N x 3 x 3) of per-atom blocks (see
+               calc.E_tensor) added to A, such that the self-consistent field
+               equations are solved directly for the external field.
+    """
+
+    def __init__(self, T, coupling=None):
+        # The array has to be complex, otherwise the imag part of alpha will be
+        # discarded.
+        self.T = np.asarray(T)
+        self.A = np.empty(self.T.shape, dtype=complex, order="F")
+        self.B = np.empty(self.T.shape, dtype=complex, order="F")
+        self.coupling = coupling
+
+    @property
+    def nbytes(self):
+        """
+        Memory (in bytes) of the interaction tensor, the work matrix and the
+        inverse.
+        """
+        return self.T.nbytes + self.A.nbytes + self.B.nbytes
+
+    def factor(self, alpha):
+        """
+        Prepares the solver for a single frequency.
+
+        Parameters
+        ----------
+        alpha : Complex polarizability of the metal at the given frequency.
+        """
+        self.A[:] = self.T
+        np.fill_diagonal(self.A, alpha)
+        if self.coupling is not None:
+            add_blocks(self.A, self.coupling)
+        # A is solved against the identity, overwriting both Fortran-ordered
+        # matrices in place.
+        self.B[:] = 0
+        np.fill_diagonal(self.B, 1)
+        lu, piv, B, info = zgesv(self.A, self.B, overwrite_a=1, overwrite_b=1)
+        if info > 0:
+            raise np.linalg.LinAlgError("Singular A matrix")
+
+    def solve(self, E, out=None):
+        """
+        Computes the induced dipole moments for the given electrical field.
+
+        Parameters
+        ----------
+        E : Array containing the interleaved Cartesian components of the
+            electrical field at each atom.
+
+        out : Optional complex array of the same shape as E, in which the
+              dipole moments are stored.
+
+        Returns
+        -------
+        dipole : Array containing the induced dipole moments (out, if given).
+        """
+        return np.dot(self.B, E, out=out)
+
+
+class LU:
+    """
+    Solves the dipole interaction equations through an LU factorization of
+    the A matrix for every frequency.
+
+    The factorization is stored and reused for every right-hand side and
+    iteration, which avoids forming the inverse of A altogether. The
+    factorization overwrites a single complex work matrix.
+
+    Parameters
+    ----------
+    T : Array containing the stacked real dipole interaction tensor (3N x 3N).
+
+    coupling : Optional array (N x 3 x 3) of per-atom blocks (see
+               calc.E_tensor) added to A, such that the self-consistent field
+               equations are solved directly for the external field.
+    """
+
+    def __init__(self, T, coupling=None):
+        self.T = np.asarray(T)
+        self.A = np.empty(self.T.shape, dtype=complex, order="F")
+        self.coupling = coupling
+
+    @property
+    def nbytes(self):
+        """
+        Memory (in bytes) of the interaction tensor and the work matrix.
+        """
+        return self.T.nbytes + self.A.nbytes
+
+    def factor(self, alpha):
+        """
+        Prepares the solver for a single frequency.
+
+        Parameters
+        ----------
+        alpha : Complex polarizability of the metal at the given frequency.
+        """
+        self.A[:] = self.T
+        np.fill_diagonal(self.A, alpha)
+        if self.coupling is not None:
+            add_blocks(self.A, self.coupling)
+        self.lu = lu_factor(self.A, overwrite_a=True, check_finite=False)
+
+    def solve(self, E, out=None):
+        """
+        Computes the induced dipole moments for the given electrical field.
+
+        Parameters
+        ----------
+        E : Array containing the interleaved Cartesian components of the
+            electrical field at each atom.
+
+        out : Optional complex array of the same shape as E, in which the
+              dipole moments are stored.
+
+        Returns
+        -------
+        dipole : Array containing the induced dipole moments (out, if given).
+        """
+        if out is None:
+            out = np.empty(np.shape(E), dtype=complex)
+        out[...] = E
+
+        return store(
+            lu_solve(self.lu, out, overwrite_b=True, check_finite=False),
+            out
+        )
+
+
+class LDL:
+    """
+    Solves the dipole interaction equations through a symmetric-indefinite
+    (LDL^T) factorization of the complex symmetric A matrix for every
+    frequency.
+
+    Only the upper triangle of the interaction tensor is kept, packed row by
+    row (see pack), and the factorization (LAPACK zsytrf) only references
+    one triangle of the work matrix, which halves the memory held for the
+    tensor and the factorization cost compared to LU.
+
+    SciPy does not wrap the packed factorizations (zsptrf/zsptrs), so the
+    work matrix itself is kept in full storage. It is only allocated by the
+    first factor, so that the caller can release T after setting up the
+    solver. The solver then holds about 20 n^2 bytes for n = 3N, against
+    24 n^2 for LU with the dense tensor.
+
+    Parameters
+    ----------
+    T : Array containing the stacked real dipole interaction tensor (3N x 3N).
+
+    coupling : Optional array (N x 3 x 3) of symmetric per-atom blocks added
+               to A. Non-symmetric blocks would break the symmetry of A and
+               are rejected.
+    """
+
+    def __init__(self, T, coupling=None):
+        if coupling is not None and not np.allclose(
+            coupling, np.swapaxes(coupling, 1, 2)
+        ):
+            raise ValueError(
+                "The LDL solver requires symmetric coupling blocks"
+            )
+
+        self.n = len(T)
+        self.packed = pack(T)
+        self.coupling = coupling
+
+        self.W = None
+        work, info = zsytrf_lwork(self.n, lower=1)
+        self.lwork = max(self.n, int(np.real(work)))
+
+    @property
+    def nbytes(self):
+        """
+        Memory (in bytes) of the packed interaction tensor and the work
+        matrix.
+        """
+        nbytes = self.packed.nbytes
+        if self.W is not None:
+            nbytes += self.W.nbytes
+
+        return nbytes
+
+    def factor(self, alpha):
+        """
+        Prepares the solver for a single frequency.
+
+        Parameters
+        ----------
+        alpha : Complex polarizability of the metal at the given frequency.
+        """
+        # The upper triangle of the C-ordered work matrix is the lower
+        # triangle of its Fortran-ordered transpose, which is passed on to
+        # LAPACK without copies.
+        if self.W is None:
+            self.W = np.empty((self.n, self.n), dtype=complex)
+
+        start = 0
+        for i in range(self.n):
+            stop = start + self.n - i
+            self.W[i, i:] = self.packed[start:stop]
+            start = stop
+
+        np.fill_diagonal(self.W, alpha)
+        if self.coupling is not None:
+            add_blocks(self.W, self.coupling)
+
+        self.ldu, self.ipiv, info = zsytrf(
+            self.W.T,
+            lower=1,
+            lwork=self.lwork,
+            overwrite_a=1
+        )
+        if info > 0:
+            raise np.linalg.LinAlgError("Singular A matrix")
+
+    def solve(self, E, out=None):
+        """
+        Computes the induced dipole moments for the given electrical field.
+
+        Parameters
+        ----------
+        E : Array containing the interleaved Cartesian components of the
+            electrical field at each atom.
+
+        out : Optional complex array of the same shape as E, in which the
+              dipole moments are stored.
+
+        Returns
+        -------
+        dipole : Array containing the induced dipole moments (out, if given).
+        """
+        if out is None:
+            out = np.empty(np.shape(E), dtype=complex)
+        out[...] = E
+
+        dipole, info = zsytrs(
+            self.ldu,
+            self.ipiv,
+            out.reshape(self.n, -1),
+            lower=1,
+            overwrite_b=1
+        )
+
+        return store(
+            dipole.reshape(out.shape),
+            out
+        )
+
+
+class Spectral:
+    """
+    Solves the dipole interaction equations through a single eigendecomposition
+    of the interaction tensor.
+
+    The interaction tensor T is real symmetric and independent of the
+    frequency, and the polarizability only enters on the diagonal, so with
+    T = Q diag(l) Q^T the A matrix is inverted as Q diag(1 / (l + alpha)) Q^T.
+    The O(N^3) decomposition is done once, after which every frequency only
+    costs O(N^2) per solve.
+
+    Parameters
+    ----------
+    T : Array containing the stacked real dipole interaction tensor (3N x 3N).
+
+    coupling : Not supported, since the per-atom blocks do not share the
+               eigenvectors of T. Must be None.
+
+    eig : Optional tuple (eigvals, eigvecs) containing an earlier
+          eigendecomposition of T (e.g. from cache.eigh).
+    """
+
+    def __init__(self, T, coupling=None, eig=None):
+        if coupling is not None:
+            raise ValueError(
+                "The spectral solver cannot solve the coupled equations "
+                "directly"
+            )
+        if eig is None:
+            eig = np.linalg.eigh(T)
+        self.eigvals, self.eigvecs = eig
+        self.coef = None
+
+    @property
+    def nbytes(self):
+        """
+        Memory (in bytes) of the eigendecomposition and the work array.
+        """
+        nbytes = self.eigvals.nbytes + self.eigvecs.nbytes
+        if self.coef is not None:
+            nbytes += self.coef.nbytes
+
+        return nbytes
+
+    def factor(self, alpha):
+        """
+        Prepares the solver for a single frequency.
+
+        Parameters
+        ----------
+        alpha : Complex polarizability of the metal at the given frequency.
+        """
+        self.denom = 1 / (self.eigvals + alpha)
+
+    def solve(self, E, out=None):
+        """
+        Computes the induced dipole moments for the given electrical field.
+
+        Parameters
+        ----------
+        E : Array containing the interleaved Cartesian components of the
+            electrical field at each atom.
+
+        out : Optional complex array of the same shape as E, in which the
+              dipole moments are stored.
+
+        Returns
+        -------
+        dipole : Array containing the induced dipole moments (out, if given).
+        """
+        E = np.ascontiguousarray(E, dtype=complex)
+        if self.coef is None or self.coef.shape != E.shape:
+            self.coef = np.empty(E.shape, dtype=complex)
+
+        if out is None:
+            out = np.empty(E.shape, dtype=complex)
+
+        # The eigenvectors are real, so the complex arrays are viewed as real
+        # ones with twice the columns instead of casting the eigenvectors.
+        shape = (len(E), -1)
+        np.dot(self.eigvecs.T, E.view(float).reshape(shape),
+               out=self.coef.view(float).reshape(shape))
+        self.coef *= self.denom.reshape((-1,) + (1,) * (E.ndim - 1))
+        np.dot(self.eigvecs, self.coef.view(float).reshape(shape),
+               out=out.view(float).reshape(shape))
+
+        return out
+
+
+class Sparse:
+    """
+    Solves the dipole interaction equations through a sparse LU factorization
+    of the A matrix of a truncated interaction tensor for every frequency.
+
+    Parameters
+    ----------
+    T : Operator containing the truncated interaction tensor as a sparse
+        matrix, see operators.Cutoff.
+
+    coupling : Optional array (N x 3 x 3) of per-atom blocks (see
+               calc.E_tensor) added to A.
+    """
+
+    def __init__(self, T, coupling=None):
+        if not hasattr(T, "matrix"):
+            raise ValueError("The sparse solver needs a sparse operator")
+        self.T = T.matrix
+        self.n = self.T.shape[0] // 3
+        self.coupling = coupling
+        self.lu = None
+
+    @property
+    def nbytes(self):
+        """
+        Approximate memory (in bytes) of the sparse matrix and the sparse
+        factors.
+        """
+        nbytes = (self.T.data.nbytes + self.T.indices.nbytes
+                  + self.T.indptr.nbytes)
+        if self.lu is not None:
+            nbytes += self.lu.nnz * (np.dtype(complex).itemsize + 4)
+
+        return nbytes
+
+    def factor(self, alpha):
+        """
+        Prepares the solver for a single frequency.
+
+        Parameters
+        ----------
+        alpha : Complex polarizability of the metal at the given frequency.
+        """
+        blocks = np.zeros((self.n, 3, 3), dtype=complex)
+        blocks[:, [0, 1, 2], [0, 1, 2]] = alpha
+        if self.coupling is not None:
+            blocks += self.coupling
+
+        diagonal = sparse.bsr_matrix(
+            (blocks, np.arange(self.n), np.arange(self.n + 1)),
+            shape=self.T.shape
+        )
+        self.lu = splu(sparse.csc_matrix(self.T + diagonal))
+
+    def solve(self, E, out=None):
+        """
+        Computes the induced dipole moments for the given electrical field.
+
+        Parameters
+        ----------
+        E : Array containing the interleaved Cartesian components of the
+            electrical field at each atom.
+
+        out : Optional complex array of the same shape as E, in which the
+              dipole moments are stored.
+
+        Returns
+        -------
+        dipole : Array containing the induced dipole moments (out, if given).
+        """
+        dipole = self.lu.solve(np.asarray(E, dtype=complex))
+        if out is None:
+            return dipole
+
+        return store(dipole, out)
+
+
+class Krylov:
+    """
+    Solves the dipole interaction equations iteratively, using only products
+    of the interaction tensor with vectors.
+
+    The complex symmetric A matrix is solved with the conjugate orthogonal
+    conjugate gradient method (COCG). With non-symmetric coupling blocks, A
+    is no longer symmetric and GMRES is used instead. Both are preconditioned
+    with the inverse of the per-atom 3x3 diagonal blocks of A, i.e. alpha
+    plus the coupling block of the atom. Operators that group the atoms into
+    clusters (see operators.Hierarchical) are preconditioned with the inverse
+    of the diagonal blocks of A of the clusters instead.
+
+    After every solve, the number of iterations (summed over the fields) and
+    the largest final relative residual of the fields are kept as iterations
+    and residual. A solve that does not reach the tolerance within maxiter
+    iterations issues a RuntimeWarning.
+
+    Parameters
+    ----------
+    T : Operator with a matvec method computing T p, e.g. operators.Dipole
+        for a matrix-free tensor or operators.FFT for a lattice.
+
+    coupling : Optional array (N x 3 x 3) of per-atom blocks (see
+               calc.E_tensor) added to A.
+
+    tol : Tolerance on the relative residual |E - A p| / |E|.
+
+    maxiter : Maximum number of iterations per field and solve, i.e. of
+              products with A. For GMRES, this includes the iterations of
+              all restart cycles.
+    """
+
+    def __init__(self, T, coupling=None, tol=1e-12, maxiter=1000):
+        self.T = T
+        self.n = T.shape[0]
+        self.coupling = coupling
+        self.tol = tol
+        self.maxiter = maxiter
+        self.symmetric = coupling is None or np.allclose(
+            coupling, np.swapaxes(coupling, 1, 2)
+        )
+        self.leaves = None
+        if hasattr(T, "leaves"):
+            self.leaves = T.leaves()
+        self.precond = None
+        self.iterations = 0
+        self.residual = 0.0
+
+    @property
+    def nbytes(self):
+        """
+        Memory (in bytes) of the operator (if known), the preconditioner and
+        the vectors of a single solve.
+        """
+        nbytes = getattr(self.T, "nbytes", 0)
+        if self.leaves is not None and self.precond is not None:
+            nbytes += sum(
+                index.nbytes + inverse.nbytes
+                for index, inverse in self.precond
+            )
+        elif self.precond is not None:
+            nbytes += self.precond.nbytes
+
+        return nbytes + 5 * self.n * np.dtype(complex).itemsize
+
+    def factor(self, alpha):
+        """
+        Prepares the solver for a single frequency.
+
+        Parameters
+        ----------
+        alpha : Complex polarizability of the metal at the given frequency.
+        """
+        self.alpha = alpha
+
+        blocks = np.zeros((self.n // 3, 3, 3), dtype=complex)
+        blocks[:, [0, 1, 2], [0, 1, 2]] = alpha
+        if self.coupling is not None:
+            blocks += self.coupling
+
+        if self.leaves is None:
+            self.precond = np.linalg.inv(blocks)
+        else:
+            self.precond = []
+            for atoms, block in self.leaves:
+                A = block.astype(complex)
+                add_blocks(A, blocks[atoms])
+                index = (3 * atoms[:, None] + np.arange(3)).ravel()
+                self.precond.append((index, np.linalg.inv(A)))
+
+    def matvec(self, p):
+        """
+        Computes A p for the current frequency.
+        """
+        Ap = self.T.matvec(p)
+        Ap += self.alpha * p
+        if self.coupling is not None:
+            P = p.reshape(self.n // 3, 3, -1)
+            Ap += np.matmul(self.coupling, P).reshape(p.shape)
+
+        return Ap
+
+    def precondition(self, r):
+        """
+        Applies the inverse of the per-atom diagonal blocks of A, or of the
+        diagonal blocks of the clusters.
+        """
+        if self.leaves is not None:
+            z = np.empty_like(r)
+            for index, inverse in self.precond:
+                z[index] = np.dot(inverse, r[index])
+            return z
+
+        R = r.reshape(self.n // 3, 3, -1)
+
+        return np.matmul(self.precond, R).reshape(r.shape)
+
+    def solve(self, E, out=None, guess=None):
+        """
+        Computes the induced dipole moments for the given electrical field.
+
+        Parameters
+        ----------
+        E : Array containing the interleaved Cartesian components of the
+            electrical field at each atom.
+
+        out : Optional complex array of the same shape as E, in which the
+              dipole moments are stored.
+
+        guess : Optional array of the same shape as E containing the initial
+                guess for the dipole moments, e.g. the solution at a nearby
+                frequency. The iterations start from zero otherwise. May be
+                the same array as out.
+
+        Returns
+        -------
+        dipole : Array containing the induced dipole moments (out, if given).
+        """
+        E = np.asarray(E, dtype=complex)
+        B = E.reshape(self.n, -1)
+        if out is None:
+            out = np.empty(E.shape, dtype=complex)
+        dipole = out.reshape(B.shape)
+
+        X = [None] * B.shape[1]
+        if guess is not None:
+            X = np.asarray(guess).reshape(B.shape).T
+
+        # The iterations are summed over the fields.
+        self.iterations = 0
+        self.residual = 0.0
+        for i in range(B.shape[1]):
+            if self.symmetric:
+                dipole[:, i] = self.cocg(B[:, i], X[i])
+            else:
+                dipole[:, i] = self.gmres(B[:, i], X[i])
+
+        return out
+
+    def cocg(self, b, x0=None):
+        """
+        Solves A x = b with the preconditioned COCG method, starting from x0
+        (or zero).
+        """
+        x = np.zeros(self.n, dtype=complex)
+        norm = np.linalg.norm(b)
+        if norm == 0:
+            return x
+
+        r = b.copy()
+        if x0 is not None:
+            x[:] = x0
+            r -= self.matvec(x)
+
+        residual = np.linalg.norm(r) / norm
+        counter = 0
+
+        if residual > self.tol:
+            z = self.precondition(r)
+            p = z.copy()
+            rho = np.dot(r, z)
+
+        while residual > self.tol and counter < self.maxiter:
+            counter += 1
+
+            q = self.matvec(p)
+            a = rho / np.dot(p, q)
+            x += a * p
+            r -= a * q
+
+            residual = np.linalg.norm(r) / norm
+            if residual <= self.tol:
+                break
+
+            z = self.precondition(r)
+            rho_new = np.dot(r, z)
+            p *= rho_new / rho
+            p += z
+            rho = rho_new
+
+        self._record(counter, residual)
+
+        return x
+
+    def gmres(self, b, x0=None):
+        """
+        Solves A x = b with the preconditioned GMRES method, starting from x0
+        (or zero).
+        """
+        shape = (self.n, self.n)
+        A = LinearOperator(shape, matvec=self.matvec, dtype=complex)
+        M = LinearOperator(shape, matvec=self.precondition, dtype=complex)
+
+        counter = [0]
+
+        def callback(residual):
+            counter[0] += 1
+
+        # SciPy counts restart cycles, so maxiter is converted from single
+        # iterations.
+        restart = min(50, self.maxiter)
+        x, info = gmres(
+            A,
+            b,
+            x0=x0,
+            rtol=self.tol,
+            atol=0,
+            restart=restart,
+            maxiter=-(-self.maxiter // restart),
+            M=M,
+            callback=callback,
+            callback_type="pr_norm"
+        )
+
+        norm = np.linalg.norm(b)
+        residual = 0.0
+        if norm > 0:
+            residual = np.linalg.norm(b - self.matvec(x)) / norm
+        self._record(counter[0], residual, info > 0)
+
+        return x
+
+    def _record(self, counter, residual, failed=None):
+        """
+        Adds the iterations and the final relative residual of a single field
+        to the totals of the solve, and warns if the field did not converge.
+        """
+        self.iterations += counter
+        self.residual = max(self.residual, residual)
+
+        if failed is None:
+            failed = residual > self.tol
+        if failed:
+            warnings.warn(
+                "The krylov solver did not converge within {} iterations "
+                "(relative residual {:.2e})".format(self.maxiter, residual),
+                RuntimeWarning
+            )
+
+
+class Workspace:
+    """
+    Preallocated buffers of the self-consistent field iterations, reused for
+    every frequency of a sweep.
+
+    The buffers only depend on the number of dipole moments, the number of
+    fields and the depth of the Anderson mixing, so they are allocated once
+    per sweep instead of once per iteration. Together with the work matrix of
+    the solver (see the nbytes of the solver objects), they make up the
+    working memory of a sweep.
+
+    Parameters
+    ----------
+    n : Number of dipole moments (3N).
+
+    columns : Number of fields solved together.
+
+    depth : Number of previous iterations used for the Anderson mixing.
+    """
+
+    def __init__(self, n, columns=1, depth=5):
+        shape = (n, columns)
+        self.dipole = np.empty(shape, dtype=complex)
+        self.g = np.empty(shape, dtype=complex)
+        self.f = np.empty(shape, dtype=complex)
+        self.g_prev = np.empty(shape, dtype=complex)
+        self.f_prev = np.empty(shape, dtype=complex)
+
+        # The differences of the last iterations are stored as the columns
+        # of a ring buffer.
+        self.dG = np.empty((n * columns, depth), dtype=complex, order="F")
+        self.dF = np.empty((n * columns, depth), dtype=complex, order="F")
+
+    @property
+    def nbytes(self):
+        """
+        Memory (in bytes) of the buffers.
+        """
+        return sum(
+            buffer.nbytes for buffer in (
+                self.dipole, self.g, self.f, self.g_prev, self.f_prev,
+                self.dG, self.dF
+            )
+        )
+
+
+def solver(method, T, coupling=None, eig=None, tol=1e-12, maxiter=1000):
+    """
+    Sets up the solver for the dipole interaction equations.
+
+    Parameters
+    ----------
+    method : String containing the name of the solver (lu, ldl, inv,
+             spectral, sparse or krylov).
+
+    T : Array containing the stacked real dipole interaction tensor (3N x 3N),
+        or for sparse and krylov an operator computing T p (see operators).
+
+    coupling : Optional array (N x 3 x 3) of per-atom blocks (see
+               calc.E_tensor) for solving the coupled equations directly.
+
+    eig : Optional tuple (eigvals, eigvecs) containing an earlier
+          eigendecomposition of T, used by the spectral solver.
+
+    tol : Tolerance on the relative residual of the krylov solver.
+
+    maxiter : Maximum number of iterations per solve of the krylov solver.
+
+    Returns
+    -------
+    solver : Solver object.
+    """
+    if method == "lu":
+        return LU(T, coupling)
+    elif method == "ldl":
+        return LDL(T, coupling)
+    elif method == "inv":
+        return Inverse(T, coupling)
+    elif method == "spectral":
+        return Spectral(T, coupling, eig)
+    elif method == "sparse":
+        return Sparse(T, coupling)
+    elif method == "krylov":
+        return Krylov(T, coupling, tol, maxiter)
+    else:
+        raise ValueError("Unknown solver: {}".format(method))
+
+
+def pack(T):
+    """
+    Packs the upper triangle of a symmetric matrix row by row.
+
+    Parameters
+    ----------
+    T : Symmetric array (n x n).
+
+    Returns
+    -------
+    packed : Array (n(n + 1) / 2) containing the rows of the upper triangle.
+    """
+    n = len(T)
+    packed = np.empty(n * (n + 1) // 2, dtype=np.asarray(T).dtype)
+
+    start = 0
+    for i in range(n):
+        stop = start + n - i
+        packed[start:stop] = T[i, i:]
+        start = stop
+
+    return packed
+
+
+def store(result, out):
+    """
+    Copies the result of a LAPACK call into the output array, unless the
+    call already overwrote it in place.
+
+    Parameters
+    ----------
+    result : Array returned by the call.
+
+    out : Array of the same shape, passed on to the call with overwrite_b.
+
+    Returns
+    -------
+    out : The output array.
+    """
+    if not np.may_share_memory(result, out):
+        out[...] = result
+
+    return out
+
+
+def add_blocks(A, blocks):
+    """
+    Adds a 3x3 block to the diagonal block of each atom in the A matrix.
+
+    Parameters
+    ----------
+    A : Array (3N x 3N) to be updated in place.
+
+    blocks : Array (N x 3 x 3) containing the blocks of each atom.
+    """
+    idx = np.arange(A.shape[-1]).reshape(-1, 3)
+    A[..., idx[:, :, None], idx[:, None, :]] += blocks
+
+
+def scf(solver, field, dipole, tol=1e-12, maxiter=1000, depth=5,
+        workspace=None):
+    """
+    Solves the self-consistent field equations for the induced dipole moments
+    at a single frequency.
+
+    Each iteration computes the field from the current dipole moments and
+    solves for the new dipole moments. The iterations are accelerated with
+    Anderson mixing over the last few iterations and stopped once the
+    relative residual drops below the tolerance.
+
+    Parameters
+    ----------
+    solver : Solver object (e.g. LU) prepared for the frequency with factor.
+
+    field : Function computing the electrical field from the dipole moments.
+
+    dipole : Array (3N x k) containing the initial guess for the dipole
+             moments.
+
+    tol : Tolerance on the relative residual |p_new - p| / |p_new|.
+
+    maxiter : Maximum number of iterations.
+
+    depth : Number of previous iterations used for the Anderson mixing. With
+            a depth of 0 the plain fixed-point iterations are used.
+
+    workspace : Optional Workspace with the buffers of the iterations, e.g.
+                shared by all frequencies of a sweep.
+
+    Returns
+    -------
+    dipole : Array containing the converged dipole moments. The array is a
+             buffer of the workspace and is reused by the next call.
+
+    counter : Number of iterations used.
+
+    residual : Relative residual of the last iteration.
+    """
+    dipole = np.asarray(dipole).reshape(len(dipole), -1)
+    if workspace is None:
+        workspace = Workspace(dipole.shape[0], dipole.shape[-1], depth)
+
+    p = workspace.dipole
+    g = workspace.g
+    f = workspace.f
+    p[...] = dipole
+
+    history = 0
+    counter = 0
+
+    while True:
+
+        counter += 1
+
+        solver.solve(field(p), out=g)
+        np.subtract(g, p, out=f)
+
+        norm = np.linalg.norm(g)
+        residual = np.linalg.norm(f) / norm if norm > 0 else 0.0
+
+        if residual <= tol or counter >= maxiter:
+            return (
+                g,
+                counter,
+                residual
+            )
+
+        if depth == 0:
+            p[...] = g
+            continue
+
+        if counter > 1:
+            column = (counter - 2) % depth
+            np.subtract(g, workspace.g_prev,
+                        out=workspace.dG[:, column].reshape(g.shape))
+            np.subtract(f, workspace.f_prev,
+                        out=workspace.dF[:, column].reshape(f.shape))
+            history = min(history + 1, depth)
+
+        workspace.g_prev[...] = g
+        workspace.f_prev[...] = f
+
+        # The least-squares fit does not depend on the order of the stored
+        # differences, so the ring buffer is used as is.
+        if history:
+            gamma = np.linalg.lstsq(workspace.dF[:, :history], f.ravel(),
+                                    rcond=None)[0]
+            np.dot(workspace.dG[:, :history], gamma, out=p.reshape(-1))
+            np.subtract(g, p, out=p)
+        else:
+            p[...] = g
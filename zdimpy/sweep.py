@@ -0,0 +1,1042 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from zdimpy import cache, calc, fread, operators, solve
+
+# Environment variables controlling the number of BLAS threads.
+BLAS_THREADS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "BLIS_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS"
+)
+
+# Arrays shared with the worker processes of parallel.
+_shared = {}
+
+
+def batched(
+    element,
+    model,
+    freq,
+    temp_A,
+    o_dist,
+    E_external,
+    coordinates,
+    x_coordinates,
+    y_coordinates,
+    z_coordinates,
+    tol=1e-12,
+    maxiter=1000,
+    direct=False,
+    depth=5,
+    memory=2**28
+):
+    """
+    Computes the induced dipole moments for all frequencies at once.
+
+    The polarizability is evaluated over the whole frequency array, and the
+    interaction tensor is decomposed once as T = Q diag(l) Q^T (see
+    cache.eigh), so that the A matrix of every frequency is inverted as
+    Q diag(1 / (l + alpha)) Q^T. The self-consistent field iterations are
+    then carried out for a chunk of frequencies simultaneously, with the
+    products of all frequencies and fields done as two real matrix products
+    per iteration. The iterations are accelerated with Anderson mixing as in
+    solve.scf, and frequencies are dropped from the iterations as soon as
+    their relative residual is below the tolerance. With direct, the
+    coupling to the field of the origin term is added to the stacked A
+    matrices instead, which are solved in batched LAPACK calls.
+
+    Parameters
+    ----------
+    element : String containing the name of the metal.
+
+    model : String containing the name of the model (LD, XL or BB).
+
+    freq : Array of frequency points (in eV) to be used for the calculations.
+
+    temp_A : Array containing the stacked real dipole interaction tensor.
+
+    o_dist : Spatial distance from the origin (centre of the cluster) to each
+             atom.
+
+    E_external : Array containing the Cartesian components of the external
+                 electrical field, or an array (3 x k) with k fields as
+                 columns that are solved together.
+
+    coordinates : Array containing the coordinates of the atoms.
+
+    x_coordinates : Array containing the x-coordinates of the atoms.
+
+    y_coordinates : Array containing the y-coordinates of the atoms.
+
+    z_coordinates : Array containing the z-coordinates of the atoms.
+
+    tol : Tolerance on the relative residual |p_new - p| / |p_new|.
+
+    maxiter : Maximum number of iterations.
+
+    direct : Solve the self-consistent field equations directly, without
+             iterations.
+
+    depth : Number of previous iterations used for the Anderson mixing.
+
+    memory : Memory budget (in bytes) for the arrays of a chunk of
+             frequencies.
+
+    Returns
+    -------
+    dipole : Complex array (n_freq x 3N), or (n_freq x 3N x k) for k fields,
+             containing the induced dipole moments for each frequency.
+
+    iterations : Array containing the number of iterations for each frequency.
+
+    residual : Array containing the final relative residual for each
+               frequency.
+    """
+    freq = np.atleast_1d(freq)
+    alpha = np.atleast_1d(cache.polarizability(element, model, freq))
+    n = len(temp_A)
+
+    # The dipole moments are computed with one column per field, and the
+    # column axis is dropped again for a single field.
+    columns = np.shape(E_external)[1:]
+    dipole = np.empty((len(freq), n) + columns, dtype=complex)
+    iterations = np.zeros(len(freq), dtype=int)
+    residual = np.zeros(len(freq))
+
+    field = operators.Field(o_dist, E_external, x_coordinates, y_coordinates,
+                            z_coordinates)
+    k = field.external.shape[1]
+
+    if direct:
+        diag = np.arange(n)
+
+        # Both the stacked A matrices and their factorizations are held in
+        # memory.
+        chunk = max(1, int(memory // (2 * 16 * n**2)))
+
+        for start in range(0, len(freq), chunk):
+            stop = min(start + chunk, len(freq))
+
+            A = np.empty((stop - start, n, n), dtype=complex)
+            A[:] = temp_A
+            A[:, diag, diag] = alpha[start:stop, None]
+            solve.add_blocks(A, field.blocks)
+
+            new = np.linalg.solve(A, field.external)
+            dipole[start:stop] = new.reshape(dipole[start:stop].shape)
+
+        iterations[:] = 1
+
+        return (
+            dipole,
+            iterations,
+            residual
+        )
+
+    eigvals, eigvecs = cache.eigh(coordinates, temp_A)
+
+    # The iterates, the field, the work arrays and the Anderson history hold
+    # about 2 depth + 8 arrays (3N x k) per frequency.
+    chunk = max(1, int(memory // ((2 * depth + 8) * 16 * n * k)))
+
+    for start in range(0, len(freq), chunk):
+        rows = np.arange(start, min(start + chunk, len(freq)))
+
+        p = np.ones((len(rows), n, k), dtype=complex)
+        dG = np.empty((len(rows), n * k, depth), dtype=complex)
+        dF = np.empty((len(rows), n * k, depth), dtype=complex)
+
+        history = 0
+        counter = 0
+
+        while True:
+
+            counter += 1
+
+            # The frequencies and fields are the columns of the products with
+            # the real eigenvectors, so the complex arrays are viewed as real
+            # ones with twice the columns.
+            E = np.ascontiguousarray(field(p).transpose(1, 0, 2))
+            E = E.reshape(n, -1)
+            coef = np.dot(eigvecs.T, E.view(float)).view(complex)
+            coef = coef.reshape(n, len(rows), k)
+            coef /= (eigvals[:, None] + alpha[rows])[..., None]
+            g = np.dot(eigvecs, coef.reshape(n, -1).view(float))
+            g = g.view(complex).reshape(n, len(rows), k).transpose(1, 0, 2)
+            f = g - p
+
+            norm = np.linalg.norm(g, axis=(1, 2))
+            norm[norm == 0] = 1
+            change = np.linalg.norm(f, axis=(1, 2)) / norm
+
+            residual[rows] = change
+            iterations[rows] = counter
+
+            done = change <= tol
+            if counter >= maxiter:
+                done[:] = True
+
+            # Converged frequencies are stored and dropped from the
+            # iterations.
+            if done.any():
+                dipole[rows[done]] = g[done].reshape((-1, n) + columns)
+
+                keep = ~done
+                if not keep.any():
+                    break
+
+                rows = rows[keep]
+                g = g[keep]
+                f = f[keep]
+                dG = dG[keep]
+                dF = dF[keep]
+                if counter > 1:
+                    g_prev = g_prev[keep]
+                    f_prev = f_prev[keep]
+
+            if depth == 0:
+                p = g
+                continue
+
+            if counter > 1:
+                column = (counter - 2) % depth
+                dG[:, :, column] = (g - g_prev).reshape(len(rows), -1)
+                dF[:, :, column] = (f - f_prev).reshape(len(rows), -1)
+                history = min(history + 1, depth)
+
+            g_prev = g
+            f_prev = f
+
+            # The least-squares fit of each frequency is done with the
+            # pseudo-inverse, with the same cutoff as the lstsq of solve.scf.
+            if history:
+                gamma = np.matmul(np.linalg.pinv(dF[:, :, :history]),
+                                  f.reshape(len(rows), -1, 1))
+                p = g - np.matmul(dG[:, :, :history], gamma).reshape(g.shape)
+            else:
+                p = g
+
+    return (
+        dipole,
+        iterations,
+        residual
+    )
+
+
+def serial(
+    element,
+    model,
+    freq,
+    solver,
+    o_dist,
+    E_external,
+    coordinates,
+    x_coordinates,
+    y_coordinates,
+    z_coordinates,
+    direct=False,
+    tol=1e-12,
+    maxiter=1000,
+    depth=5,
+    guess="ones",
+    workspace=None
+):
+    """
+    Computes the induced dipole moments one frequency at a time.
+
+    The dipole moments of every frequency are solved into preallocated
+    arrays, so the working memory of the sweep (solver.nbytes plus
+    workspace.nbytes) does not grow with the number of frequencies.
+
+    Neighbouring frequencies have nearly the same dipole moments, so the
+    frequencies are solved in ascending order, and the iterations (scf, or
+    the krylov solver for direct) can start from the solutions at the
+    frequencies solved before.
+
+    Parameters
+    ----------
+    element : String containing the name of the metal.
+
+    model : String containing the name of the model (LD, XL or BB).
+
+    freq : Array of frequency points (in eV) to be used for the calculations.
+
+    solver : Solver object (see solve.solver). For direct, the solver must be
+             set up with the coupling blocks.
+
+    o_dist : Spatial distance from the origin (centre of the cluster) to each
+             atom.
+
+    E_external : Array containing the Cartesian components of the external
+                 electrical field, or an array (3 x k) with k fields as
+                 columns that are solved together.
+
+    coordinates : Array containing the coordinates of the atoms.
+
+    x_coordinates : Array containing the x-coordinates of the atoms.
+
+    y_coordinates : Array containing the y-coordinates of the atoms.
+
+    z_coordinates : Array containing the z-coordinates of the atoms.
+
+    direct : Solve the self-consistent field equations directly, without
+             iterations.
+
+    tol : Tolerance on the relative residual |p_new - p| / |p_new|.
+
+    maxiter : Maximum number of iterations.
+
+    depth : Number of previous iterations used for the Anderson mixing.
+
+    guess : String containing the initial guess of the iterations at each
+            frequency: all ones (ones), the dipole moments of the previous
+            frequency (previous) or their linear extrapolation from the two
+            previous frequencies (extrapolate).
+
+    workspace : Optional solve.Workspace with the buffers of the iterations.
+                A new one is allocated for the sweep if not given.
+
+    Returns
+    -------
+    dipole : Complex array (n_freq x 3N), or (n_freq x 3N x k) for k fields,
+             containing the induced dipole moments for each frequency.
+
+    iterations : Array containing the number of iterations for each frequency
+                 (of the krylov solver, for direct).
+
+    residual : Array containing the final relative residual for each
+               frequency (of the krylov solver, for direct, and 0 for the
+               other direct solvers).
+    """
+    if guess not in ("ones", "previous", "extrapolate"):
+        raise ValueError("Unknown initial guess: {}".format(guess))
+
+    freq = np.atleast_1d(freq)
+    alpha = np.atleast_1d(cache.polarizability(element, model, freq))
+    n = 3 * len(coordinates)
+
+    # Several fields are solved as columns against the same factorization.
+    E_external = np.asarray(E_external)
+    columns = E_external.shape[1:]
+
+    dipole = np.empty((len(freq), n) + columns, dtype=complex)
+    iterations = np.ones(len(freq), dtype=int)
+    residual = np.zeros(len(freq))
+
+    reps = (n // 3,) + (1,) * len(columns)
+    E_direct = np.tile(E_external.astype(complex), reps)
+
+    field = operators.Field(o_dist, E_external, x_coordinates, y_coordinates,
+                            z_coordinates)
+
+    if workspace is None and not direct:
+        workspace = solve.Workspace(n, int(np.prod(columns)), depth)
+
+    order = np.argsort(freq, kind="stable")
+    krylov = isinstance(solver, solve.Krylov)
+
+    for step, i in enumerate(order):
+
+        solver.factor(alpha[i])
+
+        if direct and krylov:
+            start = None
+            if _guess(guess, freq, dipole, order[:step], i, dipole[i]):
+                start = dipole[i]
+            solver.solve(E_direct, out=dipole[i], guess=start)
+            iterations[i] = solver.iterations
+            residual[i] = solver.residual
+            continue
+
+        if direct:
+            solver.solve(E_direct, out=dipole[i])
+            continue
+
+        # The initial guess is written into the workspace, which scf then
+        # updates in place.
+        start = workspace.dipole.reshape(dipole[i].shape)
+        if not _guess(guess, freq, dipole, order[:step], i, start):
+            start.fill(1)
+        result, iterations[i], residual[i] = solve.scf(
+            solver,
+            field,
+            workspace.dipole,
+            tol,
+            maxiter,
+            depth,
+            workspace
+        )
+        dipole[i] = result.reshape((n,) + columns)
+
+    return (
+        dipole,
+        iterations,
+        residual
+    )
+
+
+def _guess(guess, freq, dipole, done, i, out):
+    """
+    Writes the initial guess for the dipole moments at freq[i] into out, from
+    the dipole moments at the frequencies in done (in the order they were
+    solved). Returns False if there is nothing to start from.
+    """
+    if guess == "ones" or len(done) == 0:
+        return False
+
+    j = done[-1]
+    if guess == "previous" or len(done) < 2 or freq[j] == freq[done[-2]]:
+        out[...] = dipole[j]
+        return True
+
+    # Linear extrapolation in the frequency from the last two solutions.
+    k = done[-2]
+    np.subtract(dipole[j], dipole[k], out=out)
+    out *= (freq[i] - freq[j]) / (freq[j] - freq[k])
+    out += dipole[j]
+
+    return True
+
+
+def adaptive(
+    element,
+    model,
+    freq_min,
+    freq_max,
+    solver,
+    o_dist,
+    E_external,
+    coordinates,
+    x_coordinates,
+    y_coordinates,
+    z_coordinates,
+    direct=False,
+    tol=1e-12,
+    maxiter=1000,
+    depth=5,
+    guess="ones",
+    start=25,
+    points=200,
+    accuracy=1e-3,
+    workspace=None
+):
+    """
+    Computes the induced dipole moments on a frequency grid that is refined
+    where the spectrum changes quickly.
+
+    The sweep starts from a coarse logarithmic grid. Every interval is
+    checked by solving at its geometric midpoint: if the total dipole moment
+    there deviates from the mean of the ends by more than the accuracy
+    (relative to the largest total dipole moment so far), both halves are
+    checked in turn. Flat parts of the spectrum thus keep the coarse spacing,
+    while the points gather around the resonances. Once the number of points
+    runs out, the intervals with the largest deviations are refined first.
+
+    Parameters
+    ----------
+    element : String containing the name of the metal.
+
+    model : String containing the name of the model (LD, XL or BB).
+
+    freq_min : Lowest frequency (in eV).
+
+    freq_max : Highest frequency (in eV).
+
+    solver : Solver object (see solve.solver). For direct, the solver must be
+             set up with the coupling blocks.
+
+    o_dist : Spatial distance from the origin (centre of the cluster) to each
+             atom.
+
+    E_external : Array containing the Cartesian components of the external
+                 electrical field, or an array (3 x k) with k fields as
+                 columns that are solved together.
+
+    coordinates : Array containing the coordinates of the atoms.
+
+    x_coordinates : Array containing the x-coordinates of the atoms.
+
+    y_coordinates : Array containing the y-coordinates of the atoms.
+
+    z_coordinates : Array containing the z-coordinates of the atoms.
+
+    direct : Solve the self-consistent field equations directly, without
+             iterations.
+
+    tol : Tolerance on the relative residual |p_new - p| / |p_new|.
+
+    maxiter : Maximum number of iterations.
+
+    depth : Number of previous iterations used for the Anderson mixing.
+
+    guess : String containing the initial guess of the iterations at each
+            frequency (see serial).
+
+    start : Number of points of the initial logarithmic grid.
+
+    points : Maximum number of frequency points in total.
+
+    accuracy : Tolerance on the deviation of the real and imaginary parts of
+               the total dipole moment from the linear interpolation,
+               relative to the largest total dipole moment.
+
+    workspace : Optional solve.Workspace with the buffers of the iterations.
+
+    Returns
+    -------
+    freq : Array containing the frequency points in ascending order.
+
+    dipole : Complex array (n_freq x 3N), or (n_freq x 3N x k) for k fields,
+             containing the induced dipole moments for each frequency.
+
+    iterations : Array containing the number of iterations for each frequency.
+
+    residual : Array containing the final relative residual for each
+               frequency.
+    """
+    n = 3 * len(coordinates)
+    if workspace is None and not direct:
+        workspace = solve.Workspace(n, np.size(E_external) // 3, depth)
+
+    def run(freq):
+        return serial(element, model, freq, solver, o_dist, E_external,
+                      coordinates, x_coordinates, y_coordinates,
+                      z_coordinates, direct, tol, maxiter, depth, guess,
+                      workspace)
+
+    freq = np.geomspace(freq_min, freq_max, max(2, min(start, points)))
+    results = [(freq,) + run(freq)]
+    mu = _total(results[-1][1])
+    scale = np.abs(mu).max()
+
+    # Intervals still to be checked, as (deviation, ends, total dipole
+    # moments at the ends). The intervals of the initial grid are checked in
+    # order.
+    intervals = [
+        (np.inf, freq[j], freq[j + 1], mu[j], mu[j + 1])
+        for j in range(len(freq) - 1)
+    ]
+    count = len(freq)
+
+    while intervals and count < points:
+        intervals.sort(key=lambda interval: -interval[0])
+        intervals = intervals[:points - count]
+
+        freq = np.sqrt([a * b for _, a, b, _, _ in intervals])
+        results.append((freq,) + run(freq))
+        mu = _total(results[-1][1])
+        scale = max(scale, np.abs(mu).max())
+        count += len(freq)
+
+        refine = []
+        for (_, a, b, mu_a, mu_b), m, mu_m in zip(intervals, freq, mu):
+            deviation = np.abs(mu_m - (mu_a + mu_b) / 2).max()
+            if deviation > accuracy * scale:
+                refine.append((deviation, a, m, mu_a, mu_m))
+                refine.append((deviation, m, b, mu_m, mu_b))
+        intervals = refine
+
+    freq, dipole, iterations, residual = (
+        np.concatenate(arrays) for arrays in zip(*results)
+    )
+    order = np.argsort(freq, kind="stable")
+
+    return (
+        freq[order],
+        dipole[order],
+        iterations[order],
+        residual[order]
+    )
+
+
+def _total(dipole):
+    """
+    Sums the induced dipole moments (n_freq x 3N, or n_freq x 3N x k) over
+    the atoms, with the Cartesian components of all fields flattened.
+    """
+    dipole = dipole.reshape((len(dipole), -1, 3) + dipole.shape[2:])
+
+    return dipole.sum(axis=1).reshape(len(dipole), -1)
+
+
+def cluster_polarizability(
+    element,
+    model,
+    freq,
+    solver,
+    o_dist,
+    coordinates,
+    x_coordinates,
+    y_coordinates,
+    z_coordinates,
+    direct=False,
+    tol=1e-12,
+    maxiter=1000,
+    depth=5
+):
+    """
+    Computes the 3x3 polarizability tensor of the cluster for each frequency.
+
+    Unit fields along x, y and z are solved as three columns against a single
+    factorization per frequency (see serial), and the induced dipole moments
+    are summed over the atoms. The orientation-averaged polarizability is a
+    third of the trace of the tensor.
+
+    Parameters
+    ----------
+    element : String containing the name of the metal.
+
+    model : String containing the name of the model (LD, XL or BB).
+
+    freq : Array of frequency points (in eV) to be used for the calculations.
+
+    solver : Solver object (see solve.solver). For direct, the solver must be
+             set up with the coupling blocks.
+
+    o_dist : Spatial distance from the origin (centre of the cluster) to each
+             atom.
+
+    coordinates : Array containing the coordinates of the atoms.
+
+    x_coordinates : Array containing the x-coordinates of the atoms.
+
+    y_coordinates : Array containing the y-coordinates of the atoms.
+
+    z_coordinates : Array containing the z-coordinates of the atoms.
+
+    direct : Solve the self-consistent field equations directly, without
+             iterations.
+
+    tol : Tolerance on the relative residual |p_new - p| / |p_new|.
+
+    maxiter : Maximum number of iterations.
+
+    depth : Number of previous iterations used for the Anderson mixing.
+
+    Returns
+    -------
+    tensor : Complex array (n_freq x 3 x 3) containing the polarizability
+             tensor, whose column j is the total induced dipole moment for a
+             unit field along axis j.
+    """
+    dipole = serial(
+        element,
+        model,
+        freq,
+        solver,
+        o_dist,
+        np.eye(3),
+        coordinates,
+        x_coordinates,
+        y_coordinates,
+        z_coordinates,
+        direct,
+        tol,
+        maxiter,
+        depth
+    )[0]
+
+    return dipole.reshape(len(dipole), -1, 3, 3).sum(axis=1)
+
+
+def parallel(
+    element,
+    model,
+    freq,
+    temp_A,
+    o_dist,
+    E_external,
+    coordinates,
+    method="lu",
+    direct=False,
+    tol=1e-12,
+    maxiter=1000,
+    depth=5,
+    workers=None,
+    chunk=None,
+    operator="dipole",
+    cutoff=None,
+    guess="ones",
+    accuracy=1e-6,
+    leaf=64,
+    eta=2.0
+):
+    """
+    Computes the induced dipole moments with the frequencies spread over a
+    pool of worker processes.
+
+    The interaction tensor and the coordinates are placed once in shared
+    memory, from which every worker sets up its own solver, so no matrices are
+    sent along with the tasks. For spectral, the eigendecomposition is done
+    once and shared instead of the tensor. The workers are spawned with the
+    number of BLAS threads limited to the number of cores per worker, to
+    avoid oversubscribing the cores. As spawned workers import the main
+    module, a calling script has to guard its work with
+    if __name__ == "__main__".
+
+    Parameters
+    ----------
+    element : String containing the name of the metal.
+
+    model : String containing the name of the model (LD, XL or BB).
+
+    freq : Array of frequency points (in eV) to be used for the calculations.
+
+    temp_A : Array containing the stacked real dipole interaction tensor. Not
+             used for sparse and krylov, whose workers set up their operator
+             from the coordinates.
+
+    o_dist : Spatial distance from the origin (centre of the cluster) to each
+             atom.
+
+    E_external : Array containing the Cartesian components of the external
+                 electrical field, or an array (3 x k) with k fields as
+                 columns that are solved together.
+
+    coordinates : Array containing the coordinates of the atoms.
+
+    method : String containing the name of the solver (see solve.solver).
+
+    direct : Solve the self-consistent field equations directly, without
+             iterations.
+
+    tol : Tolerance on the relative residual |p_new - p| / |p_new|.
+
+    maxiter : Maximum number of iterations.
+
+    depth : Number of previous iterations used for the Anderson mixing.
+
+    workers : Number of worker processes (defaults to the number of cores).
+
+    chunk : Number of frequencies per task (defaults to an even split over
+            the workers).
+
+    operator : String containing the name of the operator computing the
+               products with the interaction tensor for sparse and krylov
+               (see operators.operator).
+
+    cutoff : Distance beyond which the interactions are dropped by the cutoff
+             operator.
+
+    accuracy : Relative accuracy of the low-rank blocks of the hierarchical
+               operator.
+
+    leaf : Maximum number of atoms in a leaf of the hierarchical operator.
+
+    eta : Admissibility parameter of the hierarchical operator.
+
+    guess : String containing the initial guess of the iterations at each
+            frequency (see serial). The frequencies are handed out in
+            ascending order, so every task covers a contiguous band.
+
+    Returns
+    -------
+    dipole : Complex array (n_freq x 3N), or (n_freq x 3N x k) for k fields,
+             containing the induced dipole moments for each frequency.
+
+    iterations : Array containing the number of iterations for each frequency.
+
+    residual : Array containing the final relative residual for each
+               frequency.
+    """
+    freq = np.atleast_1d(freq)
+    cores = os.cpu_count() or 1
+    workers = workers or cores
+    chunk = chunk or -(-len(freq) // workers)
+    threads = max(1, cores // workers)
+
+    arrays = {
+        "o_dist": np.asarray(o_dist, dtype=float),
+        "coordinates": np.asarray(coordinates, dtype=float)
+    }
+    # The sparse and matrix-free solvers never form the dense tensor, and the
+    # spectral solver only needs its eigendecomposition, which is done once
+    # for all workers.
+    if method == "spectral":
+        arrays["eigvals"], arrays["eigvecs"] = cache.eigh(coordinates, temp_A)
+    elif method not in ("krylov", "sparse"):
+        arrays["temp_A"] = np.asarray(temp_A, dtype=float)
+
+    blocks = {}
+    shapes = {}
+    for name, array in arrays.items():
+        blocks[name] = shared_memory.SharedMemory(
+            create=True,
+            size=max(1, array.nbytes)
+        )
+        np.ndarray(array.shape, buffer=blocks[name].buf)[...] = array
+        shapes[name] = (blocks[name].name, array.shape)
+
+    settings = (element, model, np.asarray(E_external), method, direct, tol,
+                maxiter, depth, operator, cutoff, guess, accuracy, leaf, eta,
+                cache.directory(), cache.max_bytes())
+
+    dipole = np.empty((len(freq), 3 * len(coordinates))
+                      + np.shape(E_external)[1:], dtype=complex)
+    iterations = np.empty(len(freq), dtype=int)
+    residual = np.empty(len(freq))
+
+    # The BLAS libraries only read the number of threads from the environment
+    # when NumPy is imported, so the workers are spawned as fresh interpreters
+    # with the limits set beforehand. Forked workers would inherit the thread
+    # pools of the parent.
+    context = multiprocessing.get_context("spawn")
+    environ = {name: os.environ.get(name) for name in BLAS_THREADS}
+    os.environ.update({name: str(threads) for name in BLAS_THREADS})
+
+    try:
+        with ProcessPoolExecutor(
+            workers,
+            mp_context=context,
+            initializer=_attach,
+            initargs=(shapes, settings)
+        ) as executor:
+            order = np.argsort(freq, kind="stable")
+            tasks = {
+                executor.submit(
+                    _solve_chunk,
+                    freq[order[start:start + chunk]]
+                ): order[start:start + chunk]
+                for start in range(0, len(freq), chunk)
+            }
+            for task, index in tasks.items():
+                result = task.result()
+                dipole[index] = result[0]
+                iterations[index] = result[1]
+                residual[index] = result[2]
+
+    finally:
+        for name, value in environ.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+        for block in blocks.values():
+            block.close()
+            block.unlink()
+
+    return (
+        dipole,
+        iterations,
+        residual
+    )
+
+
+def trajectory(
+    element,
+    model,
+    freq,
+    path,
+    origin,
+    E_external,
+    method="lu",
+    direct=False,
+    tol=1e-12,
+    maxiter=1000,
+    depth=5,
+    operator="dipole",
+    cutoff=None,
+    accuracy=1e-6,
+    leaf=64,
+    eta=2.0
+):
+    """
+    Computes the induced dipole spectra of the frames of a trajectory, one
+    frame at a time.
+
+    The frames are read from a multi-frame .xyz file (see fread.frames), and
+    the next frame is read in a background thread while the current one is
+    solved. Only the interaction tensor and the solver of the current frame
+    are held in memory, so averages over many frames run at constant memory.
+
+    Parameters
+    ----------
+    element : String containing the name of the metal.
+
+    model : String containing the name of the model (LD, XL or BB).
+
+    freq : Array of frequency points (in eV) to be used for the calculations.
+
+    path : The absolute file path of the .xyz file.
+
+    origin : Array containing the coordinates of the origin.
+
+    E_external : Array containing the Cartesian components of the external
+                 electrical field, or an array (3 x k) with k fields as
+                 columns.
+
+    method : String containing the name of the solver (see solve.solver).
+
+    direct : Solve the self-consistent field equations directly, without
+             iterations.
+
+    tol : Tolerance on the relative residual |p_new - p| / |p_new|.
+
+    maxiter : Maximum number of iterations.
+
+    depth : Number of previous iterations used for the Anderson mixing.
+
+    operator : String containing the name of the operator computing the
+               products with the interaction tensor for sparse and krylov
+               (see operators.operator).
+
+    cutoff : Distance beyond which the interactions are dropped by the cutoff
+             operator.
+
+    accuracy : Relative accuracy of the low-rank blocks of the hierarchical
+               operator.
+
+    leaf : Maximum number of atoms in a leaf of the hierarchical operator.
+
+    eta : Admissibility parameter of the hierarchical operator.
+
+    Yields
+    ------
+    mu : Complex array (n_freq x 3), or (n_freq x 3 x k) for k fields,
+         containing the total induced dipole moment of the frame for each
+         frequency.
+
+    info : Dictionary containing the metadata of the frame (see fread.header).
+    """
+    freq = np.atleast_1d(freq)
+    frames = fread.frames(path)
+
+    try:
+        with ThreadPoolExecutor(1) as executor:
+            task = executor.submit(next, frames, None)
+
+            while True:
+                frame = task.result()
+                if frame is None:
+                    break
+
+                # Read ahead while the current frame is solved.
+                task = executor.submit(next, frames, None)
+
+                symbols, coordinates, info = frame
+                x_coordinates = coordinates[:, 0:1]
+                y_coordinates = coordinates[:, 1:2]
+                z_coordinates = coordinates[:, 2:3]
+                o_dist = calc.origin_dist(coordinates, origin)
+
+                if method in ("krylov", "sparse"):
+                    T = operators.operator(operator, coordinates, cutoff,
+                                           accuracy, leaf, eta)
+                else:
+                    T = calc.assemble(coordinates)
+
+                coupling = None
+                if direct:
+                    coupling = calc.E_tensor(o_dist, x_coordinates,
+                                             y_coordinates, z_coordinates)
+
+                solver = solve.solver(method, T, coupling, None, tol,
+                                      maxiter)
+
+                dipole = serial(
+                    element,
+                    model,
+                    freq,
+                    solver,
+                    o_dist,
+                    E_external,
+                    coordinates,
+                    x_coordinates,
+                    y_coordinates,
+                    z_coordinates,
+                    direct,
+                    tol,
+                    maxiter,
+                    depth
+                )[0]
+
+                # The matrices are released before the next frame is set up.
+                del T, solver
+
+                yield (
+                    dipole.reshape((len(freq), -1, 3)
+                                   + dipole.shape[2:]).sum(axis=1),
+                    info
+                )
+
+    finally:
+        frames.close()
+
+
+def _attach(shapes, settings):
+    """
+    Initializes a worker process of parallel by attaching to the shared
+    arrays and setting up the solver.
+    """
+    # The blocks have to stay open for as long as the arrays are in use.
+    _shared["blocks"] = []
+    arrays = {}
+    for name, (block_name, shape) in shapes.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _shared["blocks"].append(block)
+        arrays[name] = np.ndarray(shape, buffer=block.buf)
+
+    (element, model, E_external, method, direct, tol, maxiter, depth,
+     operator, cutoff, guess, accuracy, leaf, eta, directory,
+     max_bytes) = settings
+    coordinates = arrays["coordinates"]
+
+    # Spawned workers start without the on-disk store of the parent.
+    cache.set_directory(directory, max_bytes)
+
+    coupling = None
+    if direct:
+        coupling = calc.E_tensor(arrays["o_dist"], coordinates[:, 0:1],
+                                 coordinates[:, 1:2], coordinates[:, 2:3])
+
+    T = None
+    eig = None
+    if method in ("krylov", "sparse"):
+        T = operators.operator(operator, coordinates, cutoff, accuracy,
+                               leaf, eta)
+    elif method == "spectral":
+        eig = (arrays["eigvals"], arrays["eigvecs"])
+    else:
+        T = arrays["temp_A"]
+
+    _shared["solver"] = solve.solver(method, T, coupling, eig, tol, maxiter)
+    _shared["arrays"] = arrays
+    _shared["settings"] = settings
+
+
+def _solve_chunk(freq):
+    """
+    Computes the induced dipole moments for a chunk of frequencies in a
+    worker process of parallel.
+    """
+    element, model, E_external, method, direct, tol, maxiter, depth = (
+        _shared["settings"][:8]
+    )
+    guess = _shared["settings"][10]
+    coordinates = _shared["arrays"]["coordinates"]
+
+    return serial(
+        element,
+        model,
+        freq,
+        _shared["solver"],
+        _shared["arrays"]["o_dist"],
+        E_external,
+        coordinates,
+        coordinates[:, 0:1],
+        coordinates[:, 1:2],
+        coordinates[:, 2:3],
+        direct,
+        tol,
+        maxiter,
+        depth,
+        guess
+    )